@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准测试：用合成数据按城市规模测量各脚本的关键阶段
+
+- 合成数据生成器：按 道路数 × 时段数 生成 urban-core 格式的 CSV，按 年份数 × 天数 生成
+  与 2017.xls … 2025.xls 同结构的年度工作簿；同一配置的数据只生成一次，缓存在 .bench_data/
+- 每个基准阶段在独立的子进程中执行，分别记录耗时（重复多次取最小值/中位数）和进程峰值内存(RSS)
+- 结果保存为 JSON，可以用 --compare 与之前的结果对比，超过阈值的变慢/内存增长视为回归
+
+用法:
+    python benchmark.py                              # 默认 city 规模
+    python benchmark.py --preset gangnam             # 与现有数据同规模（304条道路，9年）
+    python benchmark.py --links 20000 --slots 8640 --years 9 --repeat 3
+    python benchmark.py --output after.json --compare before.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource 模块，不记录峰值内存
+    resource = None
+
+
+DATA_DIR = '.bench_data'
+RESULTS_FILE = 'benchmark_results.json'
+
+# links: 道路数; slots: 每条道路的5分钟时段数; years: 年度工作簿数; days: 每个工作簿的天数
+PRESETS = {
+    'gangnam': {'links': 304, 'slots': 8640, 'years': 9, 'days': 30},
+    'city': {'links': 5000, 'slots': 8640, 'years': 9, 'days': 30},
+    'metro': {'links': 20000, 'slots': 8640, 'years': 20, 'days': 365},
+}
+
+WEATHER_KR = ['맑음', '구름조금', '구름많음', '흐림', '비', '눈']
+WEATHER_P = [0.40, 0.20, 0.15, 0.13, 0.10, 0.02]
+MISSING_RATE = 0.05
+FIRST_YEAR = 2017
+
+
+# ---------------------------------------------------------------------------
+# 合成数据生成
+# ---------------------------------------------------------------------------
+
+def dataset_dir(config, seed=42, data_dir=DATA_DIR):
+    name = f"L{config['links']}_S{config['slots']}_Y{config['years']}_D{config['days']}_seed{seed}"
+    return os.path.join(data_dir, name)
+
+
+def synthetic_speeds(n_links, n_slots, rng):
+    """基础车速 + 早晚高峰下降 + 噪声，约 MISSING_RATE 的时段为 0（缺失）"""
+    slot_of_day = np.arange(n_slots) % (24 * 60 // 5)
+    hour = slot_of_day * 5 / 60
+    rush = np.exp(-((hour - 8.5) ** 2) / 2) + np.exp(-((hour - 18.5) ** 2) / 3)
+
+    base = rng.uniform(15, 60, size=(n_links, 1)).astype(np.float32)
+    depth = rng.uniform(0.2, 0.5, size=(n_links, 1)).astype(np.float32)
+    speeds = base * (1 - depth * rush.astype(np.float32))
+    speeds += rng.normal(0, 3, size=speeds.shape).astype(np.float32)
+    np.clip(speeds, 1, 110, out=speeds)
+    speeds[rng.random(speeds.shape) < MISSING_RATE] = 0
+    return np.round(speeds, 2)
+
+
+def generate_urban_core(file_path, n_links, n_slots, seed=42, chunk_size=1000):
+    """生成 urban-core 格式（无表头，7列道路属性 + 速度列）的 CSV，分块写出以控制内存"""
+    rng = np.random.default_rng(seed)
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        for start in range(0, n_links, chunk_size):
+            n = min(chunk_size, n_links - start)
+            ids = np.arange(start, start + n)
+            meta = pd.DataFrame({
+                'link_id': 1000000000 + ids,
+                'short_id': ids,
+                'id_x': rng.integers(1000000, 9999999, n),
+                'id_y': rng.integers(1000000, 9999999, n),
+                'speed_limit': rng.choice([30, 50, 60, 80], n),
+                'length': rng.integers(50, 2000, n),
+                'direction': rng.integers(0, 2, n),
+            })
+            speeds = pd.DataFrame(synthetic_speeds(n, n_slots, rng))
+            chunk = pd.concat([meta, speeds], axis=1)
+            chunk.to_csv(f, header=False, index=False, float_format='%.2f')
+    os.replace(tmp_path, file_path)
+
+
+def generate_year_workbooks(out_dir, n_years, n_days, seed=42):
+    """生成与 2017.xls 同结构的年度工作簿（工作表 차량통행속도，日期从4月1日起）"""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(n_years):
+        year = FIRST_YEAR + i
+        dates = pd.date_range(f'{year}-04-01', periods=n_days, freq='D')
+        high = np.round(rng.normal(18, 5, n_days), 1)
+        df = pd.DataFrame({
+            '일자': dates.strftime('%Y%m%d').astype(int),
+            '평균속도': np.round(rng.normal(22, 2, n_days), 1),
+            '날씨': rng.choice(WEATHER_KR, n_days, p=WEATHER_P),
+            '최고온도(℃)': high,
+            '최저온도(℃)': np.round(high - rng.uniform(5, 12, n_days), 1),
+        })
+        # 内容为 xlsx，文件名沿用 .xls；pandas 按文件内容判断格式
+        path = os.path.join(out_dir, f'{year}.xls')
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            df.to_excel(writer, sheet_name='차량통행속도', index=False)
+        paths.append(path)
+    return paths
+
+
+def prepare_dataset(config, seed=42, data_dir=DATA_DIR):
+    """生成（或复用已缓存的）合成数据集，返回数据目录"""
+    out_dir = dataset_dir(config, seed, data_dir)
+    marker = os.path.join(out_dir, 'config.json')
+    if os.path.exists(marker):
+        return out_dir
+
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"正在生成合成数据: {config['links']} 条道路 × {config['slots']} 个时段, "
+          f"{config['years']} 年 × {config['days']} 天 -> {out_dir}")
+    start = time.perf_counter()
+    generate_urban_core(os.path.join(out_dir, 'urban-core.csv'), config['links'], config['slots'], seed)
+    generate_year_workbooks(out_dir, config['years'], config['days'], seed)
+    with open(marker, 'w') as f:
+        json.dump(dict(config, seed=seed), f)
+    print(f"合成数据生成完成: {time.perf_counter() - start:.1f}s")
+    return out_dir
+
+
+def year_list(data_path):
+    with open(os.path.join(data_path, 'config.json')) as f:
+        n_years = json.load(f)['years']
+    return [str(FIRST_YEAR + i) for i in range(n_years)]
+
+
+# ---------------------------------------------------------------------------
+# 基准阶段：每个函数在子进程中完成准备工作，返回需要计时的无参函数
+# ---------------------------------------------------------------------------
+
+def bench_load_data(data_path, work_dir):
+    from foliumscript import load_data
+    return lambda: load_data(os.path.join(data_path, 'urban-core.csv'))
+
+
+def bench_load_store(data_path, work_dir):
+    from foliumscript import load_data
+    from speedmatrix import read_urban_core
+    from speedstore import write_store
+    store_path = os.path.join(work_dir, 'urban-core.store')
+    links, speeds = read_urban_core(os.path.join(data_path, 'urban-core.csv'))
+    write_store(store_path, speeds, links=links)
+    del speeds
+    return lambda: load_data(store_path)
+
+
+def bench_calculate_stats(data_path, work_dir):
+    from foliumscript import load_data, calculate_stats
+    speed_data = load_data(os.path.join(data_path, 'urban-core.csv'))[-1]
+
+    def run():
+        for speed_array in speed_data:
+            calculate_stats(speed_array)
+    return run
+
+
+def bench_link_stats(data_path, work_dir):
+    from speedmatrix import read_urban_core, link_stats
+    links, speeds = read_urban_core(os.path.join(data_path, 'urban-core.csv'))
+    return lambda: link_stats(links, speeds)
+
+
+def bench_load_all_years_data(data_path, work_dir):
+    from plotlyscript import load_all_years_data
+    years = year_list(data_path)
+    # 计时读取与解析本身，不经过 memo 的磁盘缓存
+    return lambda: load_all_years_data.uncached(years, data_dir=data_path)
+
+
+def bench_plotly_dashboard(data_path, work_dir):
+    from plotlyscript import load_all_years_data, create_comparison_dashboard
+    df = load_all_years_data(year_list(data_path), data_dir=data_path)
+    output_file = os.path.join(work_dir, 'analysis_dashboard.html')
+    return lambda: create_comparison_dashboard(df).write_html(output_file)
+
+
+def bench_create_speed_dashboard(data_path, work_dir):
+    from foliumscript import load_data, create_speed_dashboard
+    csv_path = os.path.join(data_path, 'urban-core.csv')
+    data = load_data(csv_path)
+    output_file = os.path.join(work_dir, 'speed_dashboard.html')
+    return lambda: create_speed_dashboard(csv_path, output_file, open_browser=False, data=data)
+
+
+BENCHMARKS = {
+    'load_data': bench_load_data,
+    'load_store': bench_load_store,
+    'calculate_stats': bench_calculate_stats,
+    'link_stats': bench_link_stats,
+    'load_all_years_data': bench_load_all_years_data,
+    'plotly_dashboard': bench_plotly_dashboard,
+    'create_speed_dashboard': bench_create_speed_dashboard,
+}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB，macOS 上为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_benchmark(name, data_path, work_dir, repeat, verbose):
+    """子进程入口：准备、计时，并返回耗时和峰值内存"""
+    sink = sys.stdout if verbose else io.StringIO()
+    with contextlib.redirect_stdout(sink), warnings.catch_warnings():
+        if not verbose:
+            warnings.simplefilter('ignore')
+        run = BENCHMARKS[name](data_path, work_dir)
+        setup_rss = peak_rss_mb()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    return {
+        'times': times,
+        'min': min(times),
+        'median': statistics.median(times),
+        'setup_rss_mb': setup_rss,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_benchmarks(config, names=None, repeat=3, seed=42, verbose=False, data_dir=DATA_DIR):
+    data_path = prepare_dataset(config, seed, data_dir)
+    work_dir = os.path.join(data_path, 'output')
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = {}
+    for name in names or BENCHMARKS:
+        # 每个阶段一个全新的子进程，峰值内存互不影响
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            try:
+                results[name] = pool.submit(_run_benchmark, name, data_path, work_dir, repeat, verbose).result()
+            except Exception as e:
+                print(f"[失败] {name}: {e}")
+                results[name] = {'error': str(e)}
+                continue
+        r = results[name]
+        rss = f"{r['peak_rss_mb']:.0f} MB" if r['peak_rss_mb'] is not None else "-"
+        print(f"[完成] {name:<24} min {r['min']:.3f}s  median {r['median']:.3f}s  峰值内存 {rss}")
+
+    return {'meta': run_metadata(config, repeat, seed), 'benchmarks': results}
+
+
+def run_metadata(config, repeat, seed):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'config': config,
+        'repeat': repeat,
+        'seed': seed,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+# ---------------------------------------------------------------------------
+# 结果对比
+# ---------------------------------------------------------------------------
+
+def compare_results(baseline, current, threshold=0.10):
+    """按阶段比较最小耗时和峰值内存，返回超过阈值的回归列表"""
+    if baseline['meta']['config'] != current['meta']['config']:
+        print(f"注意: 数据规模不同 {baseline['meta']['config']} vs {current['meta']['config']}")
+
+    regressions = []
+    print(f"\n{'阶段':<24}{'基线(s)':>10}{'当前(s)':>10}{'变化':>9}{'内存变化':>10}")
+    for name, cur in current['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if not base or 'error' in base or 'error' in cur:
+            print(f"{name:<24}{'-':>10}{'-':>10}")
+            continue
+        ratio = cur['min'] / base['min'] - 1 if base['min'] > 0 else 0.0
+        mem_ratio = None
+        if base.get('peak_rss_mb') and cur.get('peak_rss_mb') is not None:
+            mem_ratio = cur['peak_rss_mb'] / base['peak_rss_mb'] - 1
+        mem = f"{mem_ratio:+.1%}" if mem_ratio is not None else "-"
+        flag = ''
+        if ratio > threshold or (mem_ratio is not None and mem_ratio > threshold):
+            regressions.append(name)
+            flag = '  <- 回归'
+        print(f"{name:<24}{base['min']:>10.3f}{cur['min']:>10.3f}{ratio:>+9.1%}{mem:>10}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="foliumscript / plotlyscript 性能基准测试")
+    parser.add_argument('benchmarks', nargs='*', help=f"只运行指定阶段: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--preset', choices=PRESETS, default='city')
+    parser.add_argument('--links', type=int)
+    parser.add_argument('--slots', type=int)
+    parser.add_argument('--years', type=int)
+    parser.add_argument('--days', type=int)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=RESULTS_FILE)
+    parser.add_argument('--compare', help="与之前保存的结果 JSON 对比")
+    parser.add_argument('--threshold', type=float, default=0.10, help="回归阈值（相对变化）")
+    parser.add_argument('--verbose', action='store_true', help="显示被测脚本自身的输出")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准阶段: {', '.join(unknown)}")
+
+    config = dict(PRESETS[args.preset])
+    for key in ('links', 'slots', 'years', 'days'):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    results = run_benchmarks(config, args.benchmarks, args.repeat, args.seed, args.verbose)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, results, args.threshold)
+        if regressions:
+            print(f"\n发现性能回归: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n没有发现性能回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+统一命令行入口
+
+    python cli.py stats                      # urban-core.csv 数据统计（不导入 folium/plotly）
+    python cli.py map --no-browser           # 江南区道路速度地图
+    python cli.py animate --kind optimized   # 各年份4月车速动画/分析仪表板
+    python cli.py correlate --output-dir figures
+    python cli.py forecast --epochs 150      # LSTM 时间序列预测
+    python cli.py extract-policy 2017政策.docx 2018政策.docx
+    python cli.py query --named weather_means  # DuckDB 查询层（trafficdb）
+    python cli.py route 1210006200 1210007000 --depart "2018-04-02 08:00"  # 时变最快路径/等时圈
+    python cli.py live --http-port 8000       # 实时数据接入与实时地图
+    python cli.py similar 1210006200          # 拥堵模式相似的道路（linkclusters）
+    python cli.py serve --port 8000           # 本地地图服务，弹窗详情按需加载（mapserver）
+    python cli.py bottlenecks --top 20        # 常发拥堵瓶颈（congestion）
+    python cli.py compare 2018.store 2025.store --labels 2018年4月 2025年4月  # 两个时期对比地图
+    python cli.py ensemble --epochs 150 --n-jobs 3   # LSTM/随机森林/季节性基线并行训练后加权融合
+
+plotly、folium、matplotlib/seaborn/scipy、torch、spaCy 等重量级库只在需要它们的
+子命令内部导入，顶层只依赖标准库，统计类命令启动很快。
+加 --trace trace.json 可写出 instrument 的计时数据。
+"""
+
+import argparse
+import sys
+
+
+URBAN_CORE_FILE = 'urban-core.csv'
+
+
+def cmd_stats(args):
+    from foliumscript import show_data_statistics
+    show_data_statistics(args.file)
+
+
+def cmd_map(args):
+    from foliumscript import create_speed_dashboard
+    m = create_speed_dashboard(args.file, args.output, open_browser=not args.no_browser)
+    return 0 if m is not None else 1
+
+
+def cmd_animate(args):
+    import plotlyscript
+
+    builders = {
+        'optimized': (plotlyscript.create_optimized_speed_animation, 'seoul_traffic_speed_animation_optimized.html'),
+        'manual': (plotlyscript.create_speed_animation_manual, 'seoul_traffic_speed_animation_manual.html'),
+        'dashboard': (plotlyscript.create_comparison_dashboard, 'seoul_traffic_analysis_dashboard.html'),
+    }
+    kinds = list(builders) if args.kind == 'all' else [args.kind]
+
+    df = plotlyscript.load_all_years_data(args.years or plotlyscript.YEARS, data_dir=args.data_dir)
+    for kind in kinds:
+        build, output_file = builders[kind]
+        build(df).write_html(output_file)
+        print(f"✅ 已保存: {output_file}")
+
+
+def cmd_correlate(args):
+    import importlib
+    if args.output_dir:
+        import matplotlib
+        matplotlib.use('Agg')
+
+    analysis = importlib.import_module('相关性分析')
+    analysis.run_analysis(args.speed_file, args.bus_file, output_dir=args.output_dir)
+
+
+def cmd_forecast(args):
+    from hpsearch import load_traffic_weather
+    from trafficlstm import forecast_speed
+
+    df = load_traffic_weather(args.data_file)
+    predictions, metrics = forecast_speed(df, epochs=args.epochs, checkpoint_dir=args.checkpoint_dir)
+    print(f"• MAE: {metrics['mae']:.4f}  RMSE: {metrics['rmse']:.4f}  R²: {metrics['r2']:.4f}")
+    predictions.to_csv(args.output, index=False, encoding='utf-8-sig')
+    print(f"测试集预测结果已保存: {args.output}")
+
+
+def cmd_extract_policy(args):
+    import functools
+    import glob
+    from policyingest import ingest_policy_corpus
+    from policyextract import extract_policy_records
+
+    doc_paths = args.docs or sorted(glob.glob('*政策.docx'))
+    if not doc_paths:
+        print("没有找到政策文档 (*政策.docx)")
+        return 1
+    extract = functools.partial(extract_policy_records, batch_size=args.batch_size, n_process=args.n_process)
+    result = ingest_policy_corpus(doc_paths, extract, output_path=args.output, max_workers=args.workers)
+    print(f"共 {len(result)} 个政策模块，结果已保存: {args.output}")
+
+
+def cmd_query(args):
+    import trafficdb
+
+    con = trafficdb.connect(args.db_dir, threads=args.threads)
+    if args.list:
+        print("表: " + ", ".join(trafficdb.available_tables(con)))
+        print("常用查询: " + ", ".join(trafficdb.QUERIES))
+        return 0
+    sql = args.named or args.sql
+    if not sql:
+        print("请提供SQL语句或 --named 查询名")
+        return 1
+    params = dict(item.split('=', 1) for item in args.param)
+    result = trafficdb.query(sql, params, con=con)
+    if args.output:
+        result.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"查询结果已保存: {args.output} ({len(result)} 行)")
+    else:
+        print(result.to_string(index=False, max_rows=args.max_rows))
+
+
+def cmd_route(args):
+    import os
+    import routing
+
+    if not os.path.exists(args.graph):
+        print(f"路网文件 {args.graph} 不存在，请先运行: python pipeline.py routing_graph")
+        return 1
+    graph = routing.load_graph(args.graph)
+    origin = int(float(args.origin))
+    try:
+        return _route(routing, graph, origin, args)
+    except KeyError as e:
+        print(e.args[0])
+        return 1
+
+
+def _route(routing, graph, origin, args):
+    if args.isochrone is not None:
+        result = routing.isochrone(graph, origin, args.depart, args.isochrone * 60)
+        print(f"{args.isochrone:g} 分钟内可到达 {len(result)} 条道路")
+        if args.output:
+            result.to_csv(args.output, index=False, encoding='utf-8-sig')
+            print(f"结果已保存: {args.output}")
+        return 0
+    if args.destination is None:
+        print("请提供终点道路ID，或使用 --isochrone 分钟数")
+        return 1
+
+    result = routing.fastest_route(graph, origin, int(float(args.destination)), args.depart)
+    if result is None:
+        print("终点不可达")
+        return 1
+    print(f"出发 {result['depart']:%Y-%m-%d %H:%M}  到达 {result['arrive']:%Y-%m-%d %H:%M:%S}  "
+          f"用时 {result['travel_time'] / 60:.1f} 分钟  经过 {len(result['links'])} 条道路")
+    print(" -> ".join(str(link_id) for link_id in result['links']))
+
+
+def cmd_live(args):
+    import asyncio
+    import liveingest
+
+    try:
+        asyncio.run(liveingest.run_service(liveingest.load_links(), args.live_dir, args.inbox, args.port,
+                                           args.http_port))
+    except KeyboardInterrupt:
+        print("\n实时接入已停止")
+
+
+def cmd_similar(args):
+    import os
+    import pandas as pd
+    from linkclusters import index_from_table, similar_links
+
+    if not os.path.exists(args.clusters):
+        print(f"聚类结果 {args.clusters} 不存在，请先运行: python pipeline.py link_clusters")
+        return 1
+    table = pd.read_parquet(args.clusters)
+    matches = table.index[table['link_id'] == float(args.link_id)]
+    if len(matches) == 0:
+        print(f"没有道路 {args.link_id}")
+        return 1
+    index = index_from_table(table)
+    neighbours, dist = similar_links(index, int(matches[0]), k=args.k, n_probe=args.n_probe)
+    print(f"道路 {args.link_id} 属于拥堵模式 {table['cluster'].iloc[matches[0]]}，相似的道路:")
+    result = pd.DataFrame({'link_id': table['link_id'].to_numpy()[neighbours],
+                           'cluster': table['cluster'].to_numpy()[neighbours], 'distance': dist})
+    print(result.to_string(index=False))
+
+
+def cmd_serve(args):
+    from mapserver import serve
+    serve(args.port, args.host, args.cache_size, urban_core_file=args.file)
+
+
+def cmd_bottlenecks(args):
+    import os
+    import pandas as pd
+
+    if not os.path.exists(args.report):
+        print(f"瓶颈报告 {args.report} 不存在，请先运行: python pipeline.py congestion_events")
+        return 1
+    report = pd.read_parquet(args.report)
+    report = report[report['day_share'] >= args.min_share]
+    print(f"常发拥堵瓶颈 (发生天数占比 >= {args.min_share:.0%}，共 {len(report)} 条道路):")
+    print(report.head(args.top).to_string(index=False))
+
+
+def cmd_compare(args):
+    from periodcompare import change_summary, compare_sources, diff_map
+
+    comparison = compare_sources(args.before, args.after, mode=args.mode)
+    summary = change_summary(comparison, args.metric)
+    print(f"{summary['metric']}: {summary['links']} 条道路，{summary['improved']} 条变好，"
+          f"{summary['worse']} 条变差，中位数变化 {summary['median_delta']:+.2f} {summary['unit']}"
+          f"（只在前期 {summary['only_before']} 条，只在后期 {summary['only_after']} 条）")
+    if args.table:
+        comparison.to_parquet(args.table, index=False)
+        print(f"对比表已保存: {args.table}")
+    diff_map(comparison, args.metric, args.output, labels=tuple(args.labels), open_browser=not args.no_browser)
+
+
+def cmd_ensemble(args):
+    from hpsearch import load_traffic_weather
+    from ensemble import save_ensemble, train_ensemble
+
+    df = load_traffic_weather(args.data_file)
+    ensemble, report = train_ensemble(df, epochs=args.epochs, n_jobs=args.n_jobs, checkpoint_dir=args.checkpoint_dir)
+    print(report.round(4).to_string(index=False))
+    predictions = ensemble.predict(df)
+    predictions.to_csv(args.output, index=False, encoding='utf-8-sig')
+    print(f"集成预测结果已保存: {args.output}")
+    if args.save:
+        save_ensemble(ensemble, args.save)
+        print(f"集成模型已保存: {args.save}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='首尔交通速度分析工具')
+    parser.add_argument('--trace', metavar='FILE', help='写出计时数据（instrument），可含 {pid}')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('stats', help='urban-core 道路速度数据统计')
+    p.add_argument('--file', default=URBAN_CORE_FILE)
+    p.set_defaults(func=cmd_stats)
+
+    p = subparsers.add_parser('map', help='生成江南区道路速度地图 (folium)')
+    p.add_argument('--file', default=URBAN_CORE_FILE)
+    p.add_argument('--output', default='seoul_gangnam_speed_dashboard.html')
+    p.add_argument('--no-browser', action='store_true', help='不自动打开浏览器')
+    p.set_defaults(func=cmd_map)
+
+    p = subparsers.add_parser('animate', help='生成各年份车速动画与分析仪表板 (plotly)')
+    p.add_argument('--kind', choices=['optimized', 'manual', 'dashboard', 'all'], default='all')
+    p.add_argument('--years', nargs='+', help='默认为 2017-2025')
+    p.add_argument('--data-dir', default='.')
+    p.set_defaults(func=cmd_animate)
+
+    p = subparsers.add_parser('correlate', help='公共交通与车速相关性分析')
+    p.add_argument('--speed-file', default='2018-4-全天.xls')
+    p.add_argument('--bus-file', default='2018-4公共交通.xls')
+    p.add_argument('--output-dir', help='图表保存目录；不指定时弹出窗口显示')
+    p.set_defaults(func=cmd_correlate)
+
+    p = subparsers.add_parser('forecast', help='LSTM 时间序列车速预测')
+    p.add_argument('--data-file', default='首尔市区4月份交通天气数据_2017-2025.xlsx')
+    p.add_argument('--epochs', type=int, default=150)
+    p.add_argument('--checkpoint-dir', default='checkpoints/lstm_no_weather')
+    p.add_argument('--output', default='lstm_forecast.csv')
+    p.set_defaults(func=cmd_forecast)
+
+    p = subparsers.add_parser('extract-policy', help='政策文档关键信息抽取')
+    p.add_argument('docs', nargs='*', help='默认为当前目录下的 *政策.docx')
+    p.add_argument('--output', default='政策全文档NLP抽取结果.parquet')
+    p.add_argument('--workers', type=int, default=None, help='读取文档的进程数')
+    p.add_argument('--batch-size', type=int, default=64)
+    p.add_argument('--n-process', type=int, default=1, help='spaCy 解析进程数')
+    p.set_defaults(func=cmd_extract_policy)
+
+    p = subparsers.add_parser('query', help='SQL 查询（DuckDB，表由 pipeline.py query_tables 生成）')
+    p.add_argument('sql', nargs='?')
+    p.add_argument('--named', choices=['weather_means', 'link_stats', 'year_day_pivot', 'rainy_weekday_rush'])
+    p.add_argument('--param', action='append', default=[], metavar='NAME=VALUE')
+    p.add_argument('--db-dir', default='.pipeline/db')
+    p.add_argument('--threads', type=int)
+    p.add_argument('--output', help='保存为CSV')
+    p.add_argument('--max-rows', type=int, default=50)
+    p.add_argument('--list', action='store_true', help='列出可用的表和常用查询')
+    p.set_defaults(func=cmd_query)
+
+    p = subparsers.add_parser('route', help='时变最快路径 / 等时圈（路网由 pipeline.py routing_graph 生成）')
+    p.add_argument('origin', help='起点道路ID')
+    p.add_argument('destination', nargs='?', help='终点道路ID')
+    p.add_argument('--depart', default='2018-04-02 08:00', help='出发时间')
+    p.add_argument('--isochrone', type=float, metavar='MINUTES', help='输出该时间内可到达的道路')
+    p.add_argument('--graph', default='.pipeline/routing_graph.npz')
+    p.add_argument('--output', help='等时圈结果保存为CSV')
+    p.set_defaults(func=cmd_route)
+
+    p = subparsers.add_parser('live', help='实时5分钟车速接入（投放目录/socket），增量更新地图图层')
+    p.add_argument('--live-dir', default='live')
+    p.add_argument('--inbox', default='live/inbox')
+    p.add_argument('--port', type=int, help='Socket 数据源端口')
+    p.add_argument('--http-port', type=int, help='仪表盘 HTTP 端口')
+    p.set_defaults(func=cmd_live)
+
+    p = subparsers.add_parser('similar', help='日内拥堵模式相似的道路（近似最近邻）')
+    p.add_argument('link_id')
+    p.add_argument('-k', type=int, default=10)
+    p.add_argument('--n-probe', type=int, default=2, help='搜索的簇数，越大越精确')
+    p.add_argument('--clusters', default='.pipeline/link_clusters.parquet')
+    p.set_defaults(func=cmd_similar)
+
+    p = subparsers.add_parser('serve', help='本地地图服务：页面只含道路位置，点击时按需获取详情')
+    p.add_argument('--port', type=int, default=8000)
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--cache-size', type=int, default=256, help='LRU 缓存的响应数')
+    p.add_argument('--file', default=URBAN_CORE_FILE, help='没有流水线产物时读取的 urban-core.csv')
+    p.set_defaults(func=cmd_serve)
+
+    p = subparsers.add_parser('bottlenecks', help='常发拥堵瓶颈：按拥堵发生天数和总时长排序')
+    p.add_argument('--top', type=int, default=20)
+    p.add_argument('--min-share', type=float, default=0.0, help='最低发生天数占比 (0-1)')
+    p.add_argument('--report', default='.pipeline/bottlenecks.parquet')
+    p.set_defaults(func=cmd_bottlenecks)
+
+    p = subparsers.add_parser('compare', help='两个时期按道路对齐对比，生成发散色变化地图')
+    p.add_argument('before', help='前一时期: urban-core 格式 CSV 或 speedstore 目录')
+    p.add_argument('after', help='后一时期')
+    p.add_argument('--metric', choices=['avg_speed', 'p5', 'p50', 'p85', 'congestion_min'], default='avg_speed')
+    p.add_argument('--mode', choices=['limit', 'fixed'], default='limit', help='拥堵判定方式（见 congestion）')
+    p.add_argument('--labels', nargs=2, default=['前期', '后期'])
+    p.add_argument('--output', default='seoul_gangnam_speed_diff.html')
+    p.add_argument('--table', help='同时保存对比表 (parquet)')
+    p.add_argument('--no-browser', action='store_true')
+    p.set_defaults(func=cmd_compare)
+
+    p = subparsers.add_parser('ensemble', help='LSTM、随机森林、季节性基线并行训练，按验证集误差加权融合')
+    p.add_argument('--data-file', default='首尔市区4月份交通天气数据_2017-2025.xlsx')
+    p.add_argument('--epochs', type=int, default=150)
+    p.add_argument('--n-jobs', type=int, help='训练进程数，默认每组模型一个进程')
+    p.add_argument('--checkpoint-dir', default='checkpoints/ensemble_lstm')
+    p.add_argument('--output', default='ensemble_forecast.csv')
+    p.add_argument('--save', metavar='FILE', help='保存集成模型 (torch.save)')
+    p.set_defaults(func=cmd_ensemble)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        import atexit
+        import instrument
+        instrument.enable(args.trace)
+        atexit.register(instrument.disable)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+拥堵事件检测：对整个 道路×时段 速度矩阵一次性判定拥堵，用游程编码找出每段连续拥堵
+
+- 判定方式:
+    limit: 相对限速，速度/限速 低于 LIMIT_BANDS 中的阈值（默认 0.5 为拥堵，0.25 为严重拥堵）
+    fixed: 固定速度段，低于 FIXED_BANDS 中的阈值 km/h（默认 20 为拥堵，10 为严重拥堵；
+           与 weathercor.ipynb 中 get_congestion_level 的 20 km/h 一致）
+- 同一道路上间隔不超过 bridge 个时段的两段拥堵合并为一段（短暂的缺失或恢复不打断事件），
+  短于 min_slots 个时段的拥堵不计为事件
+- 每个事件: 道路、开始/结束时间、持续时间、平均/最低速度、平均速度比、严重程度（事件内最严重的等级）
+- recurring_bottlenecks 按道路汇总事件，给出常发瓶颈（发生天数、总时长、典型开始时刻）
+
+全部按道路分块的向量化运算（展平差分找游程边界 + reduceat 求每段统计），没有逐条道路或逐个时段的循环。
+
+用法:
+    events = congestion_events(links, speeds, valid=QualityMask(quality, INTERPOLATED))
+    report = recurring_bottlenecks(events, n_days=speeds.shape[1] // SLOTS_PER_DAY)
+"""
+
+import numpy as np
+import pandas as pd
+
+from speedmatrix import SLOT_MINUTES, URBAN_CORE_START
+
+
+LIMIT_BANDS = (0.25, 0.5)
+FIXED_BANDS = (10, 20)
+SEVERITY_NAMES = ['畅通', '拥堵', '严重拥堵']
+MIN_SLOTS = 3               # 至少 15 分钟
+BRIDGE_SLOTS = 2            # 间隔不超过 10 分钟的拥堵合并为同一事件
+
+
+def relative_speeds(links, speeds, mode='limit'):
+    """limit: 速度/限速；fixed: 原速度 (km/h)。speeds 可以是一个道路块，links 为对应的道路表"""
+    speeds = np.asarray(speeds, dtype=np.float32)
+    if mode == 'fixed':
+        return speeds
+    if mode == 'limit':
+        limit = links['speed_limit'].to_numpy(dtype=np.float32)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return speeds / np.where(limit > 0, limit, np.nan)[:, None]
+    raise ValueError(f"未知的判定方式: {mode}，可选 'limit' / 'fixed'")
+
+
+def congestion_levels(relative, valid, bands):
+    """每个时段的拥堵等级 (0 畅通或无数据, 1 .. len(bands))：低于几个阈值就是几级"""
+    levels = np.zeros(relative.shape, dtype=np.int8)
+    for bound in bands:
+        levels += relative < bound
+    levels[~valid] = 0
+    return levels
+
+
+def _runs(mask):
+    """逐行连续 True 段，返回 (行号, 起始时段, 结束时段(不含))"""
+    n_rows, n_slots = mask.shape
+    padded = np.zeros((n_rows, n_slots + 1), dtype=np.int8)
+    padded[:, 1:] = mask
+    # 每行前补一个 False 后展平差分，一次 flatnonzero 找出全部边界：各段的开始、结束成对出现，
+    # 行末尚未结束的段在下一行的补位处（或末尾追加的 0 处）结束
+    edges = np.flatnonzero(np.diff(padded.ravel(), append=0))
+    rows, cols = np.divmod(edges, n_slots + 1)
+    return rows[0::2], cols[0::2], cols[1::2]
+
+
+def merge_runs(rows, starts, ends, bridge=BRIDGE_SLOTS):
+    """同一道路上间隔不超过 bridge 个时段的相邻两段合并为一段（短暂的缺失或恢复不打断事件）"""
+    if len(rows) == 0:
+        return rows, starts, ends
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (starts[1:] - ends[:-1] > bridge)
+    last = np.append(first[1:], True)
+    return rows[first], starts[first], ends[last]
+
+
+def _segment_reduce(ufunc, flat, starts, ends, dtype=None):
+    """flat 中各段 [start, end) 的归约（段按顺序排列、互不重叠）"""
+    bounds = np.empty(2 * len(starts), dtype=np.int64)
+    bounds[0::2] = starts
+    bounds[1::2] = ends
+    if len(bounds) and bounds[-1] == len(flat):
+        bounds = bounds[:-1]
+    return ufunc.reduceat(flat, bounds, dtype=dtype)[0::2]
+
+
+def _block_events(links, speeds, valid, mode, bands, min_slots, bridge):
+    relative = relative_speeds(links, speeds, mode)
+    valid = valid & np.isfinite(relative)
+    levels = congestion_levels(relative, valid, bands)
+    rows, starts, ends = merge_runs(*_runs(levels > 0), bridge)
+    keep = ends - starts >= min_slots
+    rows, starts, ends = rows[keep], starts[keep], ends[keep]
+
+    n_slots = speeds.shape[1]
+    flat_starts = rows * n_slots + starts
+    flat_ends = rows * n_slots + ends
+
+    def reduce(ufunc, values, dtype=None):
+        return _segment_reduce(ufunc, values.ravel(), flat_starts, flat_ends, dtype)
+
+    count = reduce(np.add, valid, np.int32)
+    total = reduce(np.add, np.where(valid, speeds, 0), np.float64)
+    total_relative = reduce(np.add, np.where(valid, relative, 0), np.float64)
+    lowest = reduce(np.minimum, np.where(valid, speeds, np.inf))
+    severity = reduce(np.maximum, levels)
+    safe_count = np.maximum(count, 1)
+    return pd.DataFrame({
+        'row': rows, 'start_slot': starts, 'end_slot': ends, 'valid_slots': count,
+        'mean_speed': total / safe_count, 'min_speed': np.where(count > 0, lowest, 0),
+        'mean_relative': total_relative / safe_count, 'severity': severity.astype(np.int8),
+    })
+
+
+def congestion_events(links, speeds, valid=None, mode='limit', bands=None, min_slots=MIN_SLOTS,
+                      bridge=BRIDGE_SLOTS, start=URBAN_CORE_START, chunk_links=2000):
+    """
+    检测所有道路的拥堵事件，返回事件表（按道路、开始时间排序）。
+    valid 为有效数据掩码（可以是 dataquality.QualityMask(quality, INTERPOLATED)，按块切片），
+    默认速度>0 为有效；speeds 可以是 memmap
+    """
+    bands = tuple(sorted(bands if bands is not None else (LIMIT_BANDS if mode == 'limit' else FIXED_BANDS)))
+    links = links.reset_index(drop=True)
+    n_links = len(links)
+    blocks = []
+    for row in range(0, n_links, chunk_links):
+        block = np.asarray(speeds[row:row + chunk_links])
+        mask = block > 0 if valid is None else np.asarray(valid[row:row + chunk_links])
+        events = _block_events(links.iloc[row:row + chunk_links], block, mask, mode, bands, min_slots, bridge)
+        events['row'] += row
+        blocks.append(events)
+    events = pd.concat(blocks, ignore_index=True)
+
+    origin = pd.Timestamp(start)
+    slot = pd.Timedelta(minutes=SLOT_MINUTES)
+    table = pd.DataFrame({
+        'link_id': links['link_id'].to_numpy()[events['row']],
+        'start': origin + events['start_slot'].to_numpy() * slot,
+        'end': origin + events['end_slot'].to_numpy() * slot,
+        'duration_min': (events['end_slot'] - events['start_slot']) * SLOT_MINUTES,
+        'mean_speed': events['mean_speed'].round(2),
+        'min_speed': events['min_speed'].round(2),
+        'mean_relative': events['mean_relative'].round(3),
+        'severity': events['severity'],
+        'level': np.asarray(SEVERITY_NAMES, dtype=object)[events['severity']],
+        'coverage': (events['valid_slots'] / (events['end_slot'] - events['start_slot'])).round(3),
+    })
+    if mode == 'fixed':
+        table = table.drop(columns='mean_relative')
+    return table
+
+
+def recurring_bottlenecks(events, n_days, min_days=1):
+    """
+    按道路汇总拥堵事件: 事件数、发生天数及其占比、总/平均持续时间、典型开始时刻（中位数）、
+    最常见的开始小时、最严重等级。按发生天数和总时长降序
+    """
+    if len(events) == 0:
+        return pd.DataFrame(columns=['link_id', 'events', 'days', 'day_share', 'total_min', 'mean_duration_min',
+                                     'typical_start', 'peak_hour', 'worst_level'])
+    start = pd.to_datetime(events['start'])
+    frame = pd.DataFrame({
+        'link_id': events['link_id'].to_numpy(),
+        'day': start.dt.normalize().to_numpy(),
+        'start_minute': (start.dt.hour * 60 + start.dt.minute).to_numpy(),
+        'hour': start.dt.hour.to_numpy(),
+        'duration_min': events['duration_min'].to_numpy(),
+        'severity': events['severity'].to_numpy(),
+    })
+    grouped = frame.groupby('link_id', sort=False)
+    report = pd.DataFrame({
+        'events': grouped.size(),
+        'days': grouped['day'].nunique(),
+        'total_min': grouped['duration_min'].sum(),
+        'mean_duration_min': grouped['duration_min'].mean().round(1),
+        'start_minute': grouped['start_minute'].median(),
+        'severity': grouped['severity'].max(),
+    })
+    # 最常见的开始小时：(道路, 小时) 计数后取每条道路计数最大的小时
+    hour_counts = frame.groupby(['link_id', 'hour']).size().reset_index(name='n')
+    hour_counts = hour_counts.sort_values(['link_id', 'n', 'hour'], ascending=[True, False, True])
+    report['peak_hour'] = hour_counts.drop_duplicates('link_id').set_index('link_id')['hour']
+
+    report['day_share'] = (report['days'] / n_days).round(3)
+    minutes = report.pop('start_minute').round().astype(int)
+    report['typical_start'] = [f"{m // 60:02d}:{m % 60:02d}" for m in minutes]
+    report['worst_level'] = np.asarray(SEVERITY_NAMES, dtype=object)[report.pop('severity').to_numpy()]
+    report = report[report['days'] >= min_days].reset_index()
+    return report[['link_id', 'events', 'days', 'day_share', 'total_min', 'mean_duration_min', 'typical_start',
+                   'peak_hour', 'worst_level']].sort_values(['days', 'total_min'], ascending=False,
+                                                            ignore_index=True)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+道路×时段速度矩阵的数据质量处理：缺失检测、缺口统计与插补
+
+urban-core 中速度为 0 表示该时段没有数据。这里对整个矩阵一次性计算缺失掩码，
+统计每段连续缺失（缺口）的长度，然后:
+  1. 长度不超过 max_gap 个时段、两侧都有观测值的缺口做线性插值
+  2. 其余缺失时段用前几周同一时段观测值的均值填补（周期性插补；
+     之前没有观测时改用之后几周）
+  3. 仍无法填补的保持为 0
+
+结果为清洗后的速度矩阵和同形状的质量矩阵(uint8)，质量代码见 OBSERVED 等常量；
+流水线 data_quality 阶段把它们保存到 .pipeline/，下游统计和地图直接使用。
+全部为按行分块的向量化运算，没有逐条道路的 Python 循环。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from speedmatrix import SLOTS_PER_DAY
+
+
+# 质量代码
+OBSERVED = 0
+INTERPOLATED = 1
+SEASONAL = 2
+MISSING = 3
+
+MAX_INTERP_GAP = 6           # 最长插值缺口：6个时段 = 30分钟
+SEASONAL_PERIOD = SLOTS_PER_DAY * 7
+SEASONAL_WEEKS = 4
+
+
+def missing_mask(speeds):
+    """缺失掩码：速度为0、负数或NaN"""
+    speeds = np.asarray(speeds)
+    return ~(speeds > 0)
+
+
+def gap_runs(mask):
+    """
+    逐行统计连续缺失段，返回 (行号, 起始时段, 长度) 三个数组，以及与 mask 同形状、
+    每个缺失时段所在缺口长度的矩阵 run_length（非缺失处为0）
+    """
+    n_rows, n_slots = mask.shape
+    padded = np.zeros((n_rows, n_slots + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    lengths = ends - starts
+
+    # 按行优先顺序，缺失时段依次属于各个缺口
+    run_length = np.zeros(mask.shape, dtype=np.int32)
+    run_length[mask] = np.repeat(lengths, lengths)
+    return rows, starts, lengths, run_length
+
+
+def interpolate_gaps(speeds, mask, run_length, max_gap=MAX_INTERP_GAP):
+    """对不超过 max_gap 的内部缺口做线性插值，返回 (插值结果, 被填补的位置)"""
+    n_slots = mask.shape[1]
+    slots = np.arange(n_slots, dtype=np.int32)
+
+    prev_idx = np.where(mask, -1, slots)
+    np.maximum.accumulate(prev_idx, axis=1, out=prev_idx)
+    next_idx = np.where(mask, n_slots, slots)
+    next_idx = np.minimum.accumulate(next_idx[:, ::-1], axis=1)[:, ::-1]
+
+    fill = mask & (prev_idx >= 0) & (next_idx < n_slots) & (run_length <= max_gap)
+    prev_val = np.take_along_axis(speeds, np.clip(prev_idx, 0, n_slots - 1), axis=1)
+    next_val = np.take_along_axis(speeds, np.clip(next_idx, 0, n_slots - 1), axis=1)
+    span = np.maximum(next_idx - prev_idx, 1).astype(np.float32)
+    weight = (slots - prev_idx).astype(np.float32) / span
+    interpolated = prev_val + weight * (next_val - prev_val)
+    return np.where(fill, interpolated, speeds).astype(speeds.dtype), fill
+
+
+def seasonal_fill(speeds, observed, targets, period=SEASONAL_PERIOD, weeks=SEASONAL_WEEKS):
+    """
+    对 targets 中的时段，用前 weeks 周同一时段的观测值均值填补；前几周都没有观测时
+    改用之后 weeks 周。只使用原始观测值，不使用已插补的值。返回 (结果, 被填补的位置)
+    """
+    n_slots = speeds.shape[1]
+    result = speeds.copy()
+    filled = np.zeros(speeds.shape, dtype=bool)
+    remaining = targets.copy()
+    for direction in (1, -1):
+        total = np.zeros(speeds.shape, dtype=np.float32)
+        count = np.zeros(speeds.shape, dtype=np.int32)
+        for k in range(1, weeks + 1):
+            shift = direction * k * period
+            if abs(shift) >= n_slots:
+                break
+            # 目标时段 t 取 t - shift 处的值
+            if shift > 0:
+                src, dst = np.s_[:, :-shift], np.s_[:, shift:]
+            else:
+                src, dst = np.s_[:, -shift:], np.s_[:, :shift]
+            valid = observed[src]
+            total[dst] += np.where(valid, speeds[src], 0)
+            count[dst] += valid
+        use = remaining & (count > 0)
+        result[use] = (total[use] / count[use]).astype(speeds.dtype)
+        filled |= use
+        remaining &= ~use
+    return result, filled
+
+
+def clean_link_matrix(speeds, max_gap=MAX_INTERP_GAP, period=SEASONAL_PERIOD, weeks=SEASONAL_WEEKS,
+                      chunk_links=2000):
+    """
+    返回 (清洗后的 float32 速度矩阵, uint8 质量矩阵, 每条道路的质量汇总 DataFrame)
+    按 chunk_links 条道路分块处理以控制内存
+    """
+    speeds = np.asarray(speeds)
+    n_links = speeds.shape[0]
+    cleaned = np.empty(speeds.shape, dtype=np.float32)
+    quality = np.empty(speeds.shape, dtype=np.uint8)
+    summary = []
+
+    for start in range(0, n_links, chunk_links):
+        block = np.asarray(speeds[start:start + chunk_links], dtype=np.float32)
+        mask = missing_mask(block)
+        block = np.where(mask, 0, block).astype(np.float32)
+        rows, _, lengths, run_length = gap_runs(mask)
+
+        interpolated, interp_fill = interpolate_gaps(block, mask, run_length, max_gap)
+        seasonal, seasonal_fill_mask = seasonal_fill(block, ~mask, mask & ~interp_fill, period, weeks)
+        result = np.where(interp_fill, interpolated, seasonal)
+
+        q = np.full(block.shape, OBSERVED, dtype=np.uint8)
+        q[mask] = MISSING
+        q[interp_fill] = INTERPOLATED
+        q[seasonal_fill_mask] = SEASONAL
+        cleaned[start:start + len(block)] = np.where(q == MISSING, 0, result)
+        quality[start:start + len(block)] = q
+
+        n_block = len(block)
+        longest = np.zeros(n_block, dtype=np.int32)
+        np.maximum.at(longest, rows, lengths)
+        summary.append(pd.DataFrame({
+            'missing_ratio': mask.mean(axis=1),
+            'gap_count': np.bincount(rows, minlength=n_block),
+            'longest_gap': longest,
+            'interpolated': interp_fill.sum(axis=1),
+            'seasonal': seasonal_fill_mask.sum(axis=1),
+            'still_missing': (q == MISSING).sum(axis=1),
+        }))
+
+    return cleaned, quality, pd.concat(summary, ignore_index=True)
+
+
+def link_quality_table(links, summary):
+    return pd.concat([links[['link_id']].reset_index(drop=True), summary], axis=1)
+
+
+# 保存/读取清洗结果
+def save_clean_matrix(cleaned, quality, cleaned_path, quality_path):
+    for path, array in ((cleaned_path, cleaned), (quality_path, quality)):
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+
+def load_clean_matrix(cleaned_path, quality_path, mmap=True):
+    mode = 'r' if mmap else None
+    return np.load(cleaned_path, mmap_mode=mode), np.load(quality_path, mmap_mode=mode)
+
+
+class QualityMask:
+    """
+    有效掩码 quality <= max_code 的惰性版本：按块切片时才在该块内比较，
+    不会对 memmap 质量矩阵生成整个布尔矩阵。可以直接作为分块统计函数的 valid 参数
+    """
+
+    def __init__(self, quality, max_code=INTERPOLATED):
+        self.quality = quality
+        self.max_code = max_code
+        self.shape = quality.shape
+
+    def __getitem__(self, key):
+        return np.asarray(self.quality[key]) <= self.max_code
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+集成预测：LSTM、带天气特征的随机森林和季节性基线模型并行训练，按验证集学习的权重加权融合
+
+- 所有模型共用同一份特征（按数据内容哈希缓存为 .npz，每个工作进程只加载一次），
+  预测目标和 70%/15%/15% 的时间顺序划分完全一致，预测可以直接逐行融合
+- 特征只使用目标日之前的车速（滞后值、前一天为止的滚动统计），当天只用日历和天气，
+  所以车速未知的日期（平均速度为空）也可以预测
+- 成员模型:
+    lstm            trafficlstm.TrafficLSTM（检查点按特征和参数区分，可续训；
+                    早停用训练部分末尾的一段，不使用融合用的验证集）
+    random_forest   日历 + 滞后车速 + 前一天的滚动统计 + 当天最高/最低温度 + 天气类型 one-hot
+    seasonal_naive  按日期 7 天前的车速（每年4月1-7日没有7天前的数据，这些日期不作为预测目标，
+                    但仍作为 LSTM 序列的输入）
+    exp_smoothing   简单指数平滑的一步预测（平滑系数在训练集上选择）
+- 三组模型（LSTM / 随机森林 / 基线）在进程池中并行训练
+- 融合权重：验证集上的非负最小二乘，约束权重之和为 1
+- Ensemble.predict(df) 一次构造特征、批量计算所有成员的预测并融合
+
+用法:
+    python cli.py ensemble --epochs 150 --n-jobs 3
+    ensemble, report = train_ensemble(load_traffic_weather())
+    predictions = ensemble.predict(df)
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from memo import MEMO_DIR
+
+
+CACHE_DIR = os.path.join(MEMO_DIR, 'ensemble_features')
+SEQUENCE_LENGTH = 14
+SPLITS = (0.7, 0.15)
+LSTM_STOP_FRACTION = 0.15   # 训练部分末尾用于 LSTM 早停和选择最优 epoch 的比例
+NO_DATA = '无数据'
+MEMBERS = ['lstm', 'random_forest', 'seasonal_naive', 'exp_smoothing']
+LSTM_PARAMS = {'hidden_size': 64, 'num_layers': 2, 'dropout_rate': 0.3, 'lr': 0.001, 'batch_size': 32}
+RF_PARAMS = {'n_estimators': 300, 'min_samples_leaf': 2, 'max_features': 0.5}
+SMOOTHING_ALPHAS = np.linspace(0.05, 0.95, 19)
+
+_FEATURES = {}
+
+
+# ---------------------------------------------------------------------------
+# 特征
+# ---------------------------------------------------------------------------
+
+def build_features(df, sequence_length=SEQUENCE_LENGTH, scaler=None, weather_levels=None):
+    """
+    构造所有成员共用的特征。第 i 个样本的目标为 df_clean 中第 rows[i] 行（前面至少 sequence_length 行，
+    且有按日期 7 天前的车速）。scaler=(均值, 标准差) 与 weather_levels 为空时由训练部分拟合（训练时），
+    否则沿用（预测时）。平均速度为空的行保留为待预测的行（y 为 NaN，训练时不使用），其余列有缺失的行去掉
+    """
+    from trafficlstm import FEATURE_COLUMNS, TARGET_COLUMN, create_time_series_features
+
+    features = create_time_series_features(df)
+    # 滚动统计包含当天车速，表格特征改用前一天的值
+    rolling_columns = [column for column in FEATURE_COLUMNS if column.startswith('Speed_Rolling_')]
+    for column in rolling_columns:
+        features[f'{column}_Prev'] = features[column].shift(1)
+    tab_columns = [column for column in FEATURE_COLUMNS if column not in rolling_columns] + \
+        [f'{column}_Prev' for column in rolling_columns] + ['最高温度', '最低温度']
+    required = tab_columns + ['Date', '天气']
+    df_clean = features[features[required].notna().all(axis=1)].reset_index(drop=True)
+    # 季节性基线：按日期取 7 天前的车速（各年4月之间不连续，不能按行平移）
+    speed_by_date = features.dropna(subset=[TARGET_COLUMN]).set_index('Date')[TARGET_COLUMN]
+    week_ago = (df_clean['Date'] - pd.Timedelta(days=7)).map(speed_by_date).to_numpy(dtype=np.float64)
+    rows = np.arange(sequence_length, len(df_clean))
+    rows = rows[np.isfinite(week_ago[rows])]
+    n_samples = len(rows)
+    if n_samples <= 0:
+        raise ValueError(f"有效数据只有 {len(df_clean)} 天，不足以构造长度为 {sequence_length} 的序列")
+    train_size = int(SPLITS[0] * n_samples)
+    val_size = int(SPLITS[1] * n_samples)
+
+    X = df_clean[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    if scaler is None:
+        # 只用训练样本涉及的行拟合标准化参数
+        fit_rows = X[:rows[max(train_size, 1) - 1]]
+        scaler = (np.nanmean(fit_rows, axis=0), np.nanstd(fit_rows, axis=0))
+    mean, scale = np.asarray(scaler[0]), np.where(np.asarray(scaler[1]) > 0, scaler[1], 1.0)
+    # 车速未知的日期当天的滚动统计为空，作为序列中的一步时按均值（标准化后为 0）填补
+    X_scaled = np.nan_to_num((X - mean) / scale).astype(np.float32)
+    # (样本, 序列长度, 特征) 的滑动窗口视图，再复制为连续数组
+    windows = np.lib.stride_tricks.sliding_window_view(X_scaled, sequence_length, axis=0)
+    X_seq = np.ascontiguousarray(windows[rows - sequence_length].transpose(0, 2, 1))
+
+    target_rows = df_clean.iloc[rows]
+    speed = df_clean[TARGET_COLUMN].to_numpy(dtype=np.float64)
+    weather = target_rows['天气'].astype(str)
+    if weather_levels is None:
+        weather_levels = sorted(set(weather.iloc[:train_size]) - {NO_DATA})
+    weather_onehot = np.stack([(weather == level).to_numpy(dtype=np.float64) for level in weather_levels], axis=1) \
+        if len(weather_levels) else np.zeros((n_samples, 0))
+    X_tab = np.column_stack([target_rows[tab_columns].to_numpy(dtype=np.float64), weather_onehot])
+
+    return {
+        'X_seq': X_seq, 'X_tab': X_tab, 'y': speed[rows], 'rows': rows,
+        'history': speed, 'sequence_length': np.int64(sequence_length),
+        'week_ago': week_ago[rows],
+        'dates': target_rows['Date'].to_numpy().astype('datetime64[ns]'),
+        'scaler_mean': mean, 'scaler_scale': scale, 'weather_levels': np.asarray(weather_levels, dtype=str),
+        'splits': np.array([train_size, train_size + val_size], dtype=np.int64),
+    }
+
+
+def cached_features(df, sequence_length=SEQUENCE_LENGTH, cache_dir=CACHE_DIR):
+    """构造共用特征并按 (参数, 数据内容) 的哈希缓存为 .npz，返回文件路径"""
+    digest = hashlib.sha1()
+    digest.update(json.dumps(['ensemble', sequence_length, SPLITS]).encode('utf-8'))
+    # 特征构造方式改变后旧的缓存失效
+    digest.update(inspect.getsource(build_features).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    path = os.path.join(cache_dir, f'features-{digest.hexdigest()[:16]}.npz')
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **build_features(df, sequence_length))
+        os.replace(tmp_path, path)
+    return path
+
+
+def _init_worker(feature_path, torch_threads=1):
+    # 每个工作进程只加载一次特征
+    with np.load(feature_path) as data:
+        _FEATURES.update({name: data[name] for name in data.files})
+    import torch
+    torch.set_num_threads(torch_threads)
+
+
+# ---------------------------------------------------------------------------
+# 成员模型
+# ---------------------------------------------------------------------------
+
+def exp_smoothing_forecast(history, alpha, rows):
+    """简单指数平滑的一步预测：第 t 天的预测只用到第 t-1 天及以前的观测（缺失的日期沿用之前的水平）；
+    返回 history 中第 rows 行的预测"""
+    level = pd.Series(history).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return level[np.asarray(rows) - 1]
+
+
+def _lstm_model(input_size, params):
+    from trafficlstm import TrafficLSTM
+    return TrafficLSTM(input_size, params['hidden_size'], params['num_layers'], 1, params['dropout_rate'])
+
+
+def _predict_lstm(model, X_seq, batch_size=4096):
+    import torch
+
+    model.eval()
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, len(X_seq), batch_size):
+            outputs.append(model(torch.from_numpy(X_seq[start:start + batch_size])).numpy().ravel())
+    return np.concatenate(outputs) if outputs else np.zeros(0, dtype=np.float32)
+
+
+def fit_lstm(params, epochs, checkpoint_dir, seed=42, fingerprint=None):
+    import torch
+    import torch.nn as nn
+    import torch.optim as optim
+    from torch.utils.data import DataLoader, TensorDataset
+    from trafficlstm import load_best_model, train_model
+
+    data = _FEATURES
+    train_end = data['splits'][0]
+    # 早停只看训练部分末尾的一段，验证集留给融合权重；目标未知的样本不参与训练
+    stop_start = int(train_end * (1 - LSTM_STOP_FRACTION))
+    known = np.isfinite(data['y'])
+    fit_idx = np.flatnonzero(known[:stop_start])
+    stop_idx = stop_start + np.flatnonzero(known[stop_start:train_end])
+    # 目标按训练部分的均值/标准差缩放，和输入特征一样
+    y_train = data['y'][:train_end][known[:train_end]]
+    y_mean, y_std = y_train.mean(), y_train.std()
+    y_scaled = ((data['y'] - y_mean) / y_std).astype(np.float32)[:, None]
+    X_seq = data['X_seq']
+
+    torch.manual_seed(seed)
+    train_loader = DataLoader(TensorDataset(torch.from_numpy(X_seq[fit_idx]), torch.from_numpy(y_scaled[fit_idx])),
+                              batch_size=params['batch_size'], shuffle=True)
+    stop_loader = DataLoader(TensorDataset(torch.from_numpy(X_seq[stop_idx]), torch.from_numpy(y_scaled[stop_idx])),
+                             batch_size=params['batch_size'], shuffle=False)
+    model = _lstm_model(X_seq.shape[2], params)
+    optimizer = optim.Adam(model.parameters(), lr=params['lr'], weight_decay=1e-5)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=10, factor=0.5)
+    start = time.perf_counter()
+    train_model(model, train_loader, stop_loader, nn.MSELoss(), optimizer, epochs=epochs, scheduler=scheduler,
+                patience=20, checkpoint_dir=checkpoint_dir, log_every=epochs + 1, fingerprint=fingerprint)
+    load_best_model(model, checkpoint_dir)
+    fit_time = time.perf_counter() - start
+    state = {'state_dict': model.state_dict(), 'params': params, 'input_size': X_seq.shape[2],
+             'y_mean': float(y_mean), 'y_std': float(y_std)}
+    return {'lstm': {'state': state, 'predictions': _predict_lstm(model, X_seq) * y_std + y_mean,
+                     'fit_time': fit_time}}
+
+
+def fit_forest(params, seed=42):
+    from sklearn.ensemble import RandomForestRegressor
+
+    data = _FEATURES
+    train_end = data['splits'][0]
+    known = np.isfinite(data['y'][:train_end])
+    start = time.perf_counter()
+    model = RandomForestRegressor(random_state=seed, n_jobs=1, **params)
+    model.fit(data['X_tab'][:train_end][known], data['y'][:train_end][known])
+    fit_time = time.perf_counter() - start
+    return {'random_forest': {'state': model, 'predictions': model.predict(data['X_tab']), 'fit_time': fit_time}}
+
+
+def fit_baselines():
+    data = _FEATURES
+    train_end = data['splits'][0]
+    y, rows = data['y'][:train_end], data['rows']
+    known = np.isfinite(y)
+    start = time.perf_counter()
+    errors = [np.mean((exp_smoothing_forecast(data['history'], alpha, rows[:train_end])[known] - y[known]) ** 2)
+              for alpha in SMOOTHING_ALPHAS]
+    alpha = float(SMOOTHING_ALPHAS[int(np.argmin(errors))])
+    fit_time = time.perf_counter() - start
+    return {
+        'seasonal_naive': {'state': None, 'predictions': data['week_ago'], 'fit_time': 0.0},
+        'exp_smoothing': {'state': {'alpha': alpha}, 'fit_time': fit_time,
+                          'predictions': exp_smoothing_forecast(data['history'], alpha, rows)},
+    }
+
+
+def blend_weights(predictions, y):
+    """非负且和为 1 的融合权重：在非负最小二乘中加一行大权重的约束 sum(w) = 1；目标未知的行不参与"""
+    from scipy.optimize import nnls
+
+    known = np.isfinite(y)
+    predictions, y = predictions[known], y[known]
+    if len(y) == 0:
+        return np.full(predictions.shape[1], 1 / predictions.shape[1])
+    penalty = 1e3 * max(float(np.abs(y).max()), 1.0)
+    A = np.vstack([predictions, np.full(predictions.shape[1], penalty)])
+    b = np.append(y, penalty)
+    weights, _ = nnls(A, b)
+    total = weights.sum()
+    return weights / total if total > 0 else np.full(predictions.shape[1], 1 / predictions.shape[1])
+
+
+def _scores(y_true, y_pred):
+    known = np.isfinite(y_true)
+    y_true, y_pred = y_true[known], y_pred[known]
+    residual = y_true - y_pred
+    total = np.sum((y_true - np.mean(y_true)) ** 2)
+    return {'rmse': float(np.sqrt(np.mean(residual ** 2))), 'mae': float(np.mean(np.abs(residual))),
+            'r2': float(1 - np.sum(residual ** 2) / total) if total > 0 else float('nan')}
+
+
+# ---------------------------------------------------------------------------
+# 集成模型
+# ---------------------------------------------------------------------------
+
+class Ensemble:
+    """训练好的成员模型、融合权重和特征参数；predict 对新数据批量预测"""
+
+    def __init__(self, states, weights, features):
+        self.states = states
+        self.weights = dict(zip(MEMBERS, weights))
+        self.sequence_length = int(features['sequence_length'])
+        self.scaler = (features['scaler_mean'], features['scaler_scale'])
+        self.weather_levels = [str(level) for level in features['weather_levels']]
+        lstm = states['lstm']
+        self.lstm = _lstm_model(lstm['input_size'], lstm['params'])
+        self.lstm.load_state_dict(lstm['state_dict'])
+        self.lstm.eval()
+
+    def member_predictions(self, features):
+        """(样本数, 成员数) 的预测矩阵，列顺序同 MEMBERS"""
+        lstm = self.states['lstm']
+        return np.column_stack([
+            _predict_lstm(self.lstm, features['X_seq']) * lstm['y_std'] + lstm['y_mean'],
+            self.states['random_forest'].predict(features['X_tab']),
+            features['week_ago'],
+            exp_smoothing_forecast(features['history'], self.states['exp_smoothing']['alpha'], features['rows']),
+        ])
+
+    def predict(self, df):
+        """
+        df 与训练数据格式相同（Date、平均速度、天气、最高/最低温度），需包含前 sequence_length 天及
+        滞后特征所需的历史。返回 DataFrame: Date, actual, predicted 及各成员的预测
+        """
+        features = build_features(df, self.sequence_length, self.scaler, self.weather_levels)
+        members = self.member_predictions(features)
+        result = pd.DataFrame({'Date': features['dates'], 'actual': features['y'],
+                               'predicted': members @ np.array([self.weights[name] for name in MEMBERS])})
+        for j, name in enumerate(MEMBERS):
+            result[name] = members[:, j]
+        return result
+
+
+def train_ensemble(df=None, epochs=150, n_jobs=None, lstm_params=None, rf_params=None,
+                   checkpoint_dir='checkpoints/ensemble_lstm', cache_dir=CACHE_DIR, seed=42):
+    """
+    并行训练所有成员，在验证集上学习融合权重。LSTM 检查点放在 checkpoint_dir 下按
+    (特征数据, lstm_params, seed) 区分的子目录中，相同设置再次运行时续训。
+    返回 (Ensemble, 报告 DataFrame[member, weight, val_rmse, val_r2, test_rmse, test_mae, test_r2, fit_time])
+    """
+    if df is None:
+        from hpsearch import load_traffic_weather
+        df = load_traffic_weather()
+    lstm_params = {**LSTM_PARAMS, **(lstm_params or {})}
+    rf_params = {**RF_PARAMS, **(rf_params or {})}
+
+    print("正在准备共用特征（命中缓存时直接读取）...")
+    feature_path = cached_features(df, cache_dir=cache_dir)
+    # 特征文件名含数据哈希
+    fingerprint = hashlib.sha1(json.dumps([os.path.basename(feature_path), lstm_params, seed, LSTM_STOP_FRACTION],
+                                          sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    lstm_dir = os.path.join(checkpoint_dir, fingerprint)
+    jobs = [(fit_lstm, (lstm_params, epochs, lstm_dir, seed, fingerprint)), (fit_forest, (rf_params, seed)),
+            (fit_baselines, ())]
+
+    start = time.perf_counter()
+    results = {}
+    if n_jobs == 1:
+        _init_worker(feature_path)
+        for func, args in jobs:
+            results.update(func(*args))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs or len(jobs), initializer=_init_worker,
+                                 initargs=(feature_path,)) as executor:
+            futures = [executor.submit(func, *args) for func, args in jobs]
+            for future in futures:
+                results.update(future.result())
+    wall_time = time.perf_counter() - start
+
+    with np.load(feature_path) as data:
+        features = {name: data[name] for name in data.files}
+    train_end, val_end = features['splits']
+    y = features['y']
+    predictions = np.column_stack([results[name]['predictions'] for name in MEMBERS])
+    weights = blend_weights(predictions[train_end:val_end], y[train_end:val_end])
+    ensemble = Ensemble({name: results[name]['state'] for name in MEMBERS}, weights, features)
+
+    rows = []
+    for j, name in enumerate(MEMBERS + ['ensemble']):
+        pred = predictions @ weights if name == 'ensemble' else predictions[:, j]
+        val, test = _scores(y[train_end:val_end], pred[train_end:val_end]), _scores(y[val_end:], pred[val_end:])
+        rows.append({'member': name, 'weight': 1.0 if name == 'ensemble' else float(weights[j]),
+                     'val_rmse': val['rmse'], 'val_r2': val['r2'], 'test_rmse': test['rmse'],
+                     'test_mae': test['mae'], 'test_r2': test['r2'],
+                     'fit_time': wall_time if name == 'ensemble' else results[name]['fit_time']})
+    report = pd.DataFrame(rows)
+    print(f"训练完成: 并行耗时 {wall_time:.1f}s，各成员耗时合计 "
+          f"{sum(results[name]['fit_time'] for name in MEMBERS):.1f}s")
+    return ensemble, report
+
+
+def save_ensemble(ensemble, path):
+    import torch
+
+    tmp_path = path + '.tmp'
+    torch.save(ensemble, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_ensemble(path):
+    import torch
+    return torch.load(path, weights_only=False)
@@ -1,13 +1,18 @@
-import folium
 import pandas as pd
 import numpy as np
-from folium.plugins import MarkerCluster
-import webbrowser
 import os
+from instrument import count, span, traced
 
 
 # 读取数据
+@traced('folium.load_data')
 def load_data(file_path):
+    # speedstore 量化存储目录：速度解码为 float32，道路属性来自目录中的 links.parquet
+    if os.path.isdir(file_path):
+        from speedstore import read_links, read_store
+        from speedmatrix import as_load_data
+        return as_load_data(read_links(file_path), read_store(file_path), dtype=np.float32)
+
     df = pd.read_csv(file_path, header=None)
 
     # 提取基本信息
@@ -48,6 +53,7 @@ def generate_gangnam_coordinates(num_roads=304):
 
 
 # 基于道路ID生成更有组织的坐标
+@traced('folium.coordinates')
 def generate_organized_coordinates(link_ids, id_x, id_y):
     """
     基于道路ID和现有的x,y值生成更有组织的坐标布局
@@ -72,6 +78,7 @@ def generate_organized_coordinates(link_ids, id_x, id_y):
 
 
 # 计算统计信息
+@traced('folium.calculate_stats')
 def calculate_stats(speed_array):
     if len(speed_array) == 0:
         return 0, 0, 0, 0
@@ -90,6 +97,7 @@ def calculate_stats(speed_array):
 
 
 # 创建热力图数据
+@traced('folium.heatmap_data')
 def create_heatmap_data(coordinates, speed_data):
     """创建热力图所需的数据格式"""
     heat_data = []
@@ -105,22 +113,37 @@ def create_heatmap_data(coordinates, speed_data):
 
 
 # 创建地图
-def create_speed_dashboard(file_path, output_file="seoul_gangnam_speed_dashboard.html"):
+@traced('folium.dashboard')
+def create_speed_dashboard(file_path, output_file="seoul_gangnam_speed_dashboard.html", open_browser=True, data=None,
+                           percentiles=None, clusters=None, cluster_descriptions=None):
+    # folium 只在生成地图时导入，show_data_statistics 等统计功能不需要
+    import folium
+    from folium.plugins import MarkerCluster
+
     print("正在加载数据...")
 
-    # 检查文件是否存在
-    if not os.path.exists(file_path):
-        print(f"错误: 文件 {file_path} 不存在")
-        return None
+    # data 为 load_data 的返回值；传入时不再读取 file_path（流水线中复用已缓存的数据）
+    if data is None:
+        # 检查文件是否存在
+        if not os.path.exists(file_path):
+            print(f"错误: 文件 {file_path} 不存在")
+            return None
 
-    try:
-        link_ids, short_ids, id_x, id_y, speed_limits, lengths, directions, speed_data = load_data(file_path)
-    except Exception as e:
-        print(f"读取数据文件时出错: {e}")
-        return None
+        try:
+            data = load_data(file_path)
+        except Exception as e:
+            print(f"读取数据文件时出错: {e}")
+            return None
+    link_ids, short_ids, id_x, id_y, speed_limits, lengths, directions, speed_data = data
 
     print(f"成功加载 {len(link_ids)} 条道路数据")
 
+    # 每条道路的 p5/p50/p85 (道路数×3)，由分位数草图给出；流水线中传入已生成的草图结果
+    if percentiles is None:
+        from quantsketch import link_percentiles, link_speed_sketch
+        with span('folium.percentiles'):
+            percentiles = link_percentiles(link_speed_sketch(speed_data, scheme='all'), n_buckets=1)
+
     # 为江南区道路生成模拟坐标
     print("正在生成江南区道路模拟坐标...")
     coordinates = generate_organized_coordinates(link_ids, id_x, id_y)
@@ -167,73 +190,82 @@ def create_speed_dashboard(file_path, output_file="seoul_gangnam_speed_dashboard
 
     valid_points = 0
 
-    for i, (lat, lon) in enumerate(coordinates):
-        if i >= len(link_ids):
-            break
-
-        valid_points += 1
-
-        # 计算速度统计
-        speed_array = speed_data[i]
-        avg_speed, max_speed, min_speed, std_speed = calculate_stats(speed_array)
-
-        # 根据平均速度设置颜色
-        if avg_speed == 0:
-            color = 'gray'
-        elif avg_speed < 20:
-            color = 'red'
-        elif avg_speed < 40:
-            color = 'orange'
-        elif avg_speed < 60:
-            color = 'yellow'
-        else:
-            color = 'green'
-
-        # 创建弹出窗口内容
-        popup_content = f"""
-        <div style="width: 300px;">
-            <h4 style="color: #2c3e50; margin-bottom: 10px;">江南区道路段 #{i + 1}</h4>
-            <hr style="margin: 5px 0;">
-            <table style="width: 100%; font-size: 12px;">
-                <tr><td><b>道路ID:</b></td><td>{link_ids[i]}</td></tr>
-                <tr><td><b>短ID:</b></td><td>{short_ids[i]}</td></tr>
-                <tr><td><b>编码X:</b></td><td>{id_x[i]}</td></tr>
-                <tr><td><b>编码Y:</b></td><td>{id_y[i]}</td></tr>
-                <tr><td><b>限速:</b></td><td>{speed_limits[i]} km/h</td></tr>
-                <tr><td><b>长度:</b></td><td>{lengths[i]:.0f} m</td></tr>
-                <tr><td><b>方向:</b></td><td>{'上行' if directions[i] == 0 else '下行'}</td></tr>
-            </table>
-            <hr style="margin: 8px 0;">
-            <h5 style="color: #34495e; margin: 8px 0;">速度统计 (km/h)</h5>
-            <table style="width: 100%; font-size: 12px;">
-                <tr><td><b>平均速度:</b></td><td style="color: {color}; font-weight: bold;">{avg_speed:.1f}</td></tr>
-                <tr><td><b>最高速度:</b></td><td>{max_speed:.1f}</td></tr>
-                <tr><td><b>最低速度:</b></td><td>{min_speed:.1f}</td></tr>
-                <tr><td><b>标准差:</b></td><td>{std_speed:.1f}</td></tr>
-                <tr><td><b>数据点数:</b></td><td>{len(speed_array[speed_array > 0])}</td></tr>
-            </table>
-            <hr style="margin: 8px 0;">
-            <p style="font-size: 10px; color: #7f8c8d; margin: 0;">
-                📍 模拟位置 | 🕒 2018年4月数据<br>
-                <em>注：坐标为模拟生成，仅用于可视化展示</em>
-            </p>
-        </div>
-        """
-
-        # 添加标记
-        folium.Marker(
-            location=[lat, lon],
-            popup=folium.Popup(popup_content, max_width=350),
-            tooltip=f"道路 {short_ids[i]}: {avg_speed:.1f} km/h",
-            icon=folium.Icon(color=color, icon='road', prefix='fa')
-        ).add_to(marker_cluster)
-
-        # 每处理50个点显示进度
-        if valid_points % 50 == 0:
-            print(f"已处理 {valid_points} 个道路点...")
+    with span('folium.markers'):
+        for i, (lat, lon) in enumerate(coordinates):
+            if i >= len(link_ids):
+                break
+
+            valid_points += 1
+
+            # 计算速度统计
+            speed_array = speed_data[i]
+            avg_speed, max_speed, min_speed, std_speed = calculate_stats(speed_array)
+            p5, p50, p85 = np.nan_to_num(percentiles[i])
+
+            # 根据平均速度设置颜色
+            if avg_speed == 0:
+                color = 'gray'
+            elif avg_speed < 20:
+                color = 'red'
+            elif avg_speed < 40:
+                color = 'orange'
+            elif avg_speed < 60:
+                color = 'yellow'
+            else:
+                color = 'green'
+
+            # 创建弹出窗口内容
+            popup_content = f"""
+            <div style="width: 300px;">
+                <h4 style="color: #2c3e50; margin-bottom: 10px;">江南区道路段 #{i + 1}</h4>
+                <hr style="margin: 5px 0;">
+                <table style="width: 100%; font-size: 12px;">
+                    <tr><td><b>道路ID:</b></td><td>{link_ids[i]}</td></tr>
+                    <tr><td><b>短ID:</b></td><td>{short_ids[i]}</td></tr>
+                    <tr><td><b>编码X:</b></td><td>{id_x[i]}</td></tr>
+                    <tr><td><b>编码Y:</b></td><td>{id_y[i]}</td></tr>
+                    <tr><td><b>限速:</b></td><td>{speed_limits[i]} km/h</td></tr>
+                    <tr><td><b>长度:</b></td><td>{lengths[i]:.0f} m</td></tr>
+                    <tr><td><b>方向:</b></td><td>{'上行' if directions[i] == 0 else '下行'}</td></tr>
+                </table>
+                <hr style="margin: 8px 0;">
+                <h5 style="color: #34495e; margin: 8px 0;">速度统计 (km/h)</h5>
+                <table style="width: 100%; font-size: 12px;">
+                    <tr><td><b>平均速度:</b></td><td style="color: {color}; font-weight: bold;">{avg_speed:.1f}</td></tr>
+                    <tr><td><b>最高速度:</b></td><td>{max_speed:.1f}</td></tr>
+                    <tr><td><b>最低速度:</b></td><td>{min_speed:.1f}</td></tr>
+                    <tr><td><b>标准差:</b></td><td>{std_speed:.1f}</td></tr>
+                    <tr><td><b>P5 / P50 / P85:</b></td><td>{p5:.1f} / {p50:.1f} / {p85:.1f}</td></tr>
+                    <tr><td><b>数据点数:</b></td><td>{len(speed_array[speed_array > 0])}</td></tr>
+                </table>
+                <hr style="margin: 8px 0;">
+                <p style="font-size: 10px; color: #7f8c8d; margin: 0;">
+                    📍 模拟位置 | 🕒 2018年4月数据<br>
+                    <em>注：坐标为模拟生成，仅用于可视化展示</em>
+                </p>
+            </div>
+            """
+
+            # 添加标记
+            folium.Marker(
+                location=[lat, lon],
+                popup=folium.Popup(popup_content, max_width=350),
+                tooltip=f"道路 {short_ids[i]}: {avg_speed:.1f} km/h",
+                icon=folium.Icon(color=color, icon='road', prefix='fa')
+            ).add_to(marker_cluster)
+
+            # 每处理50个点显示进度
+            if valid_points % 50 == 0:
+                print(f"已处理 {valid_points} 个道路点...")
+    count('folium.markers', valid_points)
 
     print(f"成功创建 {valid_points} 个道路标记")
 
+    # 拥堵模式聚类图层（linkclusters，流水线 link_clusters 阶段的结果）
+    if clusters is not None:
+        from linkclusters import add_cluster_layer
+        add_cluster_layer(m, coordinates, link_ids, clusters, cluster_descriptions)
+
     # 添加图层控制
     folium.LayerControl().add_to(m)
 
@@ -291,23 +323,27 @@ def create_speed_dashboard(file_path, output_file="seoul_gangnam_speed_dashboard
     # 保存地图
     print(f"正在保存地图到 {output_file}...")
     try:
-        m.save(output_file)
+        with span('folium.save', file=output_file):
+            m.save(output_file)
         print("地图保存成功！")
     except Exception as e:
         print(f"保存地图时出错: {e}")
         return None
 
     # 在浏览器中打开
-    print("在浏览器中打开仪表盘...")
-    try:
-        webbrowser.open('file://' + os.path.realpath(output_file))
-    except:
-        print(f"请手动打开文件: {os.path.abspath(output_file)}")
+    if open_browser:
+        import webbrowser
+        print("在浏览器中打开仪表盘...")
+        try:
+            webbrowser.open('file://' + os.path.realpath(output_file))
+        except:
+            print(f"请手动打开文件: {os.path.abspath(output_file)}")
 
     return m
 
 
 # 显示数据统计信息
+@traced('folium.show_data_statistics')
 def show_data_statistics(file_path):
     print("\n正在分析数据...")
     try:
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+weathercor 随机森林与时间序列 LSTM 的超参数搜索
+
+- 随机搜索(random)或逐次减半(halving)：先用小预算(树的数量/训练轮数)评估所有
+  候选配置，每轮只保留最好的 1/eta 进入下一轮，差的配置被提前淘汰
+- 试验在进程池中并行运行，n_jobs 控制进程数
+- 预处理后的特征按数据内容哈希缓存为 .npz，每个工作进程只加载一次，所有试验共用
+- LSTM 试验复用 trafficlstm 的检查点，晋级下一轮时从上一轮的进度继续训练；
+  试验目录按 (特征数据, 搜索设置) 区分，每次搜索开始时清空，不会沿用以前搜索的检查点
+- 排行榜(CSV)同时记录验证集 RMSE/R² 与训练耗时
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from memo import memoize
+
+
+DATA_FILE = '首尔市区4月份交通天气数据_2017-2025.xlsx'
+CACHE_DIR = '.hpsearch_cache'
+
+# 搜索空间（每个参数的候选值）
+SEARCH_SPACES = {
+    'rf': {
+        'max_depth': [None, 4, 6, 8, 12, 16],
+        'min_samples_leaf': [1, 2, 4, 8],
+        'max_features': [1.0, 'sqrt', 0.5],
+    },
+    'lstm': {
+        'hidden_size': [16, 32, 64, 128],
+        'num_layers': [1, 2, 3],
+        'dropout_rate': [0.0, 0.1, 0.2, 0.3, 0.5],
+        'lr': [3e-4, 1e-3, 3e-3],
+        'batch_size': [16, 32, 64],
+    },
+}
+# 预算范围 (最小, 最大)：随机森林为树的数量，LSTM 为训练轮数
+RESOURCES = {'rf': (25, 400), 'lstm': (10, 150)}
+
+_FEATURES = {}
+
+
+# 读取数据（磁盘缓存，Excel 内容不变时不再重新解析）
+@memoize(files=('file_path',))
+def load_traffic_weather(file_path=DATA_FILE):
+    df = pd.read_excel(file_path)
+    df['Date'] = pd.to_datetime(df['日期'])
+    return df.sort_values('Date').reset_index(drop=True)
+
+
+# 随机森林特征（与 weathercor.ipynb 的回归/随机森林部分一致）
+def prepare_weather_features(df, test_size=0.2, random_state=42):
+    from sklearn.model_selection import train_test_split
+
+    regression_df = df[df['天气'] != '无数据'].copy()
+    weather_dummies = pd.get_dummies(regression_df['天气'], prefix='Weather')
+    regression_df = pd.concat([regression_df, weather_dummies], axis=1)
+
+    features = ['最高温度', '最低温度'] + list(weather_dummies.columns)
+    X = regression_df[features]
+    y = regression_df['平均速度']
+    valid_mask = X.notna().all(axis=1) & y.notna()
+    X = X[valid_mask].astype(float).values
+    y = y[valid_mask].values
+
+    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=test_size, random_state=random_state)
+    return {'X_train': X_train, 'y_train': y_train, 'X_val': X_val, 'y_val': y_val,
+            'feature_names': np.array(features)}
+
+
+# LSTM 特征（与 时间序列（无气象）.ipynb 一致，只取训练集和验证集，测试集留作最终评估）
+def prepare_lstm_features(df, sequence_length=14):
+    from sklearn.preprocessing import StandardScaler
+    from trafficlstm import create_time_series_features, create_sequences, FEATURE_COLUMNS, TARGET_COLUMN
+
+    df_clean = create_time_series_features(df).dropna()
+    scaler_X = StandardScaler()
+    scaler_y = StandardScaler()
+    X_scaled = scaler_X.fit_transform(df_clean[FEATURE_COLUMNS])
+    y_scaled = scaler_y.fit_transform(df_clean[[TARGET_COLUMN]])
+    X_sequences, y_sequences = create_sequences(X_scaled, y_scaled, sequence_length)
+
+    train_size = int(0.7 * len(X_sequences))
+    val_size = int(0.15 * len(X_sequences))
+    return {
+        'X_train': X_sequences[:train_size].astype(np.float32),
+        'y_train': y_sequences[:train_size].astype(np.float32),
+        'X_val': X_sequences[train_size:train_size + val_size].astype(np.float32),
+        'y_val': y_sequences[train_size:train_size + val_size].astype(np.float32),
+        'y_mean': scaler_y.mean_, 'y_scale': scaler_y.scale_,
+    }
+
+
+FEATURE_BUILDERS = {'rf': prepare_weather_features, 'lstm': prepare_lstm_features}
+
+
+def cached_features(kind, df, cache_dir=CACHE_DIR, **params):
+    """构造特征并按 (特征类型, 参数, 构造函数源码, 数据内容) 的哈希缓存为 .npz，返回文件路径"""
+    digest = hashlib.sha1()
+    digest.update(json.dumps([kind, params], sort_keys=True).encode('utf-8'))
+    # 改了特征构造代码后旧缓存自动失效
+    digest.update(inspect.getsource(FEATURE_BUILDERS[kind]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    path = os.path.join(cache_dir, f'{kind}-features-{digest.hexdigest()[:16]}.npz')
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        arrays = FEATURE_BUILDERS[kind](df, **params)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _init_worker(feature_paths, torch_threads=1):
+    # 每个工作进程只加载一次特征，之后所有试验直接使用内存中的数组
+    for kind, path in feature_paths.items():
+        with np.load(path) as data:
+            _FEATURES[kind] = {name: data[name] for name in data.files}
+    if 'lstm' in feature_paths:
+        import torch
+        torch.set_num_threads(torch_threads)
+
+
+def _regression_scores(y_true, y_pred):
+    residual = y_true - y_pred
+    rmse = float(np.sqrt(np.mean(residual ** 2)))
+    total = np.sum((y_true - np.mean(y_true)) ** 2)
+    r2 = float(1 - np.sum(residual ** 2) / total) if total > 0 else float('nan')
+    return rmse, r2
+
+
+def run_rf_trial(params, resource, trial_dir):
+    from sklearn.ensemble import RandomForestRegressor
+
+    data = _FEATURES['rf']
+    start = time.perf_counter()
+    model = RandomForestRegressor(n_estimators=resource, random_state=42, n_jobs=1, **params)
+    model.fit(data['X_train'], data['y_train'])
+    fit_time = time.perf_counter() - start
+    rmse, r2 = _regression_scores(data['y_val'], model.predict(data['X_val']))
+    return {'val_rmse': rmse, 'val_r2': r2, 'fit_time': fit_time}
+
+
+def run_lstm_trial(params, resource, trial_dir):
+    import torch
+    import torch.nn as nn
+    import torch.optim as optim
+    from torch.utils.data import DataLoader, TensorDataset
+    from trafficlstm import TrafficLSTM, checkpoint_fingerprint, train_model, load_best_model
+
+    data = _FEATURES['lstm']
+    torch.manual_seed(42)
+    train_loader = DataLoader(TensorDataset(torch.from_numpy(data['X_train']), torch.from_numpy(data['y_train'])),
+                              batch_size=params['batch_size'], shuffle=True)
+    val_loader = DataLoader(TensorDataset(torch.from_numpy(data['X_val']), torch.from_numpy(data['y_val'])),
+                            batch_size=params['batch_size'], shuffle=False)
+
+    model = TrafficLSTM(data['X_train'].shape[2], params['hidden_size'], params['num_layers'], 1,
+                        params['dropout_rate'])
+    optimizer = optim.Adam(model.parameters(), lr=params['lr'], weight_decay=1e-5)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=10, factor=0.5)
+    # 晋级的试验从上一轮的 last.pt 继续训练到新的轮数
+    history = train_model(model, train_loader, val_loader, nn.MSELoss(), optimizer, epochs=resource,
+                          scheduler=scheduler, patience=20, checkpoint_dir=trial_dir,
+                          log_every=resource + 1,
+                          fingerprint=checkpoint_fingerprint(data['X_train'], data['y_train'], data['X_val'],
+                                                             data['y_val'], seed=42, **params))
+    load_best_model(model, trial_dir)
+
+    model.eval()
+    with torch.no_grad():
+        predictions = model(torch.from_numpy(data['X_val'])).numpy().ravel()
+    scale, mean = data['y_scale'][0], data['y_mean'][0]
+    rmse, r2 = _regression_scores(data['y_val'].ravel() * scale + mean, predictions * scale + mean)
+    return {'val_rmse': rmse, 'val_r2': r2, 'fit_time': float(sum(history['epoch_time']))}
+
+
+TRIAL_RUNNERS = {'rf': run_rf_trial, 'lstm': run_lstm_trial}
+
+
+def _run_trial(model_name, params, resource, trial_dir):
+    result = TRIAL_RUNNERS[model_name](params, resource, trial_dir)
+    result.update(resource=resource)
+    return result
+
+
+def sample_configs(space, n_trials, rng):
+    """从搜索空间中随机抽取不重复的配置"""
+    total = math.prod(len(values) for values in space.values())
+    configs, seen = [], set()
+    while len(configs) < min(n_trials, total):
+        config = {name: values[rng.integers(len(values))] for name, values in space.items()}
+        key = json.dumps(config, sort_keys=True, default=str)
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+def rung_resources(min_resource, max_resource, eta):
+    # 逐次减半每一轮的预算：min, min*eta, ...，最后一轮为 max
+    resources = []
+    resource = min_resource
+    while resource < max_resource:
+        resources.append(int(resource))
+        resource *= eta
+    resources.append(max_resource)
+    return resources
+
+
+# 超参数搜索主函数
+def hyperparameter_search(df=None, models=('rf', 'lstm'), method='halving', n_trials=27, eta=3,
+                          n_jobs=None, cache_dir=CACHE_DIR, output_file='hpsearch_leaderboard.csv', seed=42):
+    """
+    method='halving' 时按 rung_resources 逐轮评估并淘汰，'random' 时所有配置直接用最大预算评估。
+    返回排行榜 DataFrame（每个试验一行，取其到达的最高一轮的结果）。
+    """
+    if df is None:
+        df = load_traffic_weather()
+    rng = np.random.default_rng(seed)
+
+    print("正在准备特征（命中缓存时直接读取）...")
+    feature_paths = {name: cached_features(name, df, cache_dir) for name in models}
+    # 本次搜索的试验目录：特征文件名含数据哈希，再加上搜索设置；先清空，保证第一轮从头训练
+    search_key = hashlib.sha1(json.dumps([sorted(os.path.basename(p) for p in feature_paths.values()),
+                                          sorted(models), method, n_trials, eta, seed]).encode()).hexdigest()[:12]
+    search_dir = os.path.join(cache_dir, 'trials', search_key)
+    shutil.rmtree(search_dir, ignore_errors=True)
+
+    # 每个模型族的试验状态
+    trials = []
+    active = {}
+    schedules = {}
+    for name in models:
+        min_resource, max_resource = RESOURCES[name]
+        schedules[name] = rung_resources(min_resource, max_resource, eta) if method == 'halving' else [max_resource]
+        ids = []
+        for params in sample_configs(SEARCH_SPACES[name], n_trials, rng):
+            key = hashlib.sha1(json.dumps([name, params], sort_keys=True, default=str).encode()).hexdigest()[:12]
+            trials.append({'model': name, 'trial': len(trials), 'params': params,
+                           'trial_dir': os.path.join(search_dir, f'{name}-{key}'),
+                           'rung': -1, 'status': 'running'})
+            ids.append(len(trials) - 1)
+        active[name] = ids
+
+    if n_jobs == 1:
+        _init_worker(feature_paths)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(feature_paths,))
+
+    try:
+        rung = 0
+        while any(active.values()):
+            # 同一轮里两个模型族的试验一起提交
+            jobs = []
+            for name, ids in active.items():
+                if not ids:
+                    continue
+                resource = schedules[name][rung]
+                for trial_id in ids:
+                    trial = trials[trial_id]
+                    args = (name, trial['params'], resource, trial['trial_dir'])
+                    jobs.append((trial_id, executor.submit(_run_trial, *args) if executor else args))
+            for trial_id, job in jobs:
+                result = job.result() if executor else _run_trial(*job)
+                trials[trial_id].update(result, rung=rung)
+
+            for name, ids in active.items():
+                if not ids:
+                    continue
+                ranked = sorted(ids, key=lambda i: trials[i]['val_rmse'])
+                best = trials[ranked[0]]
+                print(f"[{name}] 第 {rung + 1} 轮 (预算 {schedules[name][rung]}): {len(ids)} 个试验, "
+                      f"最优 RMSE {best['val_rmse']:.4f}")
+                if rung + 1 >= len(schedules[name]):
+                    for trial_id in ids:
+                        trials[trial_id]['status'] = 'completed'
+                    active[name] = []
+                    continue
+                keep = max(1, len(ids) // eta)
+                for trial_id in ranked[keep:]:
+                    trials[trial_id]['status'] = 'pruned'
+                active[name] = ranked[:keep]
+            rung += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    leaderboard = pd.DataFrame([{
+        'model': t['model'], 'trial': t['trial'], 'status': t['status'], 'rung': t['rung'] + 1,
+        'resource': t.get('resource'), 'val_rmse': t.get('val_rmse'), 'val_r2': t.get('val_r2'),
+        'fit_time': t.get('fit_time'), 'params': json.dumps(t['params'], default=str),
+    } for t in trials])
+    leaderboard = leaderboard.sort_values(['model', 'rung', 'val_rmse'], ascending=[True, False, True])
+    if output_file:
+        leaderboard.to_csv(output_file, index=False, encoding='utf-8-sig')
+        print(f"排行榜已保存: {output_file}")
+    return leaderboard
+
+
+def main():
+    parser = argparse.ArgumentParser(description='随机森林 / LSTM 超参数搜索')
+    parser.add_argument('--models', nargs='+', default=['rf', 'lstm'], choices=sorted(SEARCH_SPACES))
+    parser.add_argument('--method', default='halving', choices=['halving', 'random'])
+    parser.add_argument('--trials', type=int, default=27, help='每个模型族的候选配置数')
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--n-jobs', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('--output', default='hpsearch_leaderboard.csv')
+    args = parser.parse_args()
+
+    leaderboard = hyperparameter_search(models=args.models, method=args.method, n_trials=args.trials,
+                                        eta=args.eta, n_jobs=args.n_jobs, output_file=args.output)
+    print(leaderboard.groupby('model').head(5).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
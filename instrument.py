@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+轻量级性能埋点：命名计时区间(span)、计数器，以及可选的 tracemalloc / cProfile
+
+默认关闭，关闭时 span() 返回共享的空上下文、count() 直接返回，几乎没有开销。
+通过环境变量开启（也可以在代码里调用 enable()）:
+
+    TRAFFIC_TRACE=trace.json python foliumscript.py          # 写出计时数据
+    TRAFFIC_TRACE=1 ...                                      # 文件名默认为 traffic_trace_<pid>.json
+    TRAFFIC_TRACE_MEMORY=1                                   # 同时用 tracemalloc 记录每个区间的内存峰值
+    TRAFFIC_TRACE_PROFILE=1                                  # 同时用 cProfile 采样，另存为 .prof
+
+路径中可以使用 {pid}，多进程（如 pipeline.py 的进程池）时每个进程写各自的文件。
+输出为 Chrome trace 格式（可在 chrome://tracing 或 Perfetto 中打开），并附带按名称
+汇总的 summary 和 counters，便于脚本对比。
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+
+DEFAULT_TRACE_FILE = 'traffic_trace_{pid}.json'
+
+_enabled = False
+_state = None
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'attrs', 'start', 'mem_start', 'mem_peak')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        state = _state
+        if state.memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            stack = state.stack()
+            if stack:
+                stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+            tracemalloc.reset_peak()
+            self.mem_start = current
+            self.mem_peak = current
+            stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        state = _state
+        if state is None:  # 区间执行期间被 disable()
+            return False
+        event = {
+            'name': self.name,
+            'ph': 'X',
+            'ts': (self.start - state.origin) / 1000,
+            'dur': (end - self.start) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+        }
+        args = dict(self.attrs)
+        if exc_type is not None:
+            args['error'] = exc_type.__name__
+        if state.memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            self.mem_peak = max(self.mem_peak, peak)
+            stack = state.stack()
+            if stack and stack[-1] is self:
+                stack.pop()
+            if stack:
+                stack[-1].mem_peak = max(stack[-1].mem_peak, self.mem_peak)
+            tracemalloc.reset_peak()
+            args['mem_peak_mb'] = round(self.mem_peak / 2 ** 20, 3)
+            args['mem_delta_mb'] = round((current - self.mem_start) / 2 ** 20, 3)
+        if args:
+            event['args'] = args
+        with state.lock:
+            state.events.append(event)
+        return False
+
+
+class _TraceState:
+    def __init__(self, trace_file, memory, profile):
+        self.trace_file = trace_file
+        self.memory = memory
+        self.origin = time.perf_counter_ns()
+        self.started = time.time()
+        self.events = []
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.profiler = None
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+
+def enabled():
+    return _enabled
+
+
+def enable(trace_file=None, memory=False, profile=False):
+    """开启埋点；trace_file 为 None 时只在内存中收集，可用 summary() 查看"""
+    global _enabled, _state
+    if _enabled:
+        disable()
+    _state = _TraceState(trace_file, memory, profile)
+    if memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    if _state.profiler is not None:
+        _state.profiler.enable()
+    _enabled = True
+
+
+def disable():
+    """关闭埋点并写出 trace 文件（如果指定了），返回收集到的数据"""
+    global _enabled, _state
+    if not _enabled:
+        return None
+    state = _state
+    _enabled = False
+    if state.profiler is not None:
+        state.profiler.disable()
+    if state.memory:
+        import tracemalloc
+        tracemalloc.stop()
+    trace = _build_trace(state)
+    if state.trace_file:
+        write_trace(trace, state.trace_file, state.profiler)
+    _state = None
+    return trace
+
+
+def flush():
+    """不关闭埋点，立即写出目前收集到的数据（进程池子进程退出时不会执行 atexit）"""
+    if _enabled and _state.trace_file:
+        write_trace(_build_trace(_state), _state.trace_file, _state.profiler)
+        if _state.profiler is not None:
+            _state.profiler.enable()  # dump_stats 会停止采样
+
+
+def span(name, **attrs):
+    """计时区间: with span('folium.save', file=path): ..."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+
+def traced(name=None):
+    """函数装饰器，把每次调用记录为一个区间；关闭时只多一次标志判断"""
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    """累加计数器"""
+    if not _enabled:
+        return
+    state = _state
+    with state.lock:
+        state.counters[name] = state.counters.get(name, 0) + n
+
+
+def summary(events=None):
+    """按区间名称汇总: 调用次数、总耗时、最大耗时(秒)"""
+    if events is None:
+        if _state is None:
+            return {}
+        events = _state.events
+    result = {}
+    for event in events:
+        item = result.setdefault(event['name'], {'count': 0, 'total_s': 0.0, 'max_s': 0.0})
+        dur = event['dur'] / 1e6
+        item['count'] += 1
+        item['total_s'] += dur
+        item['max_s'] = max(item['max_s'], dur)
+        mem = event.get('args', {}).get('mem_peak_mb')
+        if mem is not None:
+            item['mem_peak_mb'] = max(item.get('mem_peak_mb', 0.0), mem)
+    for item in result.values():
+        item['total_s'] = round(item['total_s'], 6)
+        item['max_s'] = round(item['max_s'], 6)
+    return result
+
+
+def _build_trace(state):
+    with state.lock:
+        events = list(state.events)
+        counters = dict(state.counters)
+    return {
+        'traceEvents': events,
+        'displayTimeUnit': 'ms',
+        'counters': counters,
+        'summary': summary(events),
+        'meta': {
+            'pid': os.getpid(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(state.started)),
+            'wall_s': round((time.perf_counter_ns() - state.origin) / 1e9, 6),
+            'memory': state.memory,
+            'profile': state.profiler is not None,
+        },
+    }
+
+
+def write_trace(trace, trace_file, profiler=None):
+    path = trace_file.format(pid=os.getpid())
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f, ensure_ascii=False)
+    if profiler is not None:
+        profiler.dump_stats(os.path.splitext(path)[0] + '.prof')
+    print(f"性能数据已写入: {path}")
+
+
+def _enable_from_env():
+    value = os.environ.get('TRAFFIC_TRACE')
+    if not value or value == '0':
+        return
+    trace_file = DEFAULT_TRACE_FILE if value == '1' else value
+    enable(trace_file,
+           memory=os.environ.get('TRAFFIC_TRACE_MEMORY', '0') not in ('', '0'),
+           profile=os.environ.get('TRAFFIC_TRACE_PROFILE', '0') not in ('', '0'))
+    atexit.register(disable)
+
+
+_enable_from_env()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+按一天内的拥堵模式对道路聚类，并提供"与这条道路相似的道路"近似最近邻查询
+
+1. 日内速度曲线：每条道路按时段求各天平均，合并为 bins_per_day 个区间（默认半小时），
+   再除以该道路曲线的最大值（近似自由流速度），得到 0-1 的相对速度曲线
+2. 随机化 PCA 降到 n_components 维
+3. MiniBatchKMeans 聚类
+4. 近似最近邻：以聚类中心为倒排索引 (IVF)，查询时只在最近的 n_probe 个簇内精确比较
+
+全部按道路分块的向量化运算，数万条道路几秒内完成。聚类结果由流水线 link_clusters
+阶段保存，江南区地图中作为"拥堵模式"图层显示。
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from speedmatrix import SLOTS_PER_DAY
+
+
+BINS_PER_DAY = 48
+N_COMPONENTS = 8
+N_CLUSTERS = 6
+N_PROBE = 2
+CLUSTER_COLORS = ['#e41a1c', '#377eb8', '#4daf4a', '#984ea3', '#ff7f00', '#a65628', '#f781bf', '#999999',
+                  '#66c2a5', '#fc8d62']
+
+# embedding: 降维后的坐标; labels: 簇号; centroids: 聚类中心; members: 每个簇的道路下标
+LinkIndex = namedtuple('LinkIndex', ['embedding', 'labels', 'centroids', 'members'])
+
+
+def daily_profiles(speeds, valid=None, bins_per_day=BINS_PER_DAY, chunk_links=2000):
+    """
+    返回 (相对速度曲线 (道路数, bins_per_day), 自由流速度 (道路数,))。
+    没有数据的区间用该道路的平均相对速度填补，完全没有数据的道路曲线为全1
+    """
+    n_links, n_slots = speeds.shape
+    n_days = n_slots // SLOTS_PER_DAY
+    width = n_days * SLOTS_PER_DAY
+    per_bin = SLOTS_PER_DAY // bins_per_day
+    profiles = np.ones((n_links, bins_per_day), dtype=np.float32)
+    free_flow = np.zeros(n_links, dtype=np.float32)
+
+    for row in range(0, n_links, chunk_links):
+        block = np.asarray(speeds[row:row + chunk_links, :width], dtype=np.float32)
+        mask = block > 0 if valid is None else np.asarray(valid[row:row + chunk_links, :width])
+        n = len(block)
+        # (道路, 天, 区间, 区间内时段) -> 对天和区间内时段求和
+        shape = (n, n_days, bins_per_day, per_bin)
+        total = np.where(mask, block, 0).reshape(shape).sum(axis=(1, 3))
+        count = mask.reshape(shape).sum(axis=(1, 3))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            profile = total / count
+            peak = np.nanmax(np.where(count > 0, profile, np.nan), axis=1)
+            relative = profile / peak[:, None]
+            fill = np.nanmean(np.where(count > 0, relative, np.nan), axis=1)
+        has_data = np.isfinite(peak) & (peak > 0)
+        relative = np.where(count > 0, relative, fill[:, None])
+        profiles[row:row + n] = np.where(has_data[:, None], relative, 1)
+        free_flow[row:row + n] = np.where(has_data, peak, 0)
+    return profiles, free_flow
+
+
+def reduce_profiles(profiles, n_components=N_COMPONENTS, seed=0):
+    """随机化 PCA，返回 (降维结果, 拟合好的 PCA)"""
+    from sklearn.decomposition import PCA
+
+    n_components = min(n_components, profiles.shape[0], profiles.shape[1])
+    pca = PCA(n_components=n_components, svd_solver='randomized', random_state=seed)
+    return pca.fit_transform(profiles).astype(np.float32), pca
+
+
+def cluster_profiles(embedding, n_clusters=N_CLUSTERS, seed=0, batch_size=4096):
+    """MiniBatchKMeans，返回 (簇号, 聚类中心)"""
+    from sklearn.cluster import MiniBatchKMeans
+
+    n_clusters = min(n_clusters, len(embedding))
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, n_init=3, random_state=seed)
+    labels = kmeans.fit_predict(embedding)
+    return labels.astype(np.int32), kmeans.cluster_centers_.astype(np.float32)
+
+
+def build_index(embedding, labels, centroids):
+    order = np.argsort(labels, kind='stable')
+    bounds = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+    members = [order[bounds[c]:bounds[c + 1]] for c in range(len(centroids))]
+    return LinkIndex(embedding, labels, centroids, members)
+
+
+def similar_links(index, query, k=10, n_probe=N_PROBE):
+    """
+    与 query（道路下标，或降维空间中的向量）最相似的 k 条道路，返回 (道路下标, 距离)。
+    只搜索离 query 最近的 n_probe 个簇；n_probe 等于簇数时为精确搜索
+    """
+    if np.ndim(query) == 0:
+        exclude = int(query)
+        query = index.embedding[exclude]
+    else:
+        exclude = -1
+        query = np.asarray(query, dtype=np.float32)
+    centroid_dist = ((index.centroids - query) ** 2).sum(axis=1)
+    probe = np.argsort(centroid_dist)[:n_probe]
+    candidates = np.concatenate([index.members[c] for c in probe])
+    candidates = candidates[candidates != exclude]
+    dist = np.sqrt(((index.embedding[candidates] - query) ** 2).sum(axis=1))
+    top = np.argsort(dist)[:k]
+    return candidates[top], dist[top]
+
+
+def describe_clusters(profiles, labels, n_clusters):
+    """每个簇的平均曲线和简要描述（最慢的时刻、最低相对速度）"""
+    bins_per_day = profiles.shape[1]
+    hours = np.arange(bins_per_day) * 24 / bins_per_day
+    rows = []
+    for c in range(n_clusters):
+        member = labels == c
+        mean_profile = profiles[member].mean(axis=0) if member.any() else np.ones(bins_per_day)
+        slowest = int(np.argmin(mean_profile))
+        rows.append({
+            'cluster': c,
+            'links': int(member.sum()),
+            'slowest_hour': float(hours[slowest]),
+            'min_relative_speed': float(mean_profile[slowest]),
+            'mean_relative_speed': float(mean_profile.mean()),
+            'profile': mean_profile.astype(float).tolist(),
+        })
+    table = pd.DataFrame(rows)
+    table['description'] = [f"最慢 {int(h):02d}:{round(h % 1 * 60):02d} (自由流的 {v:.0%})"
+                            for h, v in zip(table['slowest_hour'], table['min_relative_speed'])]
+    return table
+
+
+def cluster_links(links, speeds, valid=None, n_clusters=N_CLUSTERS, n_components=N_COMPONENTS,
+                  bins_per_day=BINS_PER_DAY, seed=0):
+    """完整流程，返回 (每条道路的聚类结果表, 簇描述表, LinkIndex)"""
+    profiles, free_flow = daily_profiles(speeds, valid, bins_per_day)
+    embedding, _ = reduce_profiles(profiles, n_components, seed)
+    labels, centroids = cluster_profiles(embedding, n_clusters, seed)
+    index = build_index(embedding, labels, centroids)
+
+    table = pd.DataFrame({'link_id': links['link_id'].to_numpy(), 'cluster': labels, 'free_flow': free_flow})
+    for j in range(embedding.shape[1]):
+        table[f'pc{j + 1}'] = embedding[:, j]
+    return table, describe_clusters(profiles, labels, len(centroids)), index
+
+
+def index_from_table(table):
+    """由保存的聚类结果表重建 LinkIndex（用于相似道路查询）"""
+    embedding = table.filter(regex=r'^pc\d+$').to_numpy(dtype=np.float32)
+    labels = table['cluster'].to_numpy(dtype=np.int32)
+    n_clusters = labels.max() + 1
+    centroids = np.stack([embedding[labels == c].mean(axis=0) for c in range(n_clusters)])
+    return build_index(embedding, labels, centroids)
+
+
+def add_cluster_layer(m, coordinates, link_ids, labels, descriptions=None, name='拥堵模式聚类'):
+    """在 folium 地图上添加按簇着色的道路图层（默认不显示，可在图层控制中打开）"""
+    import folium
+
+    layer = folium.FeatureGroup(name=name, show=False)
+    for (lat, lon), link_id, label in zip(coordinates, link_ids, labels):
+        text = f"道路 {link_id}: 模式 {label}"
+        if descriptions is not None:
+            text += f" — {descriptions[label]}"
+        folium.CircleMarker(location=[lat, lon], radius=5, color=CLUSTER_COLORS[label % len(CLUSTER_COLORS)],
+                            fill=True, fill_opacity=0.8, tooltip=text).add_to(layer)
+    layer.add_to(m)
+    return layer
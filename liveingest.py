@@ -0,0 +1,539 @@
+# -*- coding: utf-8 -*-
+"""
+实时5分钟车速数据接入（asyncio）
+
+数据源（任选其一或同时使用）:
+  - 投放目录: 往 live/inbox/ 放入 CSV 文件（列 ts, link_id, speed），处理后删除
+  - TCP socket: 每行 "ts,link_id,speed"，同一时段的记录攒成一批
+
+每批数据:
+  1. 写入内存映射的 道路×时段 速度矩阵 live/speeds_live.npy（预分配 capacity 个时段，
+     时段号 = (ts - start) / 5分钟，重复上报同一时段时覆盖；start 默认取第一条记录当天0点）。
+     时段超出当前矩阵时换段：旧矩阵归档为 live/speeds_live_<段起始时间>.npy，新建空矩阵继续写入，
+     晚于换段到达的旧段记录丢弃
+  2. 增量更新每条道路的累计统计（个数/和/平方和）和最近 ROLLING_SLOTS 个时段的滚动平均
+  3. 标记为待渲染；渲染任务按 render_interval 合并多批数据，重新计算各图层
+     (markers / heatmap / summary)，只重写内容有变化的图层 JSON
+
+live/index.html 只在启动时生成一次（folium 底图 + 轮询脚本），浏览器按 manifest.json
+中的版本号只拉取变化的图层。内存占用与道路数成正比，与已接入的时段数无关（矩阵在磁盘上）。
+
+用法:
+    python liveingest.py serve --http-port 8000 --port 9000   # 打开 http://localhost:8000/
+    python liveingest.py replay --interval 1                  # 用 urban-core.csv 模拟数据源
+    python cli.py live --http-port 8000
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from instrument import count, span
+from speedmatrix import SLOT_MINUTES, SLOTS_PER_DAY, URBAN_CORE_START
+
+
+LIVE_DIR = 'live'
+INBOX_DIR = os.path.join(LIVE_DIR, 'inbox')
+LINKS_PARQUET = os.path.join('.pipeline', 'links.parquet')
+URBAN_CORE_FILE = 'urban-core.csv'
+
+CAPACITY_SLOTS = SLOTS_PER_DAY * 31
+ROLLING_SLOTS = 12              # 滚动平均窗口：最近1小时
+RENDER_INTERVAL = 1.0           # 秒
+POLL_INTERVAL = 0.5             # 投放目录轮询间隔（秒）
+BROWSER_POLL_MS = 2000
+QUEUE_SIZE = 64                 # 待处理批次上限，满了以后数据源等待（背压）
+SOCKET_BATCH = 5000
+
+# 与 foliumscript 的颜色分级一致: 无数据 / <20 / <40 / <60 / ≥60
+LEVEL_BOUNDS = [20, 40, 60]
+LEVEL_COLORS = ['gray', 'red', 'orange', 'yellow', 'green']
+
+
+# ---------------------------------------------------------------------------
+# 矩阵与统计
+# ---------------------------------------------------------------------------
+
+def open_live_matrix(path, n_links, capacity=CAPACITY_SLOTS):
+    """打开（不存在时创建）预分配的 道路×时段 float32 内存映射矩阵"""
+    if os.path.exists(path):
+        matrix = np.load(path, mmap_mode='r+')
+        if matrix.shape[0] != n_links:
+            raise ValueError(f"{path} 的道路数 {matrix.shape[0]} 与道路表 {n_links} 不一致")
+        return matrix
+    return np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(n_links, capacity))
+
+
+class RollingStats:
+    """每条道路的累计统计和最近 window 个时段的滚动窗口，按批增量更新"""
+
+    def __init__(self, n_links, window=ROLLING_SLOTS):
+        self.window = window
+        self.count = np.zeros(n_links, dtype=np.int64)
+        self.total = np.zeros(n_links)
+        self.total_sq = np.zeros(n_links)
+        self.ring = np.zeros((n_links, window), dtype=np.float32)
+        self.latest = np.zeros(n_links, dtype=np.float32)
+        self.last_slot = -1
+
+    def _advance(self, slot):
+        """窗口移动到 slot，清空被跳过的时段"""
+        if slot <= self.last_slot:
+            return
+        for s in range(max(self.last_slot + 1, slot - self.window + 1), slot + 1):
+            self.ring[:, s % self.window] = 0
+        self.last_slot = slot
+
+    def update(self, slot, link_idx, new, old):
+        """link_idx 道路在 slot 时段的读数从 old 变为 new（0 表示缺失）"""
+        new_valid, old_valid = new > 0, old > 0
+        new_value = np.where(new_valid, new, 0).astype(np.float64)
+        old_value = np.where(old_valid, old, 0).astype(np.float64)
+        np.add.at(self.count, link_idx, new_valid.astype(np.int64) - old_valid)
+        np.add.at(self.total, link_idx, new_value - old_value)
+        np.add.at(self.total_sq, link_idx, new_value ** 2 - old_value ** 2)
+
+        self._advance(slot)
+        if slot > self.last_slot - self.window:
+            self.ring[link_idx, slot % self.window] = new
+        if slot == self.last_slot:
+            self.latest[link_idx] = np.where(new_valid, new, self.latest[link_idx])
+
+    def rebuild(self, matrix, n_slots, offset=0, chunk_slots=SLOTS_PER_DAY):
+        """重启时从已写入的矩阵恢复统计（矩阵第0列是时段 offset；只恢复当前段）"""
+        for col in range(0, n_slots, chunk_slots):
+            block = np.asarray(matrix[:, col:min(col + chunk_slots, n_slots)], dtype=np.float64)
+            valid = block > 0
+            self.count += valid.sum(axis=1)
+            self.total += np.where(valid, block, 0).sum(axis=1)
+            self.total_sq += np.where(valid, block ** 2, 0).sum(axis=1)
+        if n_slots:
+            self.last_slot = offset + n_slots - 1
+            for s in range(max(0, n_slots - self.window), n_slots):
+                self.ring[:, (offset + s) % self.window] = matrix[:, s]
+            last = np.asarray(matrix[:, n_slots - 1])
+            self.latest = np.where(last > 0, last, 0).astype(np.float32)
+
+    def rolling_mean(self):
+        valid = self.ring > 0
+        n = valid.sum(axis=1)
+        return np.where(n > 0, np.where(valid, self.ring, 0).sum(axis=1) / np.maximum(n, 1), 0)
+
+    def mean(self):
+        return np.where(self.count > 0, self.total / np.maximum(self.count, 1), 0)
+
+    def std(self):
+        mean = self.mean()
+        var = np.where(self.count > 0, self.total_sq / np.maximum(self.count, 1) - mean ** 2, 0)
+        return np.sqrt(np.maximum(var, 0))
+
+
+def speed_levels(speeds):
+    """速度 -> 颜色等级下标 (0 为无数据)"""
+    return np.where(speeds > 0, np.searchsorted(LEVEL_BOUNDS, speeds, side='right') + 1, 0)
+
+
+# ---------------------------------------------------------------------------
+# 数据源
+# ---------------------------------------------------------------------------
+
+def records_to_batches(records, position, start):
+    """DataFrame(ts, link_id, speed) -> [(时段号, 道路下标, 速度)]，未知道路丢弃"""
+    slots = ((pd.to_datetime(records['ts']) - pd.Timestamp(start)) // pd.Timedelta(minutes=SLOT_MINUTES))
+    link_idx = records['link_id'].map(position)
+    known = link_idx.notna().to_numpy() & (slots >= 0).to_numpy()
+    if not known.all():
+        count('live.unknown_records', int((~known).sum()))
+    slots = slots.to_numpy()[known].astype(np.int64)
+    link_idx = link_idx.to_numpy()[known].astype(np.int64)
+    speeds = pd.to_numeric(records['speed'], errors='coerce').fillna(0).to_numpy(dtype=np.float32)[known]
+
+    # 同一道路同一时段重复上报时保留最后一条
+    _, last = np.unique((slots * len(position) + link_idx)[::-1], return_index=True)
+    keep = np.sort(len(slots) - 1 - last)
+    order = keep[np.argsort(slots[keep], kind='stable')]
+    slots, link_idx, speeds = slots[order], link_idx[order], speeds[order]
+    bounds = np.flatnonzero(np.diff(slots)) + 1
+    return [(int(s[0]), i, v) for s, i, v in zip(np.split(slots, bounds), np.split(link_idx, bounds),
+                                                 np.split(speeds, bounds)) if len(s)]
+
+
+async def watch_directory(service, inbox=INBOX_DIR, poll_interval=POLL_INTERVAL):
+    """轮询投放目录，按文件名顺序读取 *.csv，读完删除；读取或解析失败的文件改名为 .bad"""
+    os.makedirs(inbox, exist_ok=True)
+    while True:
+        for path in sorted(glob.glob(os.path.join(inbox, '*.csv'))):
+            received = time.time()
+            try:
+                records = await asyncio.to_thread(pd.read_csv, path)
+                batches = service.to_batches(records)
+            except Exception as e:
+                # 缺列、时间无法解析等：移走文件，避免服务退出或重启后反复失败
+                print(f"读取 {path} 时出错: {e}")
+                count('live.bad_files')
+                os.replace(path, path + '.bad')
+                continue
+            await service.queue.put((received, batches))
+            os.remove(path)
+        await asyncio.sleep(poll_interval)
+
+
+async def _handle_socket(service, reader, writer):
+    pending = []
+    current_ts = None
+
+    async def flush():
+        if pending:
+            records = pd.DataFrame(pending, columns=['ts', 'link_id', 'speed'])
+            records['link_id'] = pd.to_numeric(records['link_id'], errors='coerce')
+            pending.clear()
+            try:
+                batches = service.to_batches(records)
+            except Exception:
+                # 时间无法解析等：丢弃这一批，连接继续
+                count('live.bad_batches')
+                return
+            await service.queue.put((time.time(), batches))
+
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+            if not line:
+                break
+            parts = line.decode('utf-8', 'replace').strip().split(',')
+            if len(parts) != 3:
+                continue
+            # 时段变化说明上一时段已经发完
+            if parts[0] != current_ts:
+                await flush()
+                current_ts = parts[0]
+            pending.append(parts)
+            if len(pending) >= SOCKET_BATCH:
+                await flush()
+        await flush()
+    finally:
+        writer.close()
+
+
+def serve_directory(directory, port):
+    """在后台线程中提供静态文件（浏览器从 file:// 无法轮询图层 JSON）"""
+    import functools
+    import threading
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---------------------------------------------------------------------------
+# 服务
+# ---------------------------------------------------------------------------
+
+class LiveService:
+    def __init__(self, links, live_dir=LIVE_DIR, start=None, capacity=CAPACITY_SLOTS,
+                 window=ROLLING_SLOTS):
+        self.links = links.reset_index(drop=True)
+        self.live_dir = live_dir
+        self.layer_dir = os.path.join(live_dir, 'layers')
+        os.makedirs(self.layer_dir, exist_ok=True)
+        self.state_path = os.path.join(live_dir, 'state.json')
+        self.start = None if start is None else pd.Timestamp(start)
+        self.position = pd.Series(np.arange(len(links)), index=self.links['link_id'].to_numpy())
+
+        n_slots, segment_slot = 0, 0
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('start') is not None:
+                self.start = pd.Timestamp(state['start'])
+            n_slots = state['n_slots']
+            segment_slot = state.get('segment_slot', 0)
+        self.matrix_path = os.path.join(live_dir, 'speeds_live.npy')
+        self.matrix = open_live_matrix(self.matrix_path, len(links), capacity)
+        self.n_slots = n_slots              # 当前段已写入的列数
+        self.segment_slot = segment_slot    # 当前段第0列对应的时段号
+        self.stats = RollingStats(len(links), window)
+        self.stats.rebuild(self.matrix, n_slots, segment_slot)
+
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.layer_hashes = {}
+        self.versions = {}
+        self.pending_since = None
+
+    def to_batches(self, records):
+        """records_to_batches；还没有 start 时取这批记录中最早时间当天0点"""
+        if self.start is None:
+            first = pd.to_datetime(records['ts']).min()
+            if pd.isna(first):
+                return []
+            self.start = first.normalize()
+            print(f"时段0: {self.start:%Y-%m-%d %H:%M}")
+        return records_to_batches(records, self.position, self.start)
+
+    def roll_over(self, slot):
+        """slot 超出当前段：归档当前矩阵，新建从包含 slot 的段开始的空矩阵"""
+        capacity = self.matrix.shape[1]
+        segment_start = self.start + pd.Timedelta(minutes=SLOT_MINUTES * self.segment_slot)
+        archive = os.path.join(self.live_dir, f"speeds_live_{segment_start:%Y%m%d%H%M}.npy")
+        self.matrix.flush()
+        del self.matrix
+        os.replace(self.matrix_path, archive)
+        self.segment_slot += (slot - self.segment_slot) // capacity * capacity
+        self.matrix = open_live_matrix(self.matrix_path, len(self.links), capacity)
+        self.n_slots = 0
+        self.save_state()
+        count('live.rollovers')
+        print(f"矩阵已满，归档为 {archive}，新段从时段 {self.segment_slot} 开始")
+
+    def save_state(self):
+        state = {'start': None if self.start is None else str(self.start), 'n_slots': self.n_slots,
+                 'segment_slot': self.segment_slot}
+        _atomic_write(self.state_path, json.dumps(state))
+
+    def apply(self, slot, link_idx, speeds):
+        """把一个时段的读数写入矩阵并更新统计；超出当前段时换段，属于已归档段的迟到记录丢弃"""
+        if slot >= self.segment_slot + self.matrix.shape[1]:
+            self.roll_over(slot)
+        col = slot - self.segment_slot
+        if col < 0:
+            count('live.late_records', len(link_idx))
+            return
+        old = self.matrix[link_idx, col]
+        self.matrix[link_idx, col] = speeds
+        self.stats.update(slot, link_idx, speeds, old)
+        self.n_slots = max(self.n_slots, col + 1)
+        count('live.records', len(link_idx))
+
+    def layers(self):
+        """各图层内容（已取整，取整后不变的数据不会触发重写）"""
+        rolling = np.round(self.stats.rolling_mean(), 1)
+        latest = np.round(self.stats.latest.astype(np.float64), 1)
+        reporting = 0
+        if self.stats.last_slot >= 0:
+            reporting = int((self.stats.ring[:, self.stats.last_slot % self.stats.window] > 0).sum())
+        slot_time = None
+        if self.start is not None:
+            slot_time = self.start + pd.Timedelta(minutes=SLOT_MINUTES * max(self.stats.last_slot, 0))
+        valid = rolling > 0
+        return {
+            'markers': {'mean': rolling.tolist(), 'latest': latest.tolist(),
+                        'level': speed_levels(rolling).tolist()},
+            'heatmap': {'weight': np.round(np.minimum(rolling / 80.0, 1.0) * 20).astype(int).tolist()},
+            'summary': {'slot_time': None if slot_time is None else f"{slot_time:%Y-%m-%d %H:%M}",
+                        'links_reporting': reporting,
+                        'city_mean': round(float(rolling[valid].mean()), 1) if valid.any() else None},
+        }
+
+    def render(self):
+        """只重写内容发生变化的图层，返回重写的图层名"""
+        changed = []
+        for name, content in self.layers().items():
+            data = json.dumps(content, ensure_ascii=False, separators=(',', ':'))
+            digest = hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+            if self.layer_hashes.get(name) == digest:
+                continue
+            _atomic_write(os.path.join(self.layer_dir, f'{name}.json'), data)
+            self.layer_hashes[name] = digest
+            self.versions[name] = digest
+            changed.append(name)
+        if changed:
+            manifest = {'layers': self.versions, 'updated': time.time()}
+            _atomic_write(os.path.join(self.layer_dir, 'manifest.json'), json.dumps(manifest))
+            self.save_state()
+        return changed
+
+    async def consume(self):
+        while True:
+            received, batches = await self.queue.get()
+            with span('live.ingest', batches=len(batches)):
+                for slot, link_idx, speeds in batches:
+                    self.apply(slot, link_idx, speeds)
+            if self.pending_since is None:
+                self.pending_since = received
+
+    async def render_loop(self, interval=RENDER_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            if self.pending_since is None:
+                continue
+            with span('live.render'):
+                changed = self.render()
+            self.matrix.flush()
+            latency = time.time() - self.pending_since
+            self.pending_since = None
+            if changed:
+                print(f"[{time.strftime('%H:%M:%S')}] 当前段已接入 {self.n_slots} 个时段，更新图层 "
+                      f"{', '.join(changed)}，延迟 {latency:.2f}s")
+
+
+def _atomic_write(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_live_page(links, live_dir=LIVE_DIR, poll_ms=BROWSER_POLL_MS):
+    """生成实时仪表盘页面（只在启动时生成一次，之后浏览器只拉取图层 JSON）"""
+    import folium
+    from folium.plugins import HeatMap
+    from foliumscript import generate_organized_coordinates
+
+    coordinates = generate_organized_coordinates(links['link_id'].tolist(), links['id_x'].tolist(),
+                                                 links['id_y'].tolist())
+    m = folium.Map(location=[37.4979, 127.0276], zoom_start=14, tiles='OpenStreetMap')
+    heat = HeatMap([[37.4979, 127.0276, 0]], name='速度热力图', min_opacity=0.3, radius=15, blur=10)
+    heat.add_to(m)
+    folium.LayerControl().add_to(m)
+
+    points = [[round(lat, 6), round(lon, 6), str(link_id)] for (lat, lon), link_id in zip(coordinates, links['link_id'])]
+    script = """
+    (function() {
+        var map = %(map)s, heat = %(heat)s;
+        var points = %(points)s, colors = %(colors)s, versions = {};
+        var markers = points.map(function(p) {
+            return L.circleMarker([p[0], p[1]], {radius: 6, color: 'gray', fillOpacity: 0.8}).addTo(map);
+        });
+        var info = L.control({position: 'topright'});
+        info.onAdd = function() { this._div = L.DomUtil.create('div'); this._div.style.cssText =
+            'background: rgba(255,255,255,0.9); padding: 8px; border-radius: 5px; font-size: 12px;'; return this._div; };
+        info.addTo(map);
+        var handlers = {
+            markers: function(layer) {
+                markers.forEach(function(marker, i) {
+                    marker.setStyle({color: colors[layer.level[i]], fillColor: colors[layer.level[i]]});
+                    marker.bindPopup('<b>道路ID:</b> ' + points[i][2] + '<br><b>最近1小时平均:</b> ' +
+                                     layer.mean[i] + ' km/h<br><b>最新读数:</b> ' + layer.latest[i] + ' km/h');
+                });
+            },
+            heatmap: function(layer) {
+                heat.setLatLngs(points.map(function(p, i) { return [p[0], p[1], layer.weight[i] / 20]; }));
+            },
+            summary: function(layer) {
+                info._div.innerHTML = '<b>🚕 实时车速</b><br>时段: ' + layer.slot_time + '<br>上报道路: ' +
+                    layer.links_reporting + '<br>平均车速: ' + layer.city_mean + ' km/h';
+            }
+        };
+        function refresh() {
+            fetch('layers/manifest.json', {cache: 'no-store'}).then(function(r) { return r.json(); })
+            .then(function(manifest) {
+                return Promise.all(Object.keys(handlers).filter(function(name) {
+                    return manifest.layers[name] && manifest.layers[name] !== versions[name];
+                }).map(function(name) {
+                    return fetch('layers/' + name + '.json', {cache: 'no-store'}).then(function(r) { return r.json(); })
+                        .then(function(layer) { handlers[name](layer); versions[name] = manifest.layers[name]; });
+                }));
+            }).catch(function() {}).then(function() { setTimeout(refresh, %(poll)d); });
+        }
+        refresh();
+    })();
+    """ % {'map': m.get_name(), 'heat': heat.get_name(), 'points': json.dumps(points),
+           'colors': json.dumps(LEVEL_COLORS), 'poll': poll_ms}
+    m.get_root().script.add_child(folium.Element(script))
+    path = os.path.join(live_dir, 'index.html')
+    m.save(path)
+    return path
+
+
+def load_links(links_path=LINKS_PARQUET, urban_core_file=URBAN_CORE_FILE):
+    """道路表：优先使用流水线缓存，没有时从 urban-core.csv 读取前7列"""
+    if os.path.exists(links_path):
+        return pd.read_parquet(links_path)
+    from speedmatrix import LINK_COLUMNS
+    return pd.read_csv(urban_core_file, header=None, usecols=range(len(LINK_COLUMNS)), names=LINK_COLUMNS)
+
+
+async def run_service(links, live_dir=LIVE_DIR, inbox=INBOX_DIR, port=None, http_port=None,
+                      start=None, capacity=CAPACITY_SLOTS, render_interval=RENDER_INTERVAL):
+    service = LiveService(links, live_dir, start, capacity)
+    write_live_page(links, live_dir)
+    service.render()
+
+    tasks = [asyncio.create_task(service.consume()), asyncio.create_task(service.render_loop(render_interval)),
+             asyncio.create_task(watch_directory(service, inbox))]
+    print(f"实时接入已启动: 投放目录 {inbox}")
+    server = None
+    if port:
+        server = await asyncio.start_server(lambda r, w: _handle_socket(service, r, w), '127.0.0.1', port)
+        print(f"Socket 数据源: 127.0.0.1:{port} (每行 ts,link_id,speed)")
+    if http_port:
+        serve_directory(live_dir, http_port)
+        print(f"仪表盘: http://127.0.0.1:{http_port}/")
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if server is not None:
+            server.close()
+        service.matrix.flush()
+
+
+def replay(urban_core_file=URBAN_CORE_FILE, inbox=INBOX_DIR, start=URBAN_CORE_START, interval=1.0,
+           first_slot=0, n_slots=None):
+    """把 urban-core.csv 按时段逐个写入投放目录，模拟实时数据源"""
+    from speedmatrix import read_urban_core
+
+    links, speeds = read_urban_core(urban_core_file)
+    os.makedirs(inbox, exist_ok=True)
+    last = speeds.shape[1] if n_slots is None else min(speeds.shape[1], first_slot + n_slots)
+    for slot in range(first_slot, last):
+        ts = pd.Timestamp(start) + pd.Timedelta(minutes=SLOT_MINUTES * slot)
+        column = speeds[:, slot]
+        reported = column > 0
+        records = pd.DataFrame({'ts': f"{ts:%Y-%m-%d %H:%M:%S}", 'link_id': links['link_id'][reported],
+                                'speed': column[reported]})
+        path = os.path.join(inbox, f"{ts:%Y%m%d%H%M}.csv")
+        records.to_csv(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+        print(f"已投放 {path} ({len(records)} 条)")
+        time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='实时5分钟车速数据接入')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('serve', help='启动接入服务')
+    p.add_argument('--live-dir', default=LIVE_DIR)
+    p.add_argument('--inbox', default=INBOX_DIR)
+    p.add_argument('--port', type=int, help='Socket 数据源端口')
+    p.add_argument('--http-port', type=int, help='仪表盘 HTTP 端口')
+    p.add_argument('--start', help='时段0对应的时间（默认取第一条记录当天0点）')
+    p.add_argument('--capacity-days', type=int, default=CAPACITY_SLOTS // SLOTS_PER_DAY)
+    p.add_argument('--render-interval', type=float, default=RENDER_INTERVAL)
+
+    p = subparsers.add_parser('replay', help='用 urban-core.csv 模拟数据源')
+    p.add_argument('--file', default=URBAN_CORE_FILE)
+    p.add_argument('--inbox', default=INBOX_DIR)
+    p.add_argument('--interval', type=float, default=1.0, help='每个时段间隔秒数')
+    p.add_argument('--first-slot', type=int, default=0)
+    p.add_argument('--slots', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'replay':
+        replay(args.file, args.inbox, interval=args.interval, first_slot=args.first_slot, n_slots=args.slots)
+        return
+    try:
+        asyncio.run(run_service(load_links(), args.live_dir, args.inbox, args.port, args.http_port, args.start,
+                                args.capacity_days * SLOTS_PER_DAY, args.render_interval))
+    except KeyboardInterrupt:
+        print("\n实时接入已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+江南区道路速度地图的本地服务器：页面只包含底图和道路位置，弹窗内容按需从 JSON 接口获取
+
+    GET /                    底图页面（folium + 少量脚本）
+    GET /api/links           所有道路: [link_id, 纬度, 经度, 颜色等级]（页面加载时获取一次）
+    GET /api/link/<link_id>  单条道路详情: 属性、速度统计、分位数、日内曲线和逐日平均（点击时获取）
+
+- 详情只在用户点击某条道路时计算，结果放在 LRU 缓存中
+- 所有响应带 ETag（内容哈希），浏览器再次请求时返回 304；数据文件更新后 ETag 随之变化
+- 数据优先使用流水线产物（.pipeline/ 中清洗后的矩阵，内存映射），没有时读取 urban-core.csv
+
+用法:
+    python mapserver.py --port 8000
+    python cli.py serve --port 8000
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+from speedmatrix import SLOTS_PER_DAY, URBAN_CORE_START
+
+
+URBAN_CORE_FILE = 'urban-core.csv'
+LINKS_PARQUET = os.path.join('.pipeline', 'links.parquet')
+CLEAN_SPEEDS_NPY = os.path.join('.pipeline', 'speeds_clean.npy')
+QUALITY_NPY = os.path.join('.pipeline', 'quality.npy')
+LINK_STATS_PARQUET = os.path.join('.pipeline', 'link_stats.parquet')
+CACHE_SIZE = 256
+GANGNAM_CENTER = [37.4979, 127.0276]
+
+
+class LRUCache:
+    """线程安全的 LRU 缓存"""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+        value = compute()
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+        return value
+
+
+def load_map_data(links_path=LINKS_PARQUET, speeds_path=CLEAN_SPEEDS_NPY, quality_path=QUALITY_NPY,
+                  stats_path=LINK_STATS_PARQUET, urban_core_file=URBAN_CORE_FILE):
+    """
+    返回 (道路表, 速度矩阵, 质量矩阵或 None, 平均速度或 None, 数据版本)。
+    流水线产物以内存映射打开，详情只读取被点击道路的那一行
+    """
+    if os.path.exists(links_path) and os.path.exists(speeds_path):
+        from dataquality import load_clean_matrix
+        links = pd.read_parquet(links_path)
+        speeds, quality = load_clean_matrix(speeds_path, quality_path)
+        avg_speed = None
+        if os.path.exists(stats_path):
+            avg_speed = pd.read_parquet(stats_path, columns=['avg_speed'])['avg_speed'].to_numpy()
+        source = speeds_path
+    else:
+        from speedmatrix import read_urban_core
+        links, speeds = read_urban_core(urban_core_file)
+        quality = avg_speed = None
+        source = urban_core_file
+    stat = os.stat(source)
+    version = hashlib.blake2b(f"{source}:{stat.st_mtime_ns}:{stat.st_size}".encode(), digest_size=6).hexdigest()
+    return links, speeds, quality, avg_speed, version
+
+
+class MapData:
+    """道路列表和按需计算的单条道路详情"""
+
+    def __init__(self, links, speeds, quality=None, avg_speed=None, version='', start=URBAN_CORE_START,
+                 cache_size=CACHE_SIZE):
+        from foliumscript import generate_organized_coordinates
+
+        self.links = links.reset_index(drop=True)
+        self.speeds = speeds
+        self.quality = quality
+        self.version = version
+        self.start = pd.Timestamp(start)
+        self.position = {link_id: i for i, link_id in enumerate(self.links['link_id'].tolist())}
+        self.coordinates = generate_organized_coordinates(self.links['link_id'].tolist(),
+                                                          self.links['id_x'].tolist(), self.links['id_y'].tolist())
+        # 列表只需要平均速度（颜色）；没有流水线的统计表时按道路分块计算一次
+        self.avg_speed = avg_speed if avg_speed is not None else self._average_speeds()
+        self.cache = LRUCache(cache_size)
+
+    def _valid(self, rows):
+        from dataquality import MISSING
+        if self.quality is None:
+            return np.asarray(self.speeds[rows]) > 0
+        return np.asarray(self.quality[rows]) != MISSING
+
+    def _average_speeds(self, chunk_links=2000):
+        from speedmatrix import link_stats
+        return np.concatenate([
+            link_stats(self.links.iloc[row:row + chunk_links], np.asarray(self.speeds[row:row + chunk_links]),
+                       self._valid(slice(row, row + chunk_links)))['avg_speed'].to_numpy()
+            for row in range(0, len(self.links), chunk_links)])
+
+    def link_list(self):
+        from liveingest import speed_levels
+        levels = speed_levels(self.avg_speed)
+        return [[_json_id(link_id), round(lat, 6), round(lon, 6), int(level)]
+                for link_id, (lat, lon), level in zip(self.links['link_id'], self.coordinates, levels)]
+
+    def link_detail(self, i):
+        row = np.asarray(self.speeds[i], dtype=np.float64)
+        valid = self._valid(i)
+        values = row[valid]
+        link = self.links.iloc[i]
+        detail = {
+            'link_id': _json_id(link['link_id']),
+            'short_id': _json_id(link['short_id']),
+            'speed_limit': float(link['speed_limit']),
+            'length': float(link['length']),
+            'direction': '上行' if link['direction'] == 0 else '下行',
+            'count': int(valid.sum()),
+        }
+        if len(values) == 0:
+            return detail
+
+        p5, p50, p85 = np.percentile(values, [5, 50, 85])
+        detail.update({'avg': values.mean(), 'max': values.max(), 'min': values.min(), 'std': values.std(),
+                       'p5': p5, 'p50': p50, 'p85': p85})
+        # 日内曲线（按小时）和逐日平均，用于弹窗中的迷你折线图；数据不足一天时没有
+        n_days = len(row) // SLOTS_PER_DAY
+        if n_days > 0:
+            daily = np.where(valid, row, 0)[:n_days * SLOTS_PER_DAY].reshape(n_days, 24, -1)
+            counts = valid[:n_days * SLOTS_PER_DAY].reshape(n_days, 24, -1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                hourly = daily.sum(axis=(0, 2)) / counts.sum(axis=(0, 2))
+                by_day = daily.sum(axis=(1, 2)) / counts.sum(axis=(1, 2))
+            detail['hourly'] = _rounded(hourly)
+            detail['daily'] = _rounded(by_day)
+            detail['first_day'] = f"{self.start:%Y-%m-%d}"
+        return {key: round(float(value), 2) if isinstance(value, (float, np.floating)) else value
+                for key, value in detail.items()}
+
+    def response(self, path):
+        """(内容, Content-Type, ETag)，未知路径返回 None；响应按路径放入 LRU 缓存"""
+        if path == '/':
+            return self.cache.get(path, lambda: _body(render_page(), 'text/html; charset=utf-8', self.version))
+        if path == '/api/links':
+            return self.cache.get(path, lambda: _body(self.link_list(), 'application/json', self.version))
+        if path.startswith('/api/link/'):
+            key = unquote(path[len('/api/link/'):])
+            try:
+                i = self.position[_parse_id(key)]
+            except (KeyError, ValueError):
+                return None
+            return self.cache.get(path, lambda: _body(self.link_detail(i), 'application/json', self.version))
+        return None
+
+
+def _json_id(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def _parse_id(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def _rounded(values):
+    return [None if not np.isfinite(v) else round(float(v), 1) for v in values]
+
+
+def _body(content, content_type, version):
+    data = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False, separators=(',', ':'))
+    data = data.encode('utf-8')
+    etag = '"' + version + '-' + hashlib.blake2b(data, digest_size=8).hexdigest() + '"'
+    return data, content_type, etag
+
+
+PAGE_SCRIPT = """
+(function() {
+    var map = %(map)s;
+    var colors = %(colors)s;
+    function sparkline(values, width, height) {
+        var points = values.map(function(v, i) { return v === null ? null : [i, v]; }).filter(Boolean);
+        if (points.length < 2) { return ''; }
+        var ys = points.map(function(p) { return p[1]; });
+        var lo = Math.min.apply(null, ys), hi = Math.max.apply(null, ys), span = (hi - lo) || 1;
+        var path = points.map(function(p) {
+            return (p[0] * width / (values.length - 1)).toFixed(1) + ',' + (height - (p[1] - lo) * height / span).toFixed(1);
+        }).join(' ');
+        return '<svg width="' + width + '" height="' + height + '"><polyline fill="none" stroke="#2980b9" ' +
+               'stroke-width="1.5" points="' + path + '"/></svg><br><small>' + lo.toFixed(1) + ' – ' + hi.toFixed(1) +
+               ' km/h</small>';
+    }
+    function row(name, value) { return '<tr><td><b>' + name + '</b></td><td>' + value + '</td></tr>'; }
+    function render(d) {
+        var html = '<div style="width: 280px;"><h4 style="color: #2c3e50;">道路 ' + d.link_id + '</h4>' +
+            '<table style="width: 100%%; font-size: 12px;">' + row('短ID:', d.short_id) +
+            row('限速:', d.speed_limit + ' km/h') + row('长度:', d.length.toFixed(0) + ' m') + row('方向:', d.direction);
+        if (d.count > 0) {
+            html += row('平均速度:', d.avg.toFixed(1)) + row('最高/最低:', d.max.toFixed(1) + ' / ' + d.min.toFixed(1)) +
+                    row('标准差:', d.std.toFixed(1)) +
+                    row('P5 / P50 / P85:', d.p5.toFixed(1) + ' / ' + d.p50.toFixed(1) + ' / ' + d.p85.toFixed(1)) +
+                    row('数据点数:', d.count) + '</table>';
+            if (d.hourly) {
+                html += '<hr style="margin: 6px 0;"><b>日内变化 (0-23时)</b><br>' + sparkline(d.hourly, 260, 40) +
+                        '<br><b>逐日平均 (自 ' + d.first_day + ')</b><br>' + sparkline(d.daily, 260, 40);
+            }
+        } else {
+            html += row('数据点数:', 0) + '</table>';
+        }
+        return html + '</div>';
+    }
+    fetch('/api/links').then(function(r) { return r.json(); }).then(function(links) {
+        links.forEach(function(l) {
+            var marker = L.circleMarker([l[1], l[2]], {radius: 6, color: colors[l[3]], fillOpacity: 0.8}).addTo(map);
+            marker.bindPopup('加载中...', {maxWidth: 320});
+            marker.on('popupopen', function() {
+                fetch('/api/link/' + l[0]).then(function(r) { return r.json(); })
+                    .then(function(d) { marker.setPopupContent(render(d)); });
+            });
+        });
+    });
+})();
+"""
+
+
+def render_page():
+    import folium
+    from liveingest import LEVEL_COLORS
+
+    m = folium.Map(location=GANGNAM_CENTER, zoom_start=14, tiles='OpenStreetMap')
+    script = PAGE_SCRIPT % {'map': m.get_name(), 'colors': json.dumps(LEVEL_COLORS)}
+    m.get_root().script.add_child(folium.Element(script))
+    return m.get_root().render()
+
+
+def make_handler(data):
+    class MapRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            result = data.response(self.path.split('?', 1)[0])
+            if result is None:
+                self.send_error(404)
+                return
+            body, content_type, etag = result
+            if etag in self.headers.get('If-None-Match', ''):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return MapRequestHandler
+
+
+def serve(port=8000, host='127.0.0.1', cache_size=CACHE_SIZE, **paths):
+    links, speeds, quality, avg_speed, version = load_map_data(**paths)
+    data = MapData(links, speeds, quality, avg_speed, version, cache_size=cache_size)
+    server = ThreadingHTTPServer((host, port), make_handler(data))
+    print(f"地图服务已启动: http://{host}:{port}/  ({len(links)} 条道路)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n地图服务已停止")
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='江南区道路速度地图本地服务器')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='LRU 缓存的响应数')
+    parser.add_argument('--file', default=URBAN_CORE_FILE, help='没有流水线产物时读取的 urban-core.csv')
+    args = parser.parse_args(argv)
+    serve(args.port, args.host, args.cache_size, urban_core_file=args.file)
+
+
+if __name__ == "__main__":
+    main()
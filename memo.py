@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+函数级磁盘缓存：读 Excel、构造特征、拟合模型等耗时步骤的结果按参数和数据内容的哈希保存，
+重复分析和批处理直接读取上次的结果
+
+- 缓存键 = 函数名 + 函数源代码 + 各参数的哈希（参数先按函数签名补齐默认值）:
+    DataFrame/Series 按内容 (pd.util.hash_pandas_object + 列名/类型)，ndarray 按字节，
+    files 中列出的参数（或由参数算出的文件列表）按文件内容，其余参数按 pickle
+- 文件内容哈希按 (大小, 修改时间) 记忆，未变化的大文件不会重复读取
+- 结果用 pickle 保存到 .memo_cache/<模块.函数>/<键>.pkl，先写临时文件再原子替换
+- 函数源代码改变后旧结果自动失效；只改了被调用的其他函数时，用 version 参数手动失效
+- 设置环境变量 TRAFFIC_MEMO=0 可关闭缓存（直接调用原函数）
+
+用法:
+    @memoize(files=('file_path',))
+    def load_traffic_weather(file_path=DATA_FILE): ...
+
+    load_traffic_weather.uncached(path)   # 不使用缓存
+    load_traffic_weather.clear()          # 删除该函数的全部缓存结果
+"""
+
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from instrument import count
+
+
+MEMO_DIR = '.memo_cache'
+
+_file_hashes = {}
+
+
+def enabled():
+    return os.environ.get('TRAFFIC_MEMO', '1') not in ('', '0')
+
+
+def file_digest(path):
+    """文件内容 sha256；大小和修改时间都没变时沿用上次的结果"""
+    stat = os.stat(path)
+    cached = _file_hashes.get(path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    _file_hashes[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+    return _file_hashes[path][2]
+
+
+def _update(digest, value):
+    """把参数值写入哈希；容器递归处理，表格和数组按内容"""
+    if isinstance(value, pd.DataFrame):
+        digest.update(b'DataFrame')
+        digest.update(pickle.dumps((list(value.columns), [str(t) for t in value.dtypes])))
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, pd.Series):
+        digest.update(b'Series')
+        digest.update(pickle.dumps((value.name, str(value.dtype))))
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(b'ndarray')
+        digest.update(pickle.dumps((value.shape, value.dtype.str)))
+        digest.update(np.ascontiguousarray(value).tobytes() if value.dtype != object else pickle.dumps(value))
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}:{len(value)}'.encode())
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f'dict:{len(value)}'.encode())
+        for key in sorted(value, key=repr):
+            _update(digest, key)
+            _update(digest, value[key])
+    else:
+        digest.update(pickle.dumps(value, protocol=4))
+
+
+def _source(func):
+    try:
+        return inspect.getsource(inspect.unwrap(func))
+    except (OSError, TypeError):
+        return func.__qualname__
+
+
+def memoize(files=(), version=None, cache_dir=MEMO_DIR, ignore=()):
+    """
+    磁盘缓存装饰器。
+    files: 参数名的元组（参数值为文件路径或路径列表），或 函数(参数字典) -> 文件路径列表；
+    这些文件按内容参与缓存键。ignore: 不参与缓存键的参数名（如 verbose、n_jobs）
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        module = func.__module__
+        if module == '__main__':
+            # 作为脚本运行时与被导入时使用同一个缓存目录
+            module = os.path.splitext(os.path.basename(inspect.getfile(func)))[0]
+        name = f"{module}.{func.__qualname__}"
+        func_dir = os.path.join(cache_dir, name)
+        code_digest = hashlib.sha256(_source(func).encode('utf-8')).hexdigest()
+
+        def key(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            digest = hashlib.sha256()
+            digest.update(f'{name}:{code_digest}:{version}'.encode('utf-8'))
+            for param, value in arguments.items():
+                if param in ignore:
+                    continue
+                digest.update(param.encode('utf-8'))
+                _update(digest, value)
+            paths = files(arguments) if callable(files) else [
+                path for param in files
+                for path in ([arguments[param]] if isinstance(arguments[param], str) else arguments[param])]
+            for path in paths:
+                digest.update(str(path).encode('utf-8'))
+                digest.update((file_digest(path) if os.path.exists(path) else 'missing').encode())
+            return digest.hexdigest()[:32]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            path = os.path.join(func_dir, key(*args, **kwargs) + '.pkl')
+            if os.path.exists(path):
+                try:
+                    with open(path, 'rb') as f:
+                        result = pickle.load(f)
+                    count('memo.hit')
+                    return result
+                except (EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+                    pass  # 损坏或已不兼容的缓存，重新计算
+            count('memo.miss')
+            result = func(*args, **kwargs)
+            os.makedirs(func_dir, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            return result
+
+        def clear():
+            if os.path.isdir(func_dir):
+                shutil.rmtree(func_dir)
+
+        wrapper.uncached = func
+        wrapper.cache_key = key
+        wrapper.clear = clear
+        return wrapper
+    return decorator
+
+
+def clear_all(cache_dir=MEMO_DIR):
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
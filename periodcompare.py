@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+两个时期（月份/年份）道路速度的对比：按道路 ID 对齐，计算每条道路的变化，绘制发散色地图
+
+1. period_summary: 对一个时期的 道路×时段 矩阵逐道路汇总（按道路分块的向量化运算）:
+   平均速度、p5/p50/p85（quantsketch 草图）、每天拥堵分钟数（congestion 拥堵事件）
+2. compare_periods: 以 link_id 为索引连接两个时期的汇总表，向量化计算各指标的变化量；
+   只在一个时期出现的道路保留在表中，变化量为空
+3. diff_map: folium 地图，按所选指标的变化量用发散色着色（变好为蓝、变差为红，色阶关于 0 对称）
+
+数据可以是 urban-core 格式的 CSV，也可以是 speedstore 量化存储目录（读取快得多）。
+
+用法:
+    python cli.py compare urban-core-2018.csv urban-core-2025.csv --labels 2018年4月 2025年4月
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+LINK_ATTRIBUTES = ['short_id', 'id_x', 'id_y', 'speed_limit', 'length', 'direction']
+# 指标列名 -> (显示名称, 单位, 数值变大是否为变好)
+METRICS = {
+    'avg_speed': ('平均速度', 'km/h', True),
+    'p5': ('P5 速度', 'km/h', True),
+    'p50': ('P50 速度', 'km/h', True),
+    'p85': ('P85 速度', 'km/h', True),
+    'congestion_min': ('每天拥堵时长', '分钟', False),
+}
+DIVERGING_COLORS = ['#b2182b', '#ef8a62', '#fddbc7', '#f7f7f7', '#d1e5f0', '#67a9cf', '#2166ac']
+
+
+def load_period(source):
+    """读取一个时期的 (道路表, 速度矩阵)：speedstore 目录或 urban-core 格式的 CSV"""
+    if os.path.isdir(source):
+        from speedstore import read_links, read_store
+        return read_links(source), read_store(source)
+    from speedmatrix import read_urban_core
+    return read_urban_core(source)
+
+
+def period_summary(links, speeds, valid=None, mode='limit', chunk_links=2000):
+    """每条道路一行: link_id、道路属性、valid_count、avg_speed、p5/p50/p85、congestion_min（每天）"""
+    from congestion import congestion_events
+    from quantsketch import link_percentiles, link_speed_sketch
+    from speedmatrix import SLOTS_PER_DAY, link_stats
+
+    links = links.reset_index(drop=True)
+    stats = []
+    for row in range(0, len(links), chunk_links):
+        block = np.asarray(speeds[row:row + chunk_links])
+        mask = None if valid is None else np.asarray(valid[row:row + chunk_links])
+        stats.append(link_stats(links.iloc[row:row + chunk_links], block, mask))
+    stats = pd.concat(stats, ignore_index=True)
+
+    summary = links[['link_id'] + LINK_ATTRIBUTES].copy()
+    summary['valid_count'] = stats['valid_count'].to_numpy()
+    summary['avg_speed'] = np.where(stats['valid_count'] > 0, stats['avg_speed'], np.nan)
+    percentiles = link_percentiles(link_speed_sketch(speeds, valid, scheme='all'), n_buckets=1)
+    summary[['p5', 'p50', 'p85']] = percentiles
+
+    n_days = max(speeds.shape[1] / SLOTS_PER_DAY, 1)
+    events = congestion_events(links, speeds, valid, mode=mode, chunk_links=chunk_links)
+    minutes = events.groupby('link_id')['duration_min'].sum()
+    summary['congestion_min'] = summary['link_id'].map(minutes).fillna(0).to_numpy() / n_days
+    summary.loc[summary['valid_count'] == 0, 'congestion_min'] = np.nan
+    return summary
+
+
+def compare_periods(before, after):
+    """
+    以 link_id 为索引外连接两个时期的汇总表。每个指标 m 输出 m_before、m_after、m_delta
+    （后减前），平均速度另有 avg_speed_pct（变化百分比）；present 标记道路出现在哪个时期
+    """
+    before = before.set_index('link_id')
+    after = after.set_index('link_id')
+    joined = before.join(after, how='outer', lsuffix='_before', rsuffix='_after')
+
+    comparison = pd.DataFrame(index=joined.index)
+    for column in LINK_ATTRIBUTES:
+        comparison[column] = joined[f'{column}_after'].fillna(joined[f'{column}_before'])
+    in_before = joined.index.isin(before.index)
+    in_after = joined.index.isin(after.index)
+    comparison['present'] = np.select([in_before & in_after, in_before], ['both', 'before'], 'after')
+    for metric in METRICS:
+        old = joined[f'{metric}_before'].to_numpy(dtype=np.float64)
+        new = joined[f'{metric}_after'].to_numpy(dtype=np.float64)
+        comparison[f'{metric}_before'] = old
+        comparison[f'{metric}_after'] = new
+        comparison[f'{metric}_delta'] = new - old
+    with np.errstate(invalid='ignore', divide='ignore'):
+        comparison['avg_speed_pct'] = comparison['avg_speed_delta'] / comparison['avg_speed_before'] * 100
+    return comparison.reset_index()
+
+
+def compare_sources(source_before, source_after, mode='limit'):
+    return compare_periods(period_summary(*load_period(source_before), mode=mode),
+                           period_summary(*load_period(source_after), mode=mode))
+
+
+def change_summary(comparison, metric='avg_speed'):
+    """整体变化：两个时期都有数据的道路中变好、变差的条数和变化量中位数"""
+    name, unit, higher_is_better = METRICS[metric]
+    delta = comparison[f'{metric}_delta'].dropna()
+    improved = delta > 0 if higher_is_better else delta < 0
+    worse = delta < 0 if higher_is_better else delta > 0
+    return {
+        'metric': name, 'unit': unit, 'links': len(delta),
+        'improved': int(improved.sum()), 'worse': int(worse.sum()),
+        'median_delta': float(delta.median()) if len(delta) else float('nan'),
+        'only_before': int((comparison['present'] == 'before').sum()),
+        'only_after': int((comparison['present'] == 'after').sum()),
+    }
+
+
+def diff_map(comparison, metric='avg_speed', output_file='seoul_gangnam_speed_diff.html',
+             labels=('前期', '后期'), open_browser=False):
+    """按指标变化量着色的对比地图；色阶关于 0 对称，范围取 |变化量| 的 95% 分位数"""
+    import folium
+    from branca.colormap import LinearColormap
+    from foliumscript import generate_organized_coordinates
+
+    name, unit, higher_is_better = METRICS[metric]
+    delta = comparison[f'{metric}_delta'].to_numpy(dtype=np.float64)
+    finite = np.isfinite(delta)
+    bound = float(np.percentile(np.abs(delta[finite]), 95)) if finite.any() else 1.0
+    bound = bound or 1.0
+    colors = DIVERGING_COLORS if higher_is_better else DIVERGING_COLORS[::-1]
+    colormap = LinearColormap(colors, vmin=-bound, vmax=bound,
+                              caption=f"{name}变化 ({unit})：{labels[1]} − {labels[0]}")
+
+    coordinates = generate_organized_coordinates(comparison['link_id'].tolist(), comparison['id_x'].tolist(),
+                                                 comparison['id_y'].tolist())
+    m = folium.Map(location=[37.4979, 127.0276], zoom_start=14, tiles='OpenStreetMap')
+    before = comparison[f'{metric}_before'].to_numpy()
+    after = comparison[f'{metric}_after'].to_numpy()
+    for (lat, lon), link_id, old, new, change in zip(coordinates, comparison['link_id'], before, after, delta):
+        if np.isfinite(change):
+            color = colormap(float(np.clip(change, -bound, bound)))
+            text = f"道路 {link_id}: {old:.1f} → {new:.1f} {unit} ({change:+.1f})"
+        else:
+            color = '#999999'
+            text = f"道路 {link_id}: 只在{labels[0] if np.isfinite(old) else labels[1]}有数据"
+        folium.CircleMarker(location=[lat, lon], radius=6, color=color, fill=True, fill_color=color,
+                            fill_opacity=0.9, weight=1, tooltip=text).add_to(m)
+    colormap.add_to(m)
+
+    summary = change_summary(comparison, metric)
+    better, worse = ('提高', '降低') if higher_is_better else ('减少', '增加')
+    title_html = f'''
+    <div style="position: fixed;
+                top: 10px; left: 50%; transform: translateX(-50%);
+                background-color: rgba(255, 255, 255, 0.9); padding: 12px;
+                border: 2px solid #3498db; border-radius: 8px;
+                z-index: 9999; text-align: center; box-shadow: 0 2px 6px rgba(0,0,0,0.3);">
+        <h3 style="margin: 0; font-size: 18px; color: #2c3e50;">
+            <b>首尔江南区{name}对比：{labels[0]} → {labels[1]}</b>
+        </h3>
+        <p style="margin: 5px 0 0 0; font-size: 12px; color: #7f8c8d;">
+            {summary['links']}条道路 | {summary['improved']}条{better} | {summary['worse']}条{worse} |
+            中位数变化 {summary['median_delta']:+.1f} {unit}
+        </p>
+    </div>
+    '''
+    m.get_root().html.add_child(folium.Element(title_html))
+
+    print(f"正在保存对比地图到 {output_file}...")
+    m.save(output_file)
+    if open_browser:
+        import webbrowser
+        webbrowser.open('file://' + os.path.realpath(output_file))
+    return m
@@ -0,0 +1,529 @@
+# -*- coding: utf-8 -*-
+"""
+数据与仪表盘流水线：把 plotlyscript、foliumscript 和 相关性分析.py 串成一个有依赖关系的 DAG
+
+- 每个阶段声明原始输入文件、依赖的上游阶段和输出文件
+- 输入文件、上游产物以及阶段代码都按内容哈希，签名不变且输出完好的阶段直接跳过；
+  阶段函数（以及作为输入的 .py）导入的本地模块按导入闭包一并哈希，改动任何被用到的模块都会重跑
+- 互不依赖的阶段在进程池中并发执行
+- 上游重新生成但产物内容没变时，下游阶段也不会重跑
+
+用法:
+    python pipeline.py                 # 刷新全部输出，只重做受影响的阶段
+    python pipeline.py gangnam_map     # 只刷新指定阶段（及其上游）
+    python pipeline.py --force         # 忽略缓存全部重做
+    python pipeline.py --dry-run       # 只显示哪些阶段需要重做
+"""
+
+import argparse
+import ast
+import functools
+import hashlib
+import inspect
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from instrument import flush, span
+
+
+ARTIFACT_DIR = '.pipeline'
+STATE_FILE = os.path.join(ARTIFACT_DIR, 'state.json')
+
+YEAR_FILES = [f"{year}.xls" for year in ['2017', '2018', '2019', '2020', '2021', '2022', '2023', '2024', '2025']]
+URBAN_CORE_FILE = 'urban-core.csv'
+CORRELATION_SPEED_FILE = '2018-4-全天.xls'
+CORRELATION_BUS_FILE = '2018-4公共交通.xls'
+WEATHER_FILE = '首尔市区4月份交通天气数据_2017-2025.xlsx'
+
+
+def artifact(name):
+    return os.path.join(ARTIFACT_DIR, name)
+
+
+YEARS_PARQUET = artifact('years.parquet')
+LINKS_PARQUET = artifact('links.parquet')
+SPEEDS_NPY = artifact('speeds.npy')
+CLEAN_SPEEDS_NPY = artifact('speeds_clean.npy')
+QUALITY_NPY = artifact('quality.npy')
+LINK_QUALITY_PARQUET = artifact('link_quality.parquet')
+LINK_STATS_PARQUET = artifact('link_stats.parquet')
+YEAR_SUMMARY_PARQUET = artifact('year_summary.parquet')
+CORRELATION_DIR = artifact('correlation')
+DB_DIR = artifact('db')
+CLEAN_SPEEDS_STORE = artifact('speeds_clean.store')
+LINK_CLUSTERS_PARQUET = artifact('link_clusters.parquet')
+CLUSTER_PROFILES_PARQUET = artifact('cluster_profiles.parquet')
+SPEED_SKETCH_NPZ = artifact('speed_sketch.npz')
+LINK_PERCENTILES_PARQUET = artifact('link_percentiles.parquet')
+ROUTING_GRAPH_NPZ = artifact('routing_graph.npz')
+WEATHER_COEF_PARQUET = artifact('weather_coefficients.parquet')
+WEATHER_FIT_PARQUET = artifact('weather_fit.parquet')
+CONGESTION_EVENTS_PARQUET = artifact('congestion_events.parquet')
+BOTTLENECKS_PARQUET = artifact('bottlenecks.parquet')
+
+# name: 阶段名; run: 阶段函数(模块级，便于在子进程中执行); inputs: 原始输入文件;
+# deps: 上游阶段; outputs: 输出文件
+Stage = namedtuple('Stage', ['name', 'run', 'inputs', 'deps', 'outputs'])
+
+
+# ---------------------------------------------------------------------------
+# 阶段函数
+# ---------------------------------------------------------------------------
+
+def ingest_years():
+    from plotlyscript import load_all_years_data
+
+    df = load_all_years_data()
+    df.to_parquet(YEARS_PARQUET, index=False)
+
+
+def ingest_urban_core():
+    from speedmatrix import read_urban_core, save_link_matrix
+
+    links, speeds = read_urban_core(URBAN_CORE_FILE)
+    save_link_matrix(links, speeds, LINKS_PARQUET, SPEEDS_NPY)
+
+
+def data_quality():
+    from dataquality import clean_link_matrix, link_quality_table, save_clean_matrix
+    from speedmatrix import load_link_matrix
+
+    links, speeds = load_link_matrix(LINKS_PARQUET, SPEEDS_NPY)
+    cleaned, quality, summary = clean_link_matrix(speeds)
+    save_clean_matrix(cleaned, quality, CLEAN_SPEEDS_NPY, QUALITY_NPY)
+    link_quality_table(links, summary).to_parquet(LINK_QUALITY_PARQUET, index=False)
+
+
+def aggregate():
+    import pandas as pd
+    from dataquality import MISSING, load_clean_matrix
+    from speedmatrix import link_stats
+
+    links = pd.read_parquet(LINKS_PARQUET)
+    cleaned, quality = load_clean_matrix(CLEAN_SPEEDS_NPY, QUALITY_NPY)
+    link_stats(links, cleaned, valid=quality != MISSING).to_parquet(LINK_STATS_PARQUET, index=False)
+
+    years = pd.read_parquet(YEARS_PARQUET)
+    summary = years.groupby('年份')['平均车速(km/h)'].agg(['mean', 'std', 'min', 'max', 'count']).reset_index()
+    summary.to_parquet(YEAR_SUMMARY_PARQUET, index=False)
+
+
+def correlation_analysis():
+    import importlib
+    import matplotlib
+    matplotlib.use('Agg')
+
+    analysis = importlib.import_module('相关性分析')
+    analysis.run_analysis(CORRELATION_SPEED_FILE, CORRELATION_BUS_FILE, output_dir=CORRELATION_DIR)
+
+
+def _write_plotly(builder_name, output_file):
+    import pandas as pd
+    import plotlyscript
+
+    df = pd.read_parquet(YEARS_PARQUET)
+    fig = getattr(plotlyscript, builder_name)(df)
+    fig.write_html(output_file)
+
+
+def animation_optimized():
+    _write_plotly('create_optimized_speed_animation', 'seoul_traffic_speed_animation_optimized.html')
+
+
+def animation_manual():
+    _write_plotly('create_speed_animation_manual', 'seoul_traffic_speed_animation_manual.html')
+
+
+def analysis_dashboard():
+    _write_plotly('create_comparison_dashboard', 'seoul_traffic_analysis_dashboard.html')
+
+
+def speed_store():
+    import pandas as pd
+    from dataquality import load_clean_matrix
+    from speedstore import write_store
+
+    links = pd.read_parquet(LINKS_PARQUET)
+    cleaned, _ = load_clean_matrix(CLEAN_SPEEDS_NPY, QUALITY_NPY)
+    write_store(CLEAN_SPEEDS_STORE, cleaned, links=links)
+
+
+def speed_sketches():
+    import pandas as pd
+    from dataquality import INTERPOLATED, QualityMask, load_clean_matrix
+    from quantsketch import bucket_percentiles, link_speed_sketch, save_sketch
+
+    # 只用观测值和插值结果，不让周期性填补的值影响分位数
+    links = pd.read_parquet(LINKS_PARQUET)
+    cleaned, quality = load_clean_matrix(CLEAN_SPEEDS_NPY, QUALITY_NPY)
+    sketch = link_speed_sketch(cleaned, valid=QualityMask(quality, INTERPOLATED), scheme='hour')
+    save_sketch(sketch, SPEED_SKETCH_NPZ)
+    bucket_percentiles(sketch, links['link_id'], scheme='hour').to_parquet(LINK_PERCENTILES_PARQUET, index=False)
+
+
+def link_clusters():
+    import pandas as pd
+    from dataquality import INTERPOLATED, QualityMask, load_clean_matrix
+    from linkclusters import cluster_links
+
+    links = pd.read_parquet(LINKS_PARQUET)
+    cleaned, quality = load_clean_matrix(CLEAN_SPEEDS_NPY, QUALITY_NPY)
+    table, clusters, _ = cluster_links(links, cleaned, valid=QualityMask(quality, INTERPOLATED))
+    table.to_parquet(LINK_CLUSTERS_PARQUET, index=False)
+    clusters.to_parquet(CLUSTER_PROFILES_PARQUET, index=False)
+
+
+def congestion_events():
+    import pandas as pd
+    from congestion import congestion_events, recurring_bottlenecks
+    from dataquality import INTERPOLATED, QualityMask, load_clean_matrix
+    from speedmatrix import SLOTS_PER_DAY
+
+    # 周期性填补的值不是实际观测，不用来判定拥堵
+    links = pd.read_parquet(LINKS_PARQUET)
+    cleaned, quality = load_clean_matrix(CLEAN_SPEEDS_NPY, QUALITY_NPY)
+    events = congestion_events(links, cleaned, valid=QualityMask(quality, INTERPOLATED))
+    events.to_parquet(CONGESTION_EVENTS_PARQUET, index=False)
+    recurring_bottlenecks(events, cleaned.shape[1] // SLOTS_PER_DAY).to_parquet(BOTTLENECKS_PARQUET, index=False)
+
+
+def gangnam_map():
+    import pandas as pd
+    from dataquality import load_clean_matrix
+    from foliumscript import create_speed_dashboard
+    from quantsketch import BUCKET_SCHEMES, link_percentiles, load_sketch
+    from speedmatrix import as_load_data
+
+    # 使用插补后的矩阵，长时间缺失的道路不再只按剩余时段求平均
+    links = pd.read_parquet(LINKS_PARQUET)
+    cleaned, _ = load_clean_matrix(CLEAN_SPEEDS_NPY, QUALITY_NPY)
+    percentiles = link_percentiles(load_sketch(SPEED_SKETCH_NPZ), BUCKET_SCHEMES['hour'])
+    clusters = pd.read_parquet(LINK_CLUSTERS_PARQUET)['cluster'].to_numpy()
+    descriptions = pd.read_parquet(CLUSTER_PROFILES_PARQUET)['description'].tolist()
+    m = create_speed_dashboard(URBAN_CORE_FILE, 'seoul_gangnam_speed_dashboard.html',
+                               open_browser=False, data=as_load_data(links, cleaned), percentiles=percentiles,
+                               clusters=clusters, cluster_descriptions=descriptions)
+    if m is None:
+        raise RuntimeError("江南区地图生成失败")
+
+
+def routing_graph():
+    import pandas as pd
+    from dataquality import MISSING, load_clean_matrix
+    from routing import build_graph, save_graph
+
+    links = pd.read_parquet(LINKS_PARQUET)
+    cleaned, quality = load_clean_matrix(CLEAN_SPEEDS_NPY, QUALITY_NPY)
+    save_graph(build_graph(links, cleaned, valid=quality != MISSING), ROUTING_GRAPH_NPZ)
+
+
+def weather_regression():
+    import pandas as pd
+    from dataquality import MISSING, load_clean_matrix
+    from weatherreg import link_weather_regression, load_daily_weather
+
+    links = pd.read_parquet(LINKS_PARQUET)
+    cleaned, quality = load_clean_matrix(CLEAN_SPEEDS_NPY, QUALITY_NPY)
+    coefficients, fit = link_weather_regression(links, cleaned, load_daily_weather(WEATHER_FILE),
+                                                valid=quality != MISSING)
+    coefficients.to_parquet(WEATHER_COEF_PARQUET, index=False)
+    fit.to_parquet(WEATHER_FIT_PARQUET, index=False)
+
+
+def query_tables():
+    import pandas as pd
+    import trafficdb
+    from speedmatrix import load_link_matrix
+
+    trafficdb.write_year_speeds(pd.read_parquet(YEARS_PARQUET), trafficdb.table_path('year_speeds', DB_DIR))
+    trafficdb.write_weather(WEATHER_FILE, trafficdb.table_path('weather', DB_DIR))
+    links, speeds = load_link_matrix(LINKS_PARQUET, SPEEDS_NPY)
+    trafficdb.write_link_tables(links, speeds, trafficdb.table_path('links', DB_DIR),
+                                trafficdb.table_path('link_speeds', DB_DIR))
+
+
+def bus_table():
+    import importlib
+    import matplotlib
+    matplotlib.use('Agg')
+    import trafficdb
+
+    analysis = importlib.import_module('相关性分析')
+    trafficdb.write_bus_metrics(analysis.load_bus_metrics(CORRELATION_BUS_FILE),
+                                trafficdb.table_path('bus_metrics', DB_DIR))
+
+
+STAGES = [
+    Stage('ingest_years', ingest_years, YEAR_FILES + ['plotlyscript.py'], [], [YEARS_PARQUET]),
+    Stage('ingest_urban_core', ingest_urban_core, [URBAN_CORE_FILE, 'speedmatrix.py'], [],
+          [LINKS_PARQUET, SPEEDS_NPY]),
+    Stage('data_quality', data_quality, ['dataquality.py'], ['ingest_urban_core'],
+          [CLEAN_SPEEDS_NPY, QUALITY_NPY, LINK_QUALITY_PARQUET]),
+    Stage('aggregate', aggregate, ['speedmatrix.py'], ['ingest_years', 'ingest_urban_core', 'data_quality'],
+          [LINK_STATS_PARQUET, YEAR_SUMMARY_PARQUET]),
+    Stage('correlation', correlation_analysis, [CORRELATION_SPEED_FILE, CORRELATION_BUS_FILE, '相关性分析.py'], [],
+          [os.path.join(CORRELATION_DIR, f'{name}.png')
+           for name in ('correlation_heatmap', 'speed_patterns', 'analysis_summary')]),
+    Stage('animation_optimized', animation_optimized, ['plotlyscript.py'], ['ingest_years'],
+          ['seoul_traffic_speed_animation_optimized.html']),
+    Stage('animation_manual', animation_manual, ['plotlyscript.py'], ['ingest_years'],
+          ['seoul_traffic_speed_animation_manual.html']),
+    Stage('analysis_dashboard', analysis_dashboard, ['plotlyscript.py'], ['ingest_years'],
+          ['seoul_traffic_analysis_dashboard.html']),
+    Stage('speed_store', speed_store, ['speedstore.py'], ['ingest_urban_core', 'data_quality'],
+          [os.path.join(CLEAN_SPEEDS_STORE, 'meta.json')]),
+    Stage('speed_sketches', speed_sketches, ['quantsketch.py'], ['ingest_urban_core', 'data_quality'],
+          [SPEED_SKETCH_NPZ, LINK_PERCENTILES_PARQUET]),
+    Stage('link_clusters', link_clusters, ['linkclusters.py'], ['ingest_urban_core', 'data_quality'],
+          [LINK_CLUSTERS_PARQUET, CLUSTER_PROFILES_PARQUET]),
+    Stage('congestion_events', congestion_events, ['congestion.py'], ['ingest_urban_core', 'data_quality'],
+          [CONGESTION_EVENTS_PARQUET, BOTTLENECKS_PARQUET]),
+    Stage('gangnam_map', gangnam_map, ['foliumscript.py', 'linkclusters.py', 'quantsketch.py'],
+          ['ingest_urban_core', 'data_quality', 'speed_sketches', 'link_clusters'],
+          ['seoul_gangnam_speed_dashboard.html']),
+    Stage('routing_graph', routing_graph, ['routing.py'], ['ingest_urban_core', 'data_quality'],
+          [ROUTING_GRAPH_NPZ]),
+    Stage('weather_regression', weather_regression, [WEATHER_FILE, 'weatherreg.py'],
+          ['ingest_urban_core', 'data_quality'], [WEATHER_COEF_PARQUET, WEATHER_FIT_PARQUET]),
+    Stage('query_tables', query_tables, [WEATHER_FILE, 'trafficdb.py'], ['ingest_years', 'ingest_urban_core'],
+          [os.path.join(DB_DIR, name) for name in ('year_speeds.parquet', 'weather.parquet',
+                                                   'links.parquet', 'link_speeds.parquet')]),
+    Stage('bus_table', bus_table, [CORRELATION_BUS_FILE, '相关性分析.py', 'trafficdb.py'], [],
+          [os.path.join(DB_DIR, 'bus_metrics.parquet')]),
+]
+
+
+# ---------------------------------------------------------------------------
+# 内容哈希与状态
+# ---------------------------------------------------------------------------
+
+class FileHasher:
+    """按内容计算文件 sha256；大小和修改时间都没变的文件沿用上次的哈希，避免重复读取"""
+
+    def __init__(self, memo=None):
+        self.memo = dict(memo or {})
+
+    def __call__(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        cached = self.memo.get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.memo[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+
+def load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    return {'files': {}, 'stages': {}}
+
+
+def save_state(state):
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    tmp_path = STATE_FILE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def local_imports(source):
+    """源代码中导入的本地模块（当前目录下存在同名 .py 的模块），含 importlib.import_module('名称')"""
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+        elif (isinstance(node, ast.Call) and getattr(node.func, 'attr', None) == 'import_module'
+              and node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+            names.add(node.args[0].value.split('.')[0])
+    return sorted(f'{name}.py' for name in names if os.path.exists(f'{name}.py'))
+
+
+@functools.lru_cache(maxsize=None)
+def _file_imports(path, mtime_ns):
+    with open(path, encoding='utf-8') as f:
+        return tuple(local_imports(f.read()))
+
+
+def import_closure(stage):
+    """
+    阶段函数和作为输入的 .py 文件直接或间接导入的全部本地模块文件（按源代码中出现的全部导入，
+    偏保守）。pipeline.py 自身不计入：阶段代码已单独哈希，其他模块只在 __main__ 中调用它
+    """
+    pending = local_imports(inspect.getsource(stage.run)) + [path for path in stage.inputs if path.endswith('.py')]
+    closure = set()
+    while pending:
+        path = pending.pop()
+        if path in closure or path == 'pipeline.py' or not os.path.exists(path):
+            continue
+        closure.add(path)
+        pending.extend(_file_imports(path, os.stat(path).st_mtime_ns))
+    return sorted(closure)
+
+
+def stage_signature(stage, hasher, dep_outputs):
+    """阶段签名 = 阶段代码 + 原始输入内容 + 导入的本地模块内容 + 上游产物内容"""
+    payload = {
+        'code': hashlib.sha256(inspect.getsource(stage.run).encode('utf-8')).hexdigest(),
+        'inputs': {path: hasher(path) for path in stage.inputs},
+        'modules': {path: hasher(path) for path in import_closure(stage)},
+        'deps': {dep: dep_outputs[dep] for dep in stage.deps},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def is_fresh(stage, signature, state, hasher):
+    record = state['stages'].get(stage.name)
+    if not record or record['signature'] != signature:
+        return False
+    return all(hasher(path) == record['outputs'].get(path) for path in stage.outputs)
+
+
+def select_stages(targets=None):
+    """目标阶段及其全部上游阶段"""
+    by_name = {stage.name: stage for stage in STAGES}
+    if not targets:
+        return list(STAGES)
+    unknown = [name for name in targets if name not in by_name]
+    if unknown:
+        raise ValueError(f"未知的阶段: {', '.join(unknown)}")
+    selected = set()
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(by_name[name].deps)
+    return [stage for stage in STAGES if stage.name in selected]
+
+
+def _execute(stage_name):
+    stage = next(stage for stage in STAGES if stage.name == stage_name)
+    for path in stage.outputs:
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+    start = time.perf_counter()
+    with span(f'pipeline.{stage.name}'):
+        stage.run()
+    flush()
+    return time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------------
+# 调度
+# ---------------------------------------------------------------------------
+
+def run_pipeline(targets=None, force=False, jobs=None, dry_run=False):
+    """执行流水线，返回 {阶段名: 'skipped' | 'built' | 'failed' | 'blocked' | 'stale'}"""
+    stages = select_stages(targets)
+    state = load_state()
+    hasher = FileHasher(state.get('files'))
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+
+    remaining = {stage.name: set(stage.deps) for stage in stages}
+    by_name = {stage.name: stage for stage in stages}
+    dep_outputs = {}
+    results = {}
+    running = {}
+
+    executor = None if dry_run else ProcessPoolExecutor(max_workers=jobs)
+    try:
+        while remaining or running:
+            ready = [name for name, deps in remaining.items() if not deps]
+            for name in ready:
+                del remaining[name]
+                stage = by_name[name]
+                signature = stage_signature(stage, hasher, dep_outputs)
+                if not force and is_fresh(stage, signature, state, hasher):
+                    results[name] = 'skipped'
+                    dep_outputs[name] = state['stages'][name]['outputs']
+                    print(f"[跳过] {name}: 输入未变化")
+                    _release(name, remaining)
+                elif dry_run:
+                    results[name] = 'stale'
+                    # 需要重做的阶段，其下游的签名在实际运行前无法确定
+                    dep_outputs[name] = {'pending': signature}
+                    print(f"[待重做] {name}")
+                    _release(name, remaining)
+                else:
+                    print(f"[开始] {name}")
+                    running[executor.submit(_execute, name)] = (name, signature)
+
+            if not running:
+                if remaining and not any(not deps for deps in remaining.values()):
+                    # 剩余阶段的上游失败了
+                    for name in remaining:
+                        results[name] = 'blocked'
+                        print(f"[阻塞] {name}: 上游阶段失败")
+                    remaining.clear()
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, signature = running.pop(future)
+                try:
+                    elapsed = future.result()
+                except Exception as e:
+                    results[name] = 'failed'
+                    print(f"[失败] {name}: {e}")
+                    continue
+                outputs = {path: hasher(path) for path in by_name[name].outputs}
+                state['stages'][name] = {'signature': signature, 'outputs': outputs, 'elapsed': elapsed}
+                state['files'] = hasher.memo
+                save_state(state)
+                dep_outputs[name] = outputs
+                results[name] = 'built'
+                print(f"[完成] {name}: {elapsed:.2f}s")
+                _release(name, remaining)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if not dry_run:
+        state['files'] = hasher.memo
+        save_state(state)
+    return results
+
+
+def _release(name, remaining):
+    for deps in remaining.values():
+        deps.discard(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='交通数据与仪表盘流水线')
+    parser.add_argument('targets', nargs='*', help='要刷新的阶段，默认全部')
+    parser.add_argument('--force', action='store_true', help='忽略缓存，全部重做')
+    parser.add_argument('--jobs', type=int, default=None, help='并发进程数')
+    parser.add_argument('--dry-run', action='store_true', help='只显示需要重做的阶段')
+    parser.add_argument('--list', action='store_true', help='列出所有阶段')
+    args = parser.parse_args()
+
+    if args.list:
+        for stage in STAGES:
+            deps = ', '.join(stage.deps) or '-'
+            print(f"{stage.name:22s} 依赖: {deps}")
+        return
+
+    results = run_pipeline(args.targets, force=args.force, jobs=args.jobs, dry_run=args.dry_run)
+    counts = {}
+    for status in results.values():
+        counts[status] = counts.get(status, 0) + 1
+    print("\n流水线结束: " + ", ".join(f"{status} {n}" for status, n in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    main()
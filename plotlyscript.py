@@ -4,17 +4,24 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
 import os
+from instrument import count, span, traced
+from memo import memoize
 
 
-# 读取所有年份的数据
-def load_all_years_data():
-    years = ['2017', '2018', '2019', '2020', '2021', '2022', '2023', '2024', '2025']
+YEARS = ['2017', '2018', '2019', '2020', '2021', '2022', '2023', '2024', '2025']
+
+
+# 读取所有年份的数据（磁盘缓存，各年份 .xls 的内容都不变时直接读取上次的结果）
+@memoize(files=lambda args: [os.path.join(args['data_dir'], f"{year}.xls") for year in args['years']])
+@traced('plotly.load_all_years_data')
+def load_all_years_data(years=YEARS, data_dir='.'):
     all_data = []
 
     for year in years:
-        file_path = f"{year}.xls"
+        file_path = os.path.join(data_dir, f"{year}.xls")
         try:
-            df = pd.read_excel(file_path, sheet_name='차량통행속도')
+            with span('plotly.read_excel', year=year):
+                df = pd.read_excel(file_path, sheet_name='차량통행속도')
             df['年份'] = int(year)
             df['年份_str'] = str(year)  # 添加字符串类型的年份列
             df['日期'] = pd.to_datetime(df['일자'], format='%Y%m%d')
@@ -31,6 +38,7 @@ def load_all_years_data():
             })
 
             all_data.append(df)
+            count('plotly.rows', len(df))
             print(f"成功加载 {year} 年数据: {len(df)} 条记录")
 
         except Exception as e:
@@ -41,6 +49,7 @@ def load_all_years_data():
 
 
 # 创建动画图表 - 修复年份小数问题
+@traced('plotly.speed_animation')
 def create_speed_animation(df):
     # 颜色映射
     year_colors = {
@@ -105,6 +114,7 @@ def create_speed_animation(df):
 
 
 # 替代方案：使用go.Scatter手动创建动画
+@traced('plotly.speed_animation_manual')
 def create_speed_animation_manual(df):
     """手动创建动画，更好地控制年份显示"""
 
@@ -226,6 +236,7 @@ def create_speed_animation_manual(df):
 
 
 # 创建优化版本的时间滑块动画
+@traced('plotly.optimized_speed_animation')
 def create_optimized_speed_animation(df):
     """优化版本，解决年份小数问题"""
 
@@ -283,6 +294,7 @@ def create_optimized_speed_animation(df):
 
 
 # 其他函数保持不变...
+@traced('plotly.comparison_dashboard')
 def create_comparison_dashboard(df):
     # 创建子图
     fig = make_subplots(
@@ -426,19 +438,22 @@ def main():
     # 创建优化版本的时间滑块动画
     print("\n正在创建优化版本的时间滑块动画...")
     optimized_fig = create_optimized_speed_animation(df)
-    optimized_fig.write_html("seoul_traffic_speed_animation_optimized.html")
+    with span('plotly.save', file="seoul_traffic_speed_animation_optimized.html"):
+        optimized_fig.write_html("seoul_traffic_speed_animation_optimized.html")
     print("✅ 优化版本时间滑块动画已保存: seoul_traffic_speed_animation_optimized.html")
 
     # 创建手动版本动画
     print("正在创建手动版本动画...")
     manual_fig = create_speed_animation_manual(df)
-    manual_fig.write_html("seoul_traffic_speed_animation_manual.html")
+    with span('plotly.save', file="seoul_traffic_speed_animation_manual.html"):
+        manual_fig.write_html("seoul_traffic_speed_animation_manual.html")
     print("✅ 手动版本动画已保存: seoul_traffic_speed_animation_manual.html")
 
     # 创建综合分析仪表板
     print("正在创建综合分析仪表板...")
     dashboard_fig = create_comparison_dashboard(df)
-    dashboard_fig.write_html("seoul_traffic_analysis_dashboard.html")
+    with span('plotly.save', file="seoul_traffic_analysis_dashboard.html"):
+        dashboard_fig.write_html("seoul_traffic_analysis_dashboard.html")
     print("✅ 综合分析仪表板已保存: seoul_traffic_analysis_dashboard.html")
 
     print("\n🎯 分析完成！")
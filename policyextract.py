@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+政策模块关键信息抽取：声明式规则表、spaCy NER 批量解析缓存与抽取主流程
+
+从 policynlp.ipynb 中拆出，供 notebook 和命令行(cli.py extract-policy)共用。
+spaCy 模型在第一次解析时才加载，只使用规则的调用方不需要导入 spaCy。
+"""
+
+import hashlib
+import os
+import re
+from collections import defaultdict
+
+import pandas as pd
+
+from policyingest import load_policy_modules, assign_policy_ids, doc_year, RESULT_COLUMNS
+
+
+# spaCy模型与自定义实体标签
+# 抽取主要依靠正则，spaCy只用于NER，其余组件不加载（en_core_web_sm中ner自带tok2vec）
+SPACY_MODEL = "en_core_web_sm"
+SPACY_EXCLUDE = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+CUSTOM_LABELS = ["POLICY", "LEGAL", "TIME_BASE", "TIME_2017", "PARAMETER", "AREA", "TARGET"]
+
+# 解析结果缓存：内存字典 + 磁盘目录，键为 模型/组件/文本 的哈希
+DOC_CACHE_DIR = ".spacy_cache"
+_doc_cache = {}
+_nlp = None
+
+
+def get_nlp():
+    """加载（一次）spaCy模型并注册自定义实体标签"""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+        ner = _nlp.get_pipe("ner")
+        for label in CUSTOM_LABELS:
+            ner.add_label(label)
+    return _nlp
+
+
+def doc_cache_key(text):
+    key_source = "|".join([SPACY_MODEL, ",".join(get_nlp().pipe_names), text])
+    return hashlib.sha1(key_source.encode("utf-8")).hexdigest()
+
+
+def parse_texts(texts, batch_size=64, n_process=1, cache_dir=DOC_CACHE_DIR):
+    """批量解析文本：已缓存的直接返回，其余用 nlp.pipe 分批(可多进程)解析"""
+    from spacy.tokens import Doc
+
+    nlp = get_nlp()
+    keys = [doc_cache_key(text) for text in texts]
+    pending = {}
+    for key, text in zip(keys, texts):
+        if key in _doc_cache or key in pending:
+            continue
+        cache_path = os.path.join(cache_dir, key + ".spacy") if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            _doc_cache[key] = Doc(nlp.vocab).from_disk(cache_path)
+        else:
+            pending[key] = text
+    if pending:
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        docs = nlp.pipe(pending.values(), batch_size=batch_size, n_process=n_process)
+        for key, doc in zip(pending.keys(), docs):
+            _doc_cache[key] = doc
+            if cache_dir:
+                doc.to_disk(os.path.join(cache_dir, key + ".spacy"))
+    return [_doc_cache[key] for key in keys]
+
+
+# 抽取规则表（声明式，导入时一次性编译）与全文档文本预处理
+# 清洗规则，按顺序执行
+CLEAN_RULES = [
+    (re.compile(r'\s+'), ' '),            # 统一空格
+    (re.compile(r'\(.*?\)'), ''),         # 去除括号内注释
+    (re.compile(r'[^\x00-\x7F]+'), ''),   # 去除非ASCII乱码
+]
+TABLE1_PATTERN = re.compile(r"Table 1. SMG, Ordinance on the Congestion Impact Fee Discount.*?2020 ~.*?congestion coefficient", re.DOTALL)
+TABLE1_2017_PATTERN = re.compile(r'2017\s*× congestion coefficient')
+
+# 字段抽取规则: (字段, 模块范围, 前置关键词, 正则, 输出模板, 匹配方式)
+#   模块范围 None 表示所有模块，否则为模块名中的子串
+#   前置关键词: 文本中出现其中任一关键词时该规则才可能命中，用于单遍预筛选
+#   输出模板: {0} 为整个匹配，{1}.. 为分组；"all" 方式下 {0} 为去重后用逗号连接的分组1
+#   匹配方式: "first" 取第一个匹配，"all" 取全部匹配去重
+#   同一字段命中多条规则时按表中顺序用 "; " 连接
+EXTRACTION_RULES = [
+    ("法律依据", None, ["Act", "Ordinance"],
+     r'([A-Z][a-z\s]+Act|[A-Z][a-z\s]+Ordinance)', "{0}", "all"),
+    ("基础实施时间", None, ["introduced in", "launched in", "enacted in"],
+     r'(introduced|launched|enacted) in (\d{4})', "{2}", "first"),
+
+    ("核心参数（2017年）", "Congestion Impact Fee System", ["unit congestion impact fee"],
+     r'unit congestion impact fee is (\d+ to \d+) Korean won per m²', "单位费：{1}韩元/㎡", "first"),
+    ("核心参数（2017年）", "Congestion Impact Fee System", ["congestion coefficient varies"],
+     r'congestion coefficient varies from (\d+\.\d+) for (\w+) to (\d+\.\d+) for (\w+)', "系数范围：{1}（{2}）-{3}（{4}）", "first"),
+    ("核心参数（2017年）", "Congestion Impact Fee System", ["total floor area of"],
+     r'total floor area of (\d+) m² or more', "收费门槛：{1}㎡以上", "first"),
+    ("2017年调整内容", "Congestion Impact Fee System", ["2017年拥堵影响费折扣规则"],
+     r'2017年拥堵影响费折扣规则：(.*?) ', "超3000㎡/30000㎡设施收费计算优化：{1}", "first"),
+
+    ("核心参数（2017年）", "Transportation Demand Management Policy for Companies", ["Discount Rate"],
+     r'Discount Rate.*?(\d+)%', "折扣比例：{0}%（多措施可叠加）", "all"),
+
+    ("核心参数（2017年）", "Namsan Tunnel", ["levy of KRW"],
+     r'levy of KRW (\d+,?\d+)', "收费标准：{1}韩元/次", "first"),
+    ("核心参数（2017年）", "Namsan Tunnel", ["Monday to Friday"],
+     r'from (\d+:\d+ – \d+:\d+) Monday to Friday', "收费时段：{1}（周1-周5）", "first"),
+    ("核心参数（2017年）", "Namsan Tunnel", ["vehicles with only"],
+     r'vehicles with only (\d+ or \d+) occupants', "适用车辆：{1}人车辆", "first"),
+
+    ("核心参数（2017年）", "Parking Lot Restrictions", ["of the parking lots in non-congested areas"],
+     r'limited to (\d+)% of the parking lots in non-congested areas', "限制比例：拥堵区域为非拥堵区域{1}%", "first"),
+    ("核心参数（2017年）", "Parking Lot Restrictions", ["commercial areas and quasi residential areas"],
+     r'expanded to ‘commercial areas and quasi residential areas’', "区域类型：{0}", "first"),
+    ("适用区域", "Parking Lot Restrictions", ["km²"],
+     r'(\d+\.\d+)km²', "首尔10个Class 1区域（{1}km²）", "first"),
+]
+
+# 规则未命中时各模块的固定取值/兜底值: {模块范围: {字段: 值}}
+MODULE_DEFAULTS = {
+    None: {"法律依据": "无明确记录"},
+    "Congestion Impact Fee System": {"影响对象": "1000㎡以上设施业主"},
+    "Transportation Demand Management Policy for Companies": {
+        "2017年调整内容": "维持折扣比例，简化中小企业参与流程，支持多措施叠加",
+        "影响对象": "1000㎡以上建筑企业、设施员工及使用者",
+    },
+    "Namsan Tunnel": {
+        "2017年调整内容": "维持收费标准，优化收费系统响应速度",
+        "适用区域": "Namsan Tunnel 1 & 3",
+        "影响对象": "隧道通行1-2人私家车车主",
+    },
+    "Parking Lot Restrictions": {
+        "2017年调整内容": "延续2009年修订的管控范围（10个Class 1区域），无新增区域",
+        "适用区域": "首尔Class 1区域",
+        "影响对象": "拥堵区域商业/办公设施业主",
+    },
+}
+
+
+def compile_rules(rules):
+    """编译规则表，并把所有前置关键词合成一个可重叠匹配的交替正则（单遍预筛选）"""
+    compiled = []
+    anchor_rules = defaultdict(set)
+    for rule_id, (field, scope, anchors, pattern, template, mode) in enumerate(rules):
+        compiled.append((field, scope, re.compile(pattern), template, mode))
+        for anchor in anchors:
+            anchor_rules[anchor].add(rule_id)
+    anchors = sorted(anchor_rules, key=len, reverse=True)
+    # 零宽先行断言使每个位置都参与匹配，重叠出现的关键词不会被吞掉
+    anchor_pattern = re.compile("(?=(" + "|".join(re.escape(a) for a in anchors) + "))")
+    # 同一位置只会报告最长的关键词，被它包含的较短关键词视为同时命中
+    implied = {a: {b for b in anchors if b in a} for a in anchors}
+    return compiled, anchor_rules, anchor_pattern, implied
+
+
+COMPILED_RULES, ANCHOR_RULES, ANCHOR_PATTERN, IMPLIED_ANCHORS = compile_rules(EXTRACTION_RULES)
+_scope_rules = {}
+
+
+def rules_for_module(module_name):
+    # 按模块名缓存其适用的规则编号（模块范围为 None 或为模块名的子串）
+    if module_name not in _scope_rules:
+        _scope_rules[module_name] = {
+            i for i, (_, scope, _, _, _) in enumerate(COMPILED_RULES) if scope is None or scope in module_name
+        }
+    return _scope_rules[module_name]
+
+
+def candidate_rules(module_name, module_text):
+    """对文本做一遍关键词扫描，返回既在模块范围内、又命中前置关键词的规则编号"""
+    hits = set()
+    for match in ANCHOR_PATTERN.finditer(module_text):
+        hits |= IMPLIED_ANCHORS[match.group(1)]
+    rule_ids = set()
+    for anchor in hits:
+        rule_ids |= ANCHOR_RULES[anchor]
+    return sorted(rule_ids & rules_for_module(module_name))
+
+
+def preprocess_module_text(module_text):
+    # 1. 清洗特殊符号与冗余内容
+    module_text = module_text.strip()
+    for pattern, repl in CLEAN_RULES:
+        module_text = pattern.sub(repl, module_text)
+    # 2. 表格文本结构化（以Table 1为例，其他表格类似）
+    table1_match = TABLE1_PATTERN.search(module_text)
+    if table1_match:
+        table1_text = table1_match.group()
+        # 提取2017年折扣规则
+        table1_2017 = TABLE1_2017_PATTERN.search(table1_text)
+        if table1_2017:
+            # 替换表格文本为结构化描述
+            module_text = module_text.replace(table1_text, f"2017年拥堵影响费折扣规则：{table1_2017.group()}")
+    return module_text
+
+
+# 多维度关键信息抽取函数（单模块）
+INFO_FIELDS = ["法律依据", "基础实施时间", "2017年调整内容", "适用区域", "核心参数（2017年）", "影响对象"]
+
+
+def apply_rule(rule, module_text):
+    _, _, pattern, template, mode = rule
+    if mode == "all":
+        values = [m.group(1) if m.groups() else m.group(0) for m in pattern.finditer(module_text)]
+        values = list(dict.fromkeys(values))  # 去重并保持出现顺序
+        return template.format(", ".join(values)) if values else None
+    match = pattern.search(module_text)
+    if match:
+        return template.format(match.group(0), *match.groups())
+    return None
+
+
+def extract_module_info(module_name, module_text, doc=None):
+    info = {"政策大类": module_name}
+    values = defaultdict(list)
+    # doc 由 parse_texts 批量解析后传入，这里不再逐模块调用 nlp()
+
+    # 4.1 只执行预筛选命中的规则
+    for rule_id in candidate_rules(module_name, module_text):
+        rule = COMPILED_RULES[rule_id]
+        value = apply_rule(rule, module_text)
+        if value:
+            values[rule[0]].append(value)
+
+    # 4.2 合并规则结果与模块固定值
+    defaults = {}
+    for scope, scope_defaults in MODULE_DEFAULTS.items():
+        if scope is None or scope in module_name:
+            defaults.update(scope_defaults)
+    for field in INFO_FIELDS:
+        info[field] = "; ".join(values[field]) if values[field] else defaults.get(field, "")
+    return info
+
+
+# 全文档处理主函数
+def extract_policy_records(records, batch_size=64, n_process=1):
+    """records 为 load_policy_modules 的输出 [(文件, 模块序号, 模块名, 模块文本)]"""
+    processed = [preprocess_module_text(module_text) for _, _, _, module_text in records]
+    # 跨文档批量解析（带缓存），再逐模块抽取信息
+    docs = parse_texts(processed, batch_size=batch_size, n_process=n_process)
+    rows = []
+    for (doc_path, order, module_name, _), processed_text, doc in zip(records, processed, docs):
+        module_info = extract_module_info(module_name, processed_text, doc)
+        module_info["文件"] = doc_path
+        module_info["模块序号"] = order
+        rows.append(module_info)
+    return pd.DataFrame(rows, columns=["政策大类"] + INFO_FIELDS + ["文件", "模块序号"])
+
+
+def process_policy_docs(doc_paths, batch_size=64, n_process=1, max_workers=None):
+    # 步骤1：（并行）加载并拆分模块；步骤2：批量抽取；步骤3：按年份编号
+    records = load_policy_modules(doc_paths, max_workers=max_workers)
+    full_info_df = extract_policy_records(records, batch_size=batch_size, n_process=n_process)
+    full_info_df["年份"] = full_info_df["文件"].map(doc_year)
+    full_info_df = assign_policy_ids(full_info_df)
+    return full_info_df[RESULT_COLUMNS]
+
+
+def process_full_policy_doc(doc_path):
+    return process_policy_docs([doc_path])
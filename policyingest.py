@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+政策文档(.docx)语料的并行增量导入
+
+- 直接流式解析 docx 内的 word/document.xml，逐段落产出文本，不构建整篇字符串
+- 段落按子标题增量归入政策模块，模块文本用列表缓冲，最后一次性拼接
+- 多个文件在进程池中并行解析；根据文件大小/修改时间/内容哈希跳过未变化的文件，
+  抽取规则或抽取代码（extractor_digest）变化时全部重新抽取
+- 抽取结果合并写入一个 Parquet 表（列与 2017政策全文档NLP抽取结果.xlsx 一致）
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import re
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+import pandas as pd
+
+
+# 按政策模块拆分（基于文档子标题）；所有子标题编译成一个交替正则，每行只扫描一次
+MODULE_KEYWORDS = [
+    "Congestion Impact Fee System",
+    "Transportation Demand Management Policy for Companies",
+    "Congestion Charging at Namsan Tunnel 1 and 3",
+    "Parking Lot Restrictions for Facilities in Certain Areas",
+    "Urban Traffic Improvement Promotion Act"
+]
+MODULE_PATTERN = re.compile("|".join(re.escape(kw) for kw in MODULE_KEYWORDS))
+MODULE_PRIORITY = {kw: i for i, kw in enumerate(MODULE_KEYWORDS)}
+# 排除图表/来源标注的关键词
+EXCLUDE_PATTERN = re.compile("|".join(re.escape(kw) for kw in ["Figure", "Source:", "img", "---"]))
+
+# 输出表的列顺序
+RESULT_COLUMNS = ["政策ID", "政策大类", "法律依据", "基础实施时间", "2017年调整内容", "适用区域", "核心参数（2017年）", "影响对象"]
+SOURCE_COLUMNS = ["文件", "年份", "模块序号"]
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def match_module_keyword(line):
+    # 一行中出现多个子标题时，按 MODULE_KEYWORDS 中的顺序取第一个
+    hits = MODULE_PATTERN.findall(line)
+    return min(hits, key=MODULE_PRIORITY.get) if hits else None
+
+
+def doc_year(doc_path, default="2017"):
+    # 从文件名中取年份，如 "2017政策.docx" -> "2017"
+    match = re.search(r'(\d{4})', os.path.basename(doc_path))
+    return match.group(1) if match else default
+
+
+# 流式读取正文段落
+def iter_paragraphs(doc_path):
+    """
+    逐个产出正文(body下一级)段落的文本，与 python-docx 的 Document.paragraphs 一致：
+    w:t 为文本，w:tab 为制表符，w:br/w:cr 为换行；表格内的段落不产出。
+    每层段落各有一个文本缓冲，嵌套段落（如文本框 w:txbxContent 内）的文字不计入外层段落
+    """
+    with zipfile.ZipFile(doc_path) as archive, archive.open("word/document.xml") as xml_file:
+        depth_stack = []
+        parts_stack = []
+        for event, elem in ElementTree.iterparse(xml_file, events=("start", "end")):
+            if event == "start":
+                depth_stack.append(elem.tag)
+                if elem.tag == _W + "p":
+                    parts_stack.append([])
+                continue
+            depth_stack.pop()
+            tag = elem.tag
+            parts = parts_stack[-1] if parts_stack else []
+            if tag == _W + "t":
+                parts.append(elem.text or "")
+            elif tag == _W + "tab":
+                parts.append("\t")
+            elif tag in (_W + "br", _W + "cr"):
+                parts.append("\n")
+            elif tag == _W + "p":
+                parts_stack.pop()
+                if depth_stack and depth_stack[-1] == _W + "body":
+                    yield "".join(parts)
+                    elem.clear()
+            elif tag == _W + "tbl":
+                elem.clear()
+
+
+def split_modules(paragraphs):
+    """把段落流增量分配到政策模块，返回 {模块名: 文本}（按出现顺序）"""
+    buffers = defaultdict(list)
+    current_module = "General"  # 初始模块（TDM基础定义）
+    for paragraph in paragraphs:
+        para_text = paragraph.strip()
+        # 跳过空段落和图表标注
+        if not para_text or EXCLUDE_PATTERN.search(para_text):
+            continue
+        for line in para_text.split("\n"):
+            # 检查是否切换模块
+            module_match = match_module_keyword(line)
+            if module_match:
+                current_module = module_match
+            buffers[current_module].append(line)
+    return {name: " ".join(lines) + " " for name, lines in buffers.items()}
+
+
+# 读取单个docx文档并拆分为政策模块
+def load_full_policy_doc(doc_path):
+    return split_modules(iter_paragraphs(doc_path))
+
+
+def _load_modules_worker(args):
+    doc_path, min_chars = args
+    modules = load_full_policy_doc(doc_path)
+    return [
+        (doc_path, order, module_name, module_text)
+        for order, (module_name, module_text) in enumerate(modules.items())
+        # 跳过空模块
+        if len(module_text.strip()) >= min_chars
+    ]
+
+
+# 并行读取多个文档
+def load_policy_modules(doc_paths, max_workers=None, min_chars=100):
+    """返回 [(文件, 模块序号, 模块名, 模块文本)]，文件较多时在进程池中解析"""
+    tasks = [(doc_path, min_chars) for doc_path in doc_paths]
+    if len(tasks) <= 1 or max_workers == 1:
+        results = map(_load_modules_worker, tasks)
+        return [record for records in results for record in records]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(_load_modules_worker, tasks, chunksize=max(1, len(tasks) // 32))
+        return [record for records in results for record in records]
+
+
+def assign_policy_ids(df):
+    """按 文件/模块序号 排序后，在每个年份内依次编号 TDM-年份-序号"""
+    df = df.sort_values(["年份", "文件", "模块序号"]).reset_index(drop=True)
+    numbers = df.groupby("年份").cumcount() + 1
+    df["政策ID"] = ["TDM-%s-%03d" % (year, n) for year, n in zip(df["年份"], numbers)]
+    return df
+
+
+def file_signature(path, previous=None):
+    """文件签名(大小, 修改时间, sha1)；大小和修改时间都没变时沿用之前的哈希"""
+    stat = os.stat(path)
+    signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+        signature["sha1"] = previous["sha1"]
+        return signature
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    signature["sha1"] = digest.hexdigest()
+    return signature
+
+
+def extractor_digest(extract_records, min_chars=100):
+    """抽取器的摘要：extract_records 所在模块（含规则表）与本模块的源代码、min_chars"""
+    func = extract_records
+    while isinstance(func, functools.partial):
+        func = func.func
+    digest = hashlib.sha1(str(min_chars).encode("utf-8"))
+    for module in {inspect.getmodule(func), inspect.getmodule(extractor_digest)}:
+        try:
+            digest.update(inspect.getsource(module).encode("utf-8"))
+        except (OSError, TypeError):
+            digest.update(getattr(func, "__qualname__", repr(func)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+# 增量导入整个政策文档库
+def ingest_policy_corpus(doc_paths, extract_records, output_path="政策全文档NLP抽取结果.parquet",
+                         max_workers=None, min_chars=100):
+    """
+    extract_records(records) 接收 load_policy_modules 的输出，返回每个模块一行的
+    DataFrame（包含 文件、模块序号 以及抽取字段）。只有新增或内容变化的文件会被
+    重新解析和抽取，其余文件沿用 output_path 中已有的结果；抽取器摘要与上次不同时全部重新抽取。
+    """
+    doc_paths = [os.path.normpath(p) for p in doc_paths]
+    manifest_path = output_path + ".manifest.json"
+    extractor = extractor_digest(extract_records, min_chars)
+    manifest = {}
+    previous = None
+    if os.path.exists(manifest_path) and os.path.exists(output_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("extractor") == extractor:
+            manifest = saved["files"]
+            previous = pd.read_parquet(output_path)
+        else:
+            print("抽取规则或代码已变化，全部文档重新抽取")
+
+    signatures = {path: file_signature(path, manifest.get(path)) for path in doc_paths}
+    changed = [path for path in doc_paths
+               if path not in manifest or manifest[path]["sha1"] != signatures[path]["sha1"]]
+    print(f"政策文档共 {len(doc_paths)} 个，其中 {len(changed)} 个新增或有变化")
+
+    frames = []
+    if previous is not None:
+        unchanged = set(doc_paths) - set(changed)
+        frames.append(previous[previous["文件"].isin(unchanged)])
+    if changed:
+        records = load_policy_modules(changed, max_workers=max_workers, min_chars=min_chars)
+        extracted = extract_records(records)
+        extracted["年份"] = extracted["文件"].map(doc_year)
+        frames.append(extracted)
+
+    frames = [frame for frame in frames if len(frame)]
+    if frames:
+        result = assign_policy_ids(pd.concat(frames, ignore_index=True))
+    else:
+        result = pd.DataFrame(columns=RESULT_COLUMNS + SOURCE_COLUMNS)
+    result = result[RESULT_COLUMNS + SOURCE_COLUMNS]
+
+    tmp_path = output_path + ".tmp"
+    result.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"extractor": extractor, "files": signatures}, f, ensure_ascii=False, indent=1)
+    print(f"结果已保存至：{output_path} ({len(result)} 条)")
+    return result
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+可合并的分位数草图（t-digest），用于每条道路、每个时段桶的车速分位数 (p5/p50/p85)
+
+多年的5分钟数据逐条道路精确求分位数需要保存并排序全部读数。这里每个 (道路, 时段桶)
+只保留约 delta/2 个质心（均值 + 权重），按 t-digest 的 k1 尺度合并：两端分位数附近质心小、
+中间质心大，因此 p5/p85 这类尾部分位数误差也很小。
+
+- 所有行（道路×时段桶）的质心放在同一组扁平数组里，压缩、合并、查询都是整体向量化运算
+- update() 按时间分块流式加入读数；merge() 合并不同月份/不同进程的草图；regroup() 把
+  多个时段桶合并成一行（例如按小时的草图汇总为整月）
+- 草图用 save_sketch/load_sketch 以 .npz 保存，流水线 speed_sketches 阶段生成
+
+用法:
+    sketch = link_speed_sketch(speeds, valid=quality != MISSING, scheme='hour')
+    p5, p50, p85 = link_percentiles(sketch, n_buckets=24).T
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from speedmatrix import SLOT_MINUTES, SLOTS_PER_DAY, URBAN_CORE_START
+
+
+DEFAULT_DELTA = 100
+DEFAULT_QUANTILES = (0.05, 0.5, 0.85)
+
+# 时段桶方案: 名称 -> 桶数
+BUCKET_SCHEMES = {'all': 1, 'hour': 24, 'daytype_hour': 48}
+
+# rows/means/weights: 按 (行, 均值) 排序的质心; minimum/maximum: 每行的最小/最大读数
+Sketch = namedtuple('Sketch', ['rows', 'means', 'weights', 'minimum', 'maximum', 'n_rows', 'delta'])
+
+
+def empty_sketch(n_rows, delta=DEFAULT_DELTA):
+    return Sketch(np.empty(0, dtype=np.int64), np.empty(0), np.empty(0),
+                  np.full(n_rows, np.inf), np.full(n_rows, -np.inf), n_rows, delta)
+
+
+def _row_totals(rows, weights, n_rows):
+    return np.bincount(rows, weights=weights, minlength=n_rows)
+
+
+def compress(rows, means, weights, n_rows, delta=DEFAULT_DELTA):
+    """
+    把任意质心（或权重为1的原始读数）压缩为 t-digest：按 (行, 均值) 排序后，
+    以每个质心中点处 k1(q) = delta/(2π)·asin(2q-1) 的整数部分为簇号合并
+    返回 (rows, means, weights)
+    """
+    order = np.lexsort((means, rows))
+    rows, means, weights = rows[order], means[order], weights[order]
+    if len(rows) == 0:
+        return rows, means, weights
+
+    totals = _row_totals(rows, weights, n_rows)
+    cum = np.cumsum(weights)
+    starts = np.searchsorted(rows, np.arange(n_rows))
+    offset = np.concatenate([[0.0], cum])[starts]
+    q = (cum - offset[rows] - weights / 2) / totals[rows]
+    k = np.floor(delta / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))).astype(np.int64)
+
+    # 同一行内簇号单调不减，相邻元素 (行, 簇号) 变化处即为新质心的起点
+    boundary = np.ones(len(rows), dtype=bool)
+    boundary[1:] = (rows[1:] != rows[:-1]) | (k[1:] != k[:-1])
+    first = np.flatnonzero(boundary)
+    merged_weights = np.add.reduceat(weights, first)
+    merged_means = np.add.reduceat(weights * means, first) / merged_weights
+    return rows[first], merged_means, merged_weights
+
+
+def update(sketch, rows, values, weights=None):
+    """加入一批读数（rows 为每个读数所属的行），返回新的草图"""
+    rows = np.asarray(rows, dtype=np.int64).ravel()
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if len(values) == 0:
+        return sketch
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64).ravel()
+
+    minimum = sketch.minimum.copy()
+    maximum = sketch.maximum.copy()
+    np.minimum.at(minimum, rows, values)
+    np.maximum.at(maximum, rows, values)
+    merged = compress(np.concatenate([sketch.rows, rows]), np.concatenate([sketch.means, values]),
+                      np.concatenate([sketch.weights, weights]), sketch.n_rows, sketch.delta)
+    return Sketch(*merged, minimum, maximum, sketch.n_rows, sketch.delta)
+
+
+def merge(*sketches):
+    """合并行数相同的多个草图（例如不同月份、不同进程的结果）"""
+    first = sketches[0]
+    if any(s.n_rows != first.n_rows for s in sketches):
+        raise ValueError("只能合并行数相同的草图")
+    delta = min(s.delta for s in sketches)
+    merged = compress(np.concatenate([s.rows for s in sketches]), np.concatenate([s.means for s in sketches]),
+                      np.concatenate([s.weights for s in sketches]), first.n_rows, delta)
+    minimum = np.min([s.minimum for s in sketches], axis=0)
+    maximum = np.max([s.maximum for s in sketches], axis=0)
+    return Sketch(*merged, minimum, maximum, first.n_rows, delta)
+
+
+def regroup(sketch, mapping, n_rows):
+    """按 mapping（旧行号 -> 新行号）把多行合并，例如把每条道路的24个小时桶汇总为一行"""
+    mapping = np.asarray(mapping, dtype=np.int64)
+    rows = mapping[sketch.rows]
+    merged = compress(rows, sketch.means, sketch.weights, n_rows, sketch.delta)
+    minimum = np.full(n_rows, np.inf)
+    maximum = np.full(n_rows, -np.inf)
+    np.minimum.at(minimum, mapping, sketch.minimum)
+    np.maximum.at(maximum, mapping, sketch.maximum)
+    return Sketch(*merged, minimum, maximum, n_rows, sketch.delta)
+
+
+def counts(sketch):
+    """每行的读数个数"""
+    return _row_totals(sketch.rows, sketch.weights, sketch.n_rows)
+
+
+def quantiles(sketch, qs=DEFAULT_QUANTILES):
+    """
+    每行的分位数，返回 (行数, len(qs)) 数组；没有读数的行为 NaN。
+    在相邻质心的中点之间线性插值，两端分别插值到最小/最大读数
+    """
+    qs = np.asarray(qs, dtype=np.float64)
+    n_rows = sketch.n_rows
+    result = np.full((n_rows, len(qs)), np.nan)
+    if len(sketch.rows) == 0:
+        return result
+
+    rows, means, weights = sketch.rows, sketch.means, sketch.weights
+    totals = _row_totals(rows, weights, n_rows)
+    cum = np.cumsum(weights)
+    starts = np.searchsorted(rows, np.arange(n_rows))
+    offset = np.concatenate([[0.0], cum])[starts]
+    # 行号 + 行内中点分位数，整体单调递增，一次 searchsorted 找到所有行的插值区间
+    key = rows + (cum - offset[rows] - weights / 2) / totals[rows]
+    center_q = key - rows
+
+    has_data = np.flatnonzero(totals > 0)
+    for j, q in enumerate(qs):
+        idx = np.searchsorted(key, has_data + q)
+        left = idx - 1
+        left_ok = (left >= 0) & (rows[np.maximum(left, 0)] == has_data)
+        right_ok = (idx < len(rows)) & (rows[np.minimum(idx, len(rows) - 1)] == has_data)
+        left_c = np.minimum(np.maximum(left, 0), len(rows) - 1)
+        right_c = np.minimum(idx, len(rows) - 1)
+
+        x0 = np.where(left_ok, center_q[left_c], 0.0)
+        y0 = np.where(left_ok, means[left_c], sketch.minimum[has_data])
+        x1 = np.where(right_ok, center_q[right_c], 1.0)
+        y1 = np.where(right_ok, means[right_c], sketch.maximum[has_data])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(x1 > x0, (q - x0) / (x1 - x0), 0.0)
+        result[has_data, j] = y0 + np.clip(frac, 0, 1) * (y1 - y0)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# 道路×时段桶
+# ---------------------------------------------------------------------------
+
+def slot_buckets(slot_index, start=URBAN_CORE_START, scheme='hour'):
+    """时段序号 -> 时段桶号。hour: 小时 (0-23); daytype_hour: 工作日 0-23、周末 24-47"""
+    if scheme not in BUCKET_SCHEMES:
+        raise ValueError(f"未知的时段桶方案: {scheme}，可选 {list(BUCKET_SCHEMES)}")
+    slot_index = np.asarray(slot_index)
+    if scheme == 'all':
+        return np.zeros(len(slot_index), dtype=np.int64)
+    times = pd.Timestamp(start) + pd.to_timedelta(slot_index * SLOT_MINUTES, unit='min')
+    hour = np.asarray(times.hour, dtype=np.int64)
+    if scheme == 'hour':
+        return hour
+    return hour + 24 * (np.asarray(times.dayofweek) >= 5)
+
+
+def link_speed_sketch(speeds, valid=None, start=URBAN_CORE_START, scheme='hour', delta=DEFAULT_DELTA,
+                      chunk_slots=SLOTS_PER_DAY * 7, sketch=None, slot_offset=0):
+    """
+    流式构建道路×时段桶的草图：按 chunk_slots 个时段分块读取速度矩阵（可以是 memmap），
+    只加入 valid（默认为速度>0）的读数。传入 sketch 和 slot_offset 可以在已有草图上继续累加。
+    行号 = 道路序号 × 桶数 + 桶号
+    """
+    n_links, n_slots = speeds.shape
+    n_buckets = BUCKET_SCHEMES[scheme]
+    if sketch is None:
+        sketch = empty_sketch(n_links * n_buckets, delta)
+
+    for col in range(0, n_slots, chunk_slots):
+        block = np.asarray(speeds[:, col:col + chunk_slots], dtype=np.float64)
+        mask = block > 0 if valid is None else np.asarray(valid[:, col:col + chunk_slots])
+        buckets = slot_buckets(np.arange(col, col + block.shape[1]) + slot_offset, start, scheme)
+        link_idx, slot_idx = np.nonzero(mask)
+        sketch = update(sketch, link_idx * n_buckets + buckets[slot_idx], block[link_idx, slot_idx])
+    return sketch
+
+
+def link_percentiles(sketch, n_buckets, qs=DEFAULT_QUANTILES):
+    """把每条道路的所有时段桶合并后求分位数，返回 (道路数, len(qs))"""
+    n_links = sketch.n_rows // n_buckets
+    return quantiles(regroup(sketch, np.arange(sketch.n_rows) // n_buckets, n_links), qs)
+
+
+def bucket_percentiles(sketch, link_ids, scheme='hour', qs=DEFAULT_QUANTILES):
+    """每条道路每个时段桶的分位数长表: link_id, bucket, count, p5, p50, ..."""
+    n_buckets = BUCKET_SCHEMES[scheme]
+    values = quantiles(sketch, qs)
+    table = pd.DataFrame({
+        'link_id': np.repeat(np.asarray(link_ids), n_buckets),
+        'bucket': np.tile(np.arange(n_buckets), len(link_ids)),
+        'count': counts(sketch).astype(np.int64),
+    })
+    for j, q in enumerate(qs):
+        table[f'p{round(q * 100):g}'] = values[:, j]
+    return table
+
+
+# 保存/读取
+def save_sketch(sketch, path):
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, rows=sketch.rows, means=sketch.means, weights=sketch.weights,
+             minimum=sketch.minimum, maximum=sketch.maximum, n_rows=sketch.n_rows, delta=sketch.delta)
+    os.replace(tmp_path, path)
+
+
+def load_sketch(path):
+    with np.load(path) as data:
+        return Sketch(data['rows'], data['means'], data['weights'], data['minimum'], data['maximum'],
+                      int(data['n_rows']), int(data['delta']))
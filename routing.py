@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+"""
+基于 urban-core 道路网络的时变行程时间路径规划（最快路径 / 等时圈）
+
+- 图的节点是道路(link)，相邻道路之间有有向边，以 CSR (indptr, indices) 存储
+- 每条道路每个5分钟时段的通行速度来自清洗后的速度矩阵；通过一条道路的时间按时段
+  积分 (长度/速度，跨时段时分段计算)，所以更晚出发不会更早到达 (FIFO)
+- 最快路径用时变 A*，启发函数为 ALT 地标下界：预先以每条道路的最短通行时间
+  （长度/最高速度）对少量地标做正反向 Dijkstra
+- 等时圈为从起点出发的时变 Dijkstra，在时间预算内停止
+
+urban-core.csv 没有路口/节点信息，只有每条道路的投影坐标（第3、4列，单位米，视为中点）
+和长度。build_graph 默认把中点距离不超过两条道路半长之和 + ADJACENCY_TOLERANCE 的道路
+视为相邻；有真实拓扑时可以通过 edges 传入 (from_link, to_link) 对。
+
+吞吐量（单核，纯 Python 搜索，100 米间距网格、随机时段速度）:
+    route_many 的速度取决于起点是否共用：同一起点的终点共用一次搜索，
+    5041 条道路、10 个起点各 200 个终点时约 1.7 万对/秒；起点各不相同时每 BATCH_PAIRS
+    对一起做 numpy 向量化 A*，约为逐对调用 fastest_route 的 3.5 倍（同一台机器上
+    5041 条道路约 600 对/秒 vs 165 次/秒，2025 条道路约 1500 对/秒 vs 420 次/秒）
+
+速度表默认按"周内时段"(7×288) 取各周同一时段的平均值，任意日期时间都可以查询；
+也可以 profile=False 直接使用整月的时段序列。
+
+用法:
+    python cli.py route 1210006200 1210007000 --depart "2018-04-02 08:00"
+    python cli.py route 1210006200 --isochrone 10
+"""
+
+import heapq
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from speedmatrix import SLOT_MINUTES, SLOTS_PER_DAY, URBAN_CORE_START
+
+
+SLOT_SECONDS = SLOT_MINUTES * 60
+SLOTS_PER_WEEK = SLOTS_PER_DAY * 7
+PROFILE_START = '2018-04-02 00:00:00'   # 周内时段速度表的时间原点（任意一个周一 0 点）
+ADJACENCY_TOLERANCE = 30.0              # 米
+DEFAULT_SPEED = 30.0                    # 没有任何速度数据、也没有限速时使用 (km/h)
+N_LANDMARKS = 8
+BATCH_PAIRS = 256                       # route_many 中起点各不相同的查询每批同时搜索的对数
+BATCH_DELTA = 30.0                      # 批量搜索每轮推进的 f 值宽度（秒）
+
+# link_ids/lengths: 每条道路; indptr/indices: CSR 邻接; speeds: 道路×时段速度 (m/s, float32);
+# start/period: 时段0对应的时间和时段数（超出后循环）; landmarks/lm_from/lm_to: ALT 地标及下界距离
+RoutingGraph = namedtuple('RoutingGraph', ['link_ids', 'lengths', 'indptr', 'indices', 'speeds', 'start', 'period',
+                                           'landmarks', 'lm_from', 'lm_to'])
+
+
+# ---------------------------------------------------------------------------
+# 构建
+# ---------------------------------------------------------------------------
+
+def infer_adjacency(links, tolerance=ADJACENCY_TOLERANCE):
+    """按中点距离推断相邻道路，返回有向边 (src, dst) 道路序号数组（双向都包含）"""
+    from scipy.spatial import cKDTree
+
+    points = links[['id_x', 'id_y']].to_numpy(dtype=np.float64)
+    half = links['length'].to_numpy(dtype=np.float64) / 2
+    tree = cKDTree(points)
+    pairs = tree.query_pairs(r=2 * half.max() + tolerance, output_type='ndarray')
+    dist = np.linalg.norm(points[pairs[:, 0]] - points[pairs[:, 1]], axis=1)
+    pairs = pairs[dist <= half[pairs[:, 0]] + half[pairs[:, 1]] + tolerance]
+    return np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]])
+
+
+def to_csr(src, dst, n_nodes):
+    order = np.lexsort((dst, src))
+    src, dst = src[order], dst[order]
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_nodes), out=indptr[1:])
+    return indptr, dst.astype(np.int32)
+
+
+def weekly_profile(speeds, valid=None, start=URBAN_CORE_START):
+    """道路×时段速度 -> 道路×周内时段(周一0点起, 7×288) 的平均速度，没有数据的时段为0"""
+    n_links, n_slots = speeds.shape
+    total = np.zeros((n_links, SLOTS_PER_WEEK))
+    count = np.zeros((n_links, SLOTS_PER_WEEK))
+    first_dow = pd.Timestamp(start).dayofweek
+    first_slot = (pd.Timestamp(start) - pd.Timestamp(start).normalize()) // pd.Timedelta(minutes=SLOT_MINUTES)
+    offset = first_dow * SLOTS_PER_DAY + first_slot
+
+    # 按天分块累加，每块在周内时段上是连续的一段（跨周末时分两段）
+    for col in range(0, n_slots, SLOTS_PER_DAY):
+        block = np.asarray(speeds[:, col:col + SLOTS_PER_DAY], dtype=np.float64)
+        mask = block > 0 if valid is None else np.asarray(valid[:, col:col + SLOTS_PER_DAY])
+        week_slots = (offset + col + np.arange(block.shape[1])) % SLOTS_PER_WEEK
+        # 一天内的周内时段互不重复，可以直接按下标累加
+        total[:, week_slots] += np.where(mask, block, 0)
+        count[:, week_slots] += mask
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, 0).astype(np.float32)
+
+
+def fill_speed_table(speeds, speed_limits):
+    """缺失(0)时段用该道路的平均速度代替，完全没有数据的道路用限速，返回 m/s"""
+    speeds = np.asarray(speeds, dtype=np.float32)
+    valid = speeds > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, speeds, 0).sum(axis=1) / valid.sum(axis=1)
+    fallback = np.where(np.isfinite(mean) & (mean > 0), mean, np.asarray(speed_limits, dtype=np.float64))
+    fallback = np.where(fallback > 0, fallback, DEFAULT_SPEED)
+    filled = np.where(valid, speeds, fallback[:, None].astype(np.float32))
+    return np.ascontiguousarray(filled / 3.6, dtype=np.float32)
+
+
+def select_landmarks(indptr, indices, weights, n_landmarks=N_LANDMARKS, seed=0):
+    """最远点法选地标，返回 (地标, 地标->各点下界, 各点->地标下界)"""
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+
+    n = len(indptr) - 1
+    forward = csr_matrix((weights, indices, indptr), shape=(n, n))
+    backward = forward.T.tocsr()
+    rng = np.random.default_rng(seed)
+    landmarks = []
+    closest = np.full(n, np.inf)
+    candidate = int(rng.integers(n))
+    for _ in range(min(n_landmarks, n)):
+        landmarks.append(candidate)
+        d = dijkstra(forward, indices=candidate)
+        closest = np.minimum(closest, np.where(np.isfinite(d), d, np.inf))
+        reachable = np.isfinite(closest)
+        candidate = int(np.argmax(np.where(reachable, closest, -1))) if reachable.any() else int(rng.integers(n))
+
+    lm_from = dijkstra(forward, indices=landmarks)
+    lm_to = dijkstra(backward, indices=landmarks)
+    return np.asarray(landmarks, dtype=np.int32), lm_from, lm_to
+
+
+def build_graph(links, speeds, valid=None, start=URBAN_CORE_START, profile=True, edges=None,
+                tolerance=ADJACENCY_TOLERANCE, n_landmarks=N_LANDMARKS):
+    """
+    由道路属性表和速度矩阵构建路网。profile=True 时速度表为周内时段平均；
+    edges 为 (from_link_id, to_link_id) 数组对，不传时按坐标推断相邻关系
+    """
+    link_ids = links['link_id'].to_numpy()
+    lengths = links['length'].to_numpy(dtype=np.float64)
+    if edges is None:
+        src, dst = infer_adjacency(links, tolerance)
+    else:
+        position = pd.Series(np.arange(len(link_ids)), index=link_ids)
+        src = position.loc[np.asarray(edges[0])].to_numpy()
+        dst = position.loc[np.asarray(edges[1])].to_numpy()
+    indptr, indices = to_csr(src, dst, len(link_ids))
+
+    if profile:
+        table, table_start = weekly_profile(speeds, valid, start), PROFILE_START
+    else:
+        table = np.where(valid, speeds, 0) if valid is not None else speeds
+        table_start = start
+    table = fill_speed_table(table, links['speed_limit'].to_numpy())
+
+    # 地标下界：边 i->j 的权重为通过 j 的最短时间
+    min_time = lengths / table.max(axis=1)
+    landmarks, lm_from, lm_to = select_landmarks(indptr, indices, min_time[indices], n_landmarks)
+    return RoutingGraph(link_ids, lengths, indptr, indices, table, pd.Timestamp(table_start), table.shape[1],
+                        landmarks, lm_from, lm_to)
+
+
+def save_graph(graph, path):
+    tmp_path = path + '.tmp.npz'
+    fields = graph._asdict()
+    fields['start'] = np.array(str(graph.start))
+    np.savez(tmp_path, **fields)
+    os.replace(tmp_path, path)
+
+
+def load_graph(path):
+    with np.load(path) as data:
+        fields = {name: data[name] for name in RoutingGraph._fields}
+    fields['start'] = pd.Timestamp(str(fields['start']))
+    fields['period'] = int(fields['period'])
+    return RoutingGraph(**fields)
+
+
+# ---------------------------------------------------------------------------
+# 查询
+# ---------------------------------------------------------------------------
+
+class _Query:
+    """把图转换成查询时用的 Python 列表 / memoryview（逐元素访问比 numpy 下标快得多）"""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.n = len(graph.link_ids)
+        self.period = graph.period
+        self.indptr = graph.indptr.tolist()
+        self.indices = graph.indices.tolist()
+        self.lengths = graph.lengths.tolist()
+        self.speed_array = np.ascontiguousarray(graph.speeds, dtype=np.float32).ravel()
+        self.speeds = memoryview(self.speed_array)
+        self.lm_from = np.ascontiguousarray(graph.lm_from.T)   # 点×地标
+        self.lm_to = np.ascontiguousarray(graph.lm_to.T)
+        self.position = {link_id: i for i, link_id in enumerate(graph.link_ids.tolist())}
+
+    def node(self, link_id):
+        try:
+            return self.position[link_id]
+        except KeyError:
+            raise KeyError(f"路网中没有道路 {link_id}") from None
+
+    def seconds(self, when):
+        return (pd.Timestamp(when) - self.graph.start).total_seconds()
+
+    def traverse(self, node, t):
+        """t 时刻（相对 start 的秒数）进入道路 node，返回离开时刻"""
+        remaining = self.lengths[node]
+        base = node * self.period
+        slot = int(t // SLOT_SECONDS)
+        speeds = self.speeds
+        period = self.period
+        while True:
+            v = speeds[base + slot % period]
+            slot_end = (slot + 1) * SLOT_SECONDS
+            step = v * (slot_end - t)
+            if step >= remaining:
+                return t + remaining / v
+            remaining -= step
+            t = slot_end
+            slot += 1
+
+    def heuristic(self, target):
+        """ALT 下界，返回各点到 target 的下界数组（Python 列表）"""
+        from_t = self.graph.lm_from[:, target]
+        to_t = self.graph.lm_to[:, target]
+        with np.errstate(invalid='ignore'):
+            h = np.maximum((from_t[None, :] - self.lm_from), (self.lm_to - to_t[None, :]))
+        h = np.where(np.isfinite(h), h, 0).max(axis=1)
+        return np.maximum(h, 0).tolist()
+
+    def heuristic_pairs(self, nodes, targets):
+        """heuristic 的逐对版本：nodes[i] 到 targets[i] 的下界数组"""
+        with np.errstate(invalid='ignore'):
+            h = np.maximum(self.lm_from[targets] - self.lm_from[nodes], self.lm_to[nodes] - self.lm_to[targets])
+        h = np.where(np.isfinite(h), h, 0).max(axis=1)
+        return np.maximum(h, 0)
+
+    def traverse_many(self, nodes, t):
+        """traverse 的向量化版本：nodes[i] 在 t[i] 时刻进入，返回离开时刻数组"""
+        lengths, speeds, period = self.graph.lengths, self.speed_array, self.period
+        slot = (t // SLOT_SECONDS).astype(np.int64)
+        v = speeds[nodes * period + slot % period]
+        out = t + lengths[nodes] / v
+        slot_end = (slot + 1) * SLOT_SECONDS
+        # 跨时段的少数道路逐段积分
+        idx = np.flatnonzero(out > slot_end)
+        remaining = lengths[nodes[idx]] - v[idx] * (slot_end[idx] - t[idx])
+        slot = slot[idx] + 1
+        while len(idx):
+            v = speeds[nodes[idx] * period + slot % period]
+            step = v * SLOT_SECONDS
+            last = step >= remaining
+            out[idx[last]] = slot[last] * SLOT_SECONDS + remaining[last] / v[last]
+            idx, remaining, slot = idx[~last], remaining[~last] - step[~last], slot[~last] + 1
+        return out
+
+
+_queries = {}
+INF = float('inf')
+
+
+def _query(graph):
+    query = _queries.get(id(graph))
+    if query is None or query.graph is not graph:
+        query = _queries[id(graph)] = _Query(graph)
+    return query
+
+
+def _search(q, s, t0, stop=(), h=None, limit=INF):
+    """
+    时变 Dijkstra / A* 的公共部分。stop 中的道路全部确定后停止；h 为启发函数（各点下界列表）；
+    limit 为到达时刻上限。返回 (各点到达时刻列表, 前驱列表)
+    """
+    n = q.n
+    indptr, indices, lengths, speeds, period, traverse = q.indptr, q.indices, q.lengths, q.speeds, q.period, q.traverse
+    heappush, heappop = heapq.heappush, heapq.heappop
+    if h is None:
+        h = [0.0] * n
+    arrival = [INF] * n
+    parent = [-1] * n
+    done = bytearray(n)
+    remaining = set(stop)
+
+    arrival[s] = traverse(s, t0)
+    heap = [(arrival[s] + h[s], s)]
+    while heap:
+        _, v = heappop(heap)
+        if done[v]:
+            continue
+        t = arrival[v]
+        if t > limit:
+            break
+        done[v] = 1
+        if v in remaining:
+            remaining.discard(v)
+            if not remaining:
+                break
+        slot = int(t // SLOT_SECONDS)
+        slot_end = (slot + 1) * SLOT_SECONDS
+        col = slot % period
+        for k in range(indptr[v], indptr[v + 1]):
+            w = indices[k]
+            if done[w]:
+                continue
+            # 大多数道路在当前时段内就能通过，跨时段时才逐段积分
+            tw = t + lengths[w] / speeds[w * period + col]
+            if tw > slot_end:
+                tw = traverse(w, t)
+            if tw < arrival[w]:
+                arrival[w] = tw
+                parent[w] = v
+                heappush(heap, (tw + h[w], w))
+    return arrival, parent
+
+
+def _search_many(q, sources, targets, t0, delta=BATCH_DELTA):
+    """
+    多个 (起点, 终点) 对同时做时变 A*，返回 (各对到达终点时刻, 各对经过道路数)。
+    标签修正法：每轮取每对前沿中 f = 到达时刻 + 下界 不超过该对最小 f + delta 的标签，
+    所有对一起用 numpy 松弛出边；f 不小于已知终点到达时刻的标签剪掉（下界可采纳，FIFO 下结果与 _search 相同）
+    """
+    n, m = q.n, len(sources)
+    rows = np.arange(m)
+    indptr, indices = q.graph.indptr, q.graph.indices.astype(np.int64)
+    arrival = np.full(m * n, INF)
+    parent = np.full(m * n, -1, dtype=np.int64)
+    stamp = np.zeros(m * n, dtype=np.int64)
+    key = rows * n + sources
+    arrival[key] = q.traverse_many(sources, np.full(m, t0))
+    best = np.where(sources == targets, arrival[key], INF)
+
+    # 前沿: 标签 key = 对 * n + 道路，及其 f 值
+    f = arrival[key] + q.heuristic_pairs(sources, targets)
+    while len(key):
+        fr = key // n
+        live = f < best[fr]
+        key, fr, f = key[live], fr[live], f[live]
+        if not len(key):
+            break
+        low = np.full(m, INF)
+        np.minimum.at(low, fr, f)
+        now = f <= low[fr] + delta
+        rest_key, rest_f = key[~now], f[~now]
+        fr, fv = fr[now], key[now] % n
+        t = arrival[key[now]]
+
+        # 展开出边 (对, 前驱, 后继, 进入时刻)
+        begin = indptr[fv]
+        degree = indptr[fv + 1] - begin
+        offsets = np.repeat(begin - (np.cumsum(degree) - degree), degree)
+        w = indices[offsets + np.arange(degree.sum())]
+        er, ev = np.repeat(fr, degree), np.repeat(fv, degree)
+        tw = q.traverse_many(w, np.repeat(t, degree))
+        key = er * n + w
+        better = tw < arrival[key]
+        key, tw, ev, er, w = key[better], tw[better], ev[better], er[better], w[better]
+        # 同一对同一道路有多个候选时取最早到达
+        np.minimum.at(arrival, key, tw)
+        won = tw == arrival[key]
+        parent[key[won]] = ev[won]
+        hit = w == targets[er]
+        np.minimum.at(best, er[hit], tw[hit])
+
+        # 新前沿 = 未处理的标签 + 本轮改进的标签，同一标签只保留最后一条（改进后的 f）
+        new_f = arrival[key] + q.heuristic_pairs(w, targets[er])
+        key = np.concatenate([rest_key, key])
+        f = np.concatenate([rest_f, new_f])
+        stamp[key] = np.arange(len(key))
+        last = stamp[key] == np.arange(len(key))
+        key, f = key[last], f[last]
+
+    # 沿前驱数道路数
+    n_links = np.zeros(m, dtype=np.int64)
+    current = np.where(best < INF, targets, -1)
+    for _ in range(n):
+        active = current >= 0
+        if not active.any():
+            break
+        n_links += active
+        current[active] = parent[rows[active] * n + current[active]]
+    return best, n_links
+
+
+def _path(parent, target):
+    path = []
+    v = target
+    while v != -1:
+        path.append(v)
+        v = parent[v]
+    path.reverse()
+    return path
+
+
+def fastest_route(graph, origin, destination, depart):
+    """
+    从道路 origin 的起点出发、到道路 destination 的终点为止的最快路径（时变 A*）。
+    返回 dict: links, depart, arrive, travel_time(秒)；不可达时返回 None
+    """
+    q = _query(graph)
+    s, target = q.node(origin), q.node(destination)
+    t0 = q.seconds(depart)
+    arrival, parent = _search(q, s, t0, stop=(target,), h=q.heuristic(target))
+    if arrival[target] == INF:
+        return None
+
+    start = pd.Timestamp(depart)
+    travel_time = arrival[target] - t0
+    return {
+        'links': [graph.link_ids[i].item() for i in _path(parent, target)],
+        'depart': start,
+        'arrive': start + pd.Timedelta(seconds=travel_time),
+        'travel_time': travel_time,
+    }
+
+
+def route_many(graph, origins, destinations, depart):
+    """
+    批量查询，返回 DataFrame: origin, destination, travel_time(秒), n_links。
+    同一起点的所有终点共用一次时变 Dijkstra（所有终点确定后停止）；只出现一次的起点
+    每 BATCH_PAIRS 对一起做向量化 A* (_search_many)
+    """
+    q = _query(graph)
+    t0 = q.seconds(depart)
+    pairs = pd.DataFrame({'origin': list(origins), 'destination': list(destinations)})
+    travel_time = np.full(len(pairs), np.nan)
+    n_links = np.zeros(len(pairs), dtype=np.int64)
+
+    single = ~pairs['origin'].duplicated(keep=False).to_numpy()
+    single_rows = np.flatnonzero(single)
+    for chunk in range(0, len(single_rows), BATCH_PAIRS):
+        rows = single_rows[chunk:chunk + BATCH_PAIRS]
+        sources = np.array([q.node(o) for o in pairs['origin'].to_numpy()[rows]], dtype=np.int64)
+        targets = np.array([q.node(d) for d in pairs['destination'].to_numpy()[rows]], dtype=np.int64)
+        arrival, links = _search_many(q, sources, targets, t0)
+        reached = arrival < INF
+        travel_time[rows[reached]] = arrival[reached] - t0
+        n_links[rows[reached]] = links[reached]
+
+    for origin, group in pairs[~single].groupby('origin', sort=False):
+        s = q.node(origin)
+        targets = [q.node(d) for d in group['destination']]
+        h = q.heuristic(targets[0]) if len(set(targets)) == 1 else None
+        arrival, parent = _search(q, s, t0, stop=targets, h=h)
+        for row, target in zip(group.index, targets):
+            if arrival[target] != INF:
+                travel_time[row] = arrival[target] - t0
+                n_links[row] = len(_path(parent, target))
+    pairs['travel_time'] = travel_time
+    pairs['n_links'] = n_links
+    return pairs
+
+
+def isochrone(graph, origin, depart, budget_seconds):
+    """从道路 origin 出发在 budget_seconds 内可以到达（通过）的道路，返回 DataFrame: link_id, travel_time"""
+    q = _query(graph)
+    t0 = q.seconds(depart)
+    arrival, _ = _search(q, q.node(origin), t0, limit=t0 + budget_seconds)
+    times = np.asarray(arrival) - t0
+    reached = np.flatnonzero(times <= budget_seconds)
+    reached = reached[np.argsort(times[reached], kind='stable')]
+    return pd.DataFrame({'link_id': graph.link_ids[reached], 'travel_time': times[reached]})
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+urban-core 格式的 道路×时间 速度矩阵
+
+urban-core.csv 没有表头，前7列为道路属性，其后每列为一个5分钟时段的速度(km/h)，
+0 表示该时段没有数据。这里把它拆成道路属性表(links)和 float32 速度矩阵(speeds)，
+并以 Parquet + .npy 的形式缓存，供各脚本直接读取（.npy 可以内存映射）。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+LINK_COLUMNS = ['link_id', 'short_id', 'id_x', 'id_y', 'speed_limit', 'length', 'direction']
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+# 第一个时段对应的时间（2018年4月，每5分钟一列）
+URBAN_CORE_START = '2018-04-01 00:00:00'
+
+
+# 读取 urban-core.csv
+def read_urban_core(file_path):
+    df = pd.read_csv(file_path, header=None)
+    links = df.iloc[:, :len(LINK_COLUMNS)].copy()
+    links.columns = LINK_COLUMNS
+    speeds = df.iloc[:, len(LINK_COLUMNS):].to_numpy(dtype=np.float32)
+    return links, speeds
+
+
+# 保存/读取缓存的矩阵
+def save_link_matrix(links, speeds, links_path, speeds_path):
+    for path, write in ((links_path, lambda p: links.to_parquet(p, index=False)),
+                        (speeds_path, lambda p: np.save(p, np.ascontiguousarray(speeds, dtype=np.float32)))):
+        tmp_path = path + '.tmp' + os.path.splitext(path)[1]
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+
+def load_link_matrix(links_path, speeds_path, mmap=True):
+    links = pd.read_parquet(links_path)
+    speeds = np.load(speeds_path, mmap_mode='r' if mmap else None)
+    return links, speeds
+
+
+def as_load_data(links, speeds, dtype=np.float64):
+    """转换成 foliumscript.load_data 的返回格式"""
+    return (links['link_id'].tolist(), links['short_id'].tolist(), links['id_x'].tolist(),
+            links['id_y'].tolist(), links['speed_limit'].tolist(), links['length'].tolist(),
+            links['direction'].tolist(), np.asarray(speeds, dtype=dtype))
+
+
+# 向量化的每条道路统计（0值视为缺失），与 foliumscript.calculate_stats 的定义一致
+# valid 为有效时段掩码（如 dataquality 质量矩阵 != MISSING），不传时按 speeds > 0 计算
+def link_stats(links, speeds, valid=None):
+    if valid is None:
+        valid = speeds > 0
+    count = valid.sum(axis=1)
+    safe_count = np.maximum(count, 1)
+    masked = np.where(valid, speeds, 0).astype(np.float64)
+    mean = masked.sum(axis=1) / safe_count
+    var = np.where(valid, (speeds - mean[:, None]) ** 2, 0).sum(axis=1) / safe_count
+    has_data = count > 0
+    return pd.DataFrame({
+        'link_id': links['link_id'].to_numpy(),
+        'avg_speed': np.where(has_data, mean, 0),
+        'max_speed': np.where(has_data, np.where(valid, speeds, -np.inf).max(axis=1), 0),
+        'min_speed': np.where(has_data, np.where(valid, speeds, np.inf).min(axis=1), 0),
+        'std_speed': np.where(has_data, np.sqrt(var), 0),
+        'valid_count': count,
+    })
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+道路×时段速度矩阵的紧凑存储：定点量化 + 分块 + 可选压缩
+
+车速范围 0-120 km/h、精度约 0.5 km/h 就足够，没必要用 float32/float64 保存:
+  - u1: uint8，步长 0.5 km/h（最大 127.5）；u2: uint16，步长 0.01 km/h
+  - 编码 0 表示缺失（与 urban-core 中速度为 0 的含义一致），有效读数至少编码为 1
+  - 按 (道路块 × 时间块) 分块，每块单独存为一个文件，只读取需要的块
+  - 可选沿时间方向做差分（相邻时段车速接近，差分后更容易压缩）再用 zstd / zlib 压缩
+  - 解码用查表 (编码 -> float32) 一次完成，直接写入结果数组
+
+存储为一个目录: meta.json + chunks/<道路块>.<时间块>（+ 可选的 links.parquet 道路属性表，
+此时 foliumscript.load_data 可以直接读取该目录）
+
+用法:
+    python speedstore.py urban-core.csv speeds.store --codec zlib
+    speeds = read_store('speeds.store', links=slice(0, 100))
+"""
+
+import argparse
+import json
+import os
+import zlib
+
+import numpy as np
+
+from speedmatrix import SLOTS_PER_DAY
+
+
+ENCODINGS = {'u1': (np.uint8, 0.5), 'u2': (np.uint16, 0.01)}
+CODECS = ('zstd', 'zlib', None)
+DEFAULT_CHUNKS = (512, SLOTS_PER_DAY * 7)
+FORMAT_VERSION = 1
+
+
+# ---------------------------------------------------------------------------
+# 量化
+# ---------------------------------------------------------------------------
+
+def encode_speeds(speeds, encoding='u1'):
+    """float 速度 -> 定点编码；<=0 或 NaN 为缺失(0)，超出范围的读数截断到最大值"""
+    dtype, scale = ENCODINGS[encoding]
+    speeds = np.asarray(speeds, dtype=np.float32)
+    codes = np.rint(speeds / np.float32(scale))
+    np.clip(codes, 1, np.iinfo(dtype).max, out=codes)
+    codes[~(speeds > 0)] = 0
+    return codes.astype(dtype)
+
+
+def decode_table(encoding='u1'):
+    """编码 -> float32 速度的查找表"""
+    dtype, scale = ENCODINGS[encoding]
+    return np.arange(np.iinfo(dtype).max + 1, dtype=np.float32) * np.float32(scale)
+
+
+def decode_speeds(codes, encoding='u1', out=None):
+    return np.take(decode_table(encoding), codes, out=out)
+
+
+# 沿时间方向差分（按无符号整数回绕），解码时累加还原
+def _delta(codes):
+    diff = codes.copy()
+    diff[:, 1:] = codes[:, 1:] - codes[:, :-1]
+    return diff
+
+
+def _undelta(diff):
+    return np.cumsum(diff, axis=1, dtype=diff.dtype)
+
+
+# ---------------------------------------------------------------------------
+# 压缩
+# ---------------------------------------------------------------------------
+
+def _compressor(codec, level):
+    if codec is None:
+        return lambda data: data
+    if codec == 'zlib':
+        return lambda data: zlib.compress(data, level if level is not None else 1)
+    if codec == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("codec='zstd' 需要安装 zstandard: pip install zstandard") from None
+        return zstandard.ZstdCompressor(level=level if level is not None else 3).compress
+    raise ValueError(f"未知的压缩方式: {codec}，可选 {CODECS}")
+
+
+def _decompressor(codec):
+    if codec is None:
+        return lambda data: data
+    if codec == 'zlib':
+        return zlib.decompress
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"未知的压缩方式: {codec}")
+
+
+# ---------------------------------------------------------------------------
+# 读写
+# ---------------------------------------------------------------------------
+
+def _chunk_path(path, link_block, time_block):
+    return os.path.join(path, 'chunks', f'{link_block}.{time_block}')
+
+
+def write_store(path, speeds, encoding='u1', chunks=DEFAULT_CHUNKS, codec='zlib', level=None, delta=None,
+                links=None):
+    """
+    把 道路×时段 速度矩阵（可以是 memmap）写成分块量化存储；links 为道路属性表时一并保存。
+    delta 默认在压缩时开启；按道路块读取输入，内存占用与块大小成正比
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"未知的编码: {encoding}，可选 {list(ENCODINGS)}")
+    if delta is None:
+        delta = codec is not None
+    compress = _compressor(codec, level)
+    n_links, n_slots = speeds.shape
+    link_chunk, slot_chunk = chunks
+
+    tmp_path = path + '.tmp'
+    os.makedirs(os.path.join(tmp_path, 'chunks'), exist_ok=True)
+    raw_bytes = stored_bytes = 0
+    for li, row in enumerate(range(0, n_links, link_chunk)):
+        codes = encode_speeds(speeds[row:row + link_chunk], encoding)
+        for ti, col in enumerate(range(0, n_slots, slot_chunk)):
+            block = np.ascontiguousarray(codes[:, col:col + slot_chunk])
+            if delta:
+                block = _delta(block)
+            data = compress(block.tobytes())
+            with open(_chunk_path(tmp_path, li, ti), 'wb') as f:
+                f.write(data)
+            raw_bytes += block.size * 4
+            stored_bytes += len(data)
+
+    meta = {'version': FORMAT_VERSION, 'shape': [n_links, n_slots], 'encoding': encoding,
+            'scale': ENCODINGS[encoding][1], 'chunks': [link_chunk, slot_chunk], 'codec': codec, 'delta': delta,
+            'stored_bytes': stored_bytes, 'float32_bytes': raw_bytes}
+    with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    if links is not None:
+        links.to_parquet(os.path.join(tmp_path, 'links.parquet'), index=False)
+    if os.path.exists(path):
+        import shutil
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    return meta
+
+
+def store_info(path):
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_links(path):
+    import pandas as pd
+    return pd.read_parquet(os.path.join(path, 'links.parquet'))
+
+
+def _range(selection, size):
+    if selection is None:
+        return 0, size
+    start, stop, step = selection.indices(size)
+    if step != 1:
+        raise ValueError("只支持连续的切片")
+    return start, stop
+
+
+def read_codes(path, links=None, slots=None, meta=None):
+    """读取定点编码（不解码），links/slots 为连续切片；只读取相交的块"""
+    meta = meta or store_info(path)
+    n_links, n_slots = meta['shape']
+    link_chunk, slot_chunk = meta['chunks']
+    dtype = ENCODINGS[meta['encoding']][0]
+    decompress = _decompressor(meta['codec'])
+    row0, row1 = _range(links, n_links)
+    col0, col1 = _range(slots, n_slots)
+
+    out = np.empty((max(row1 - row0, 0), max(col1 - col0, 0)), dtype=dtype)
+    for li in range(row0 // link_chunk, -(-row1 // link_chunk)):
+        block_row = li * link_chunk
+        rows = min(link_chunk, n_links - block_row)
+        for ti in range(col0 // slot_chunk, -(-col1 // slot_chunk)):
+            block_col = ti * slot_chunk
+            cols = min(slot_chunk, n_slots - block_col)
+            with open(_chunk_path(path, li, ti), 'rb') as f:
+                block = np.frombuffer(decompress(f.read()), dtype=dtype).reshape(rows, cols)
+            if meta['delta']:
+                block = _undelta(block)
+            r0, r1 = max(row0, block_row), min(row1, block_row + rows)
+            c0, c1 = max(col0, block_col), min(col1, block_col + cols)
+            out[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = block[r0 - block_row:r1 - block_row,
+                                                                  c0 - block_col:c1 - block_col]
+    return out
+
+
+def read_store(path, links=None, slots=None, dtype=np.float32):
+    """读取并解码为速度矩阵（缺失为0），与 speedmatrix 的 speeds 格式一致"""
+    meta = store_info(path)
+    codes = read_codes(path, links, slots, meta)
+    speeds = decode_speeds(codes, meta['encoding'])
+    return speeds if speeds.dtype == dtype else speeds.astype(dtype)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把 urban-core.csv 或 .npy 速度矩阵转换为量化分块存储')
+    parser.add_argument('source', help='urban-core 格式的 CSV 或 道路×时段 .npy')
+    parser.add_argument('output')
+    parser.add_argument('--encoding', choices=list(ENCODINGS), default='u1')
+    parser.add_argument('--codec', choices=['zstd', 'zlib', 'none'], default='zlib')
+    parser.add_argument('--level', type=int)
+    parser.add_argument('--link-chunk', type=int, default=DEFAULT_CHUNKS[0])
+    parser.add_argument('--slot-chunk', type=int, default=DEFAULT_CHUNKS[1])
+    args = parser.parse_args()
+
+    links = None
+    if args.source.endswith('.npy'):
+        speeds = np.load(args.source, mmap_mode='r')
+    else:
+        from speedmatrix import read_urban_core
+        links, speeds = read_urban_core(args.source)
+    meta = write_store(args.output, speeds, args.encoding, (args.link_chunk, args.slot_chunk),
+                       None if args.codec == 'none' else args.codec, args.level, links=links)
+    ratio = meta['float32_bytes'] / max(meta['stored_bytes'], 1)
+    print(f"已保存: {args.output}  {meta['stored_bytes'] / 2 ** 20:.1f} MB "
+          f"(float32 的 1/{ratio:.1f}，float64 的 1/{ratio * 2:.1f})")
+
+
+if __name__ == "__main__":
+    main()
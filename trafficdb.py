@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+基于 DuckDB 的 SQL 查询层：把规范化后的交通数据集以 Parquet 表的形式暴露出来
+
+表（视图，直接扫描 Parquet，支持谓词下推与多线程并行扫描，不需要先读进 pandas）:
+    year_speeds  各年份4月每日平均车速   date, year, day, avg_speed, weather, t_max, t_min
+    weather      每日天气（中文天气类型） date, year, month, avg_speed, weather, t_max, t_min
+    links        道路属性               link_id, short_id, id_x, id_y, speed_limit, length, direction
+    link_speeds  道路×5分钟速度（长表，缺失时段不存）
+                 link_id, ts, date, hour, dow(1=周一 … 7=周日), speed
+    bus_metrics  公交运营指标（有公交数据时）
+                 day_type, total_vehicles, mean_vehicles, total_trips, mean_trips,
+                 mean_run_time, mean_route_length
+
+表文件由 pipeline.py 的 query_tables / bus_table 阶段生成到 .pipeline/db/。
+
+用法:
+    python cli.py query --named rainy_weekday_rush --param since=2018-04-16
+    python cli.py query "SELECT weather, avg(avg_speed) FROM weather GROUP BY 1"
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from speedmatrix import URBAN_CORE_START
+
+
+DB_DIR = os.path.join('.pipeline', 'db')
+RUSH_HOURS = (7, 8, 9, 17, 18, 19)
+
+TABLE_FILES = {
+    'year_speeds': 'year_speeds.parquet',
+    'weather': 'weather.parquet',
+    'links': 'links.parquet',
+    'link_speeds': 'link_speeds.parquet',
+    'bus_metrics': 'bus_metrics.parquet',
+}
+
+BUS_METRIC_COLUMNS = {
+    '日期类型': 'day_type',
+    '总运行车辆数': 'total_vehicles',
+    '平均运行车辆数': 'mean_vehicles',
+    '总运行次数': 'total_trips',
+    '平均运行次数': 'mean_trips',
+    '平均运行时间': 'mean_run_time',
+    '平均批准距离': 'mean_route_length',
+}
+
+# 常用查询；$name 为参数，通过 query(..., params={'name': ...}) 传入
+QUERIES = {
+    'weather_means': """
+        SELECT weather, count(*) AS days, avg(avg_speed) AS mean_speed, stddev_samp(avg_speed) AS std_speed
+        FROM weather WHERE weather IS NOT NULL
+        GROUP BY weather ORDER BY mean_speed DESC
+    """,
+    'link_stats': """
+        SELECT link_id, avg(speed) AS avg_speed, max(speed) AS max_speed, min(speed) AS min_speed,
+               stddev_pop(speed) AS std_speed, count(*) AS valid_count
+        FROM link_speeds GROUP BY link_id ORDER BY link_id
+    """,
+    'year_day_pivot': """
+        PIVOT (SELECT day, year, avg_speed FROM year_speeds)
+        ON year USING first(avg_speed) GROUP BY day ORDER BY day
+    """,
+    'rainy_weekday_rush': f"""
+        SELECT s.link_id, avg(s.speed) AS mean_speed, count(*) AS samples, count(DISTINCT s.date) AS days
+        FROM link_speeds s SEMI JOIN weather w ON s.date = w.date AND w.weather = '雨'
+        WHERE s.dow <= 5 AND s.hour IN {RUSH_HOURS} AND s.date >= CAST($since AS DATE)
+        GROUP BY s.link_id ORDER BY mean_speed
+    """,
+}
+# since 默认为 link_speeds 的起始日期，即不过滤
+QUERY_DEFAULTS = {'rainy_weekday_rush': {'since': URBAN_CORE_START[:10]}}
+
+
+def table_path(name, db_dir=DB_DIR):
+    return os.path.join(db_dir, TABLE_FILES[name])
+
+
+def _atomic_parquet(df, path):
+    tmp_path = path + '.tmp.parquet'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+# ---------------------------------------------------------------------------
+# 生成规范化的 Parquet 表
+# ---------------------------------------------------------------------------
+
+def write_year_speeds(years, path):
+    """years 为 plotlyscript.load_all_years_data 的结果"""
+    df = pd.DataFrame({
+        'date': pd.to_datetime(years['日期']).dt.date,
+        'year': years['年份'].astype('int32'),
+        'day': years['日'].astype('int32'),
+        'avg_speed': pd.to_numeric(years['平均车速(km/h)'], errors='coerce'),
+        'weather': years['天气'].astype('string'),
+        't_max': pd.to_numeric(years['最高温度'], errors='coerce'),
+        't_min': pd.to_numeric(years['最低温度'], errors='coerce'),
+    })
+    _atomic_parquet(df.sort_values('date'), path)
+
+
+def write_weather(weather_file, path):
+    raw = pd.read_excel(weather_file)
+    df = pd.DataFrame({
+        'date': pd.to_datetime(raw['日期']).dt.date,
+        'year': raw['年份'].astype('int32'),
+        'month': raw['月份'].astype('int32'),
+        'avg_speed': raw['平均速度'].astype(float),
+        'weather': raw['天气'].where(raw['天气'] != '无数据').astype('string'),
+        't_max': raw['最高温度'].astype(float),
+        't_min': raw['最低温度'].astype(float),
+    })
+    _atomic_parquet(df.sort_values('date'), path)
+
+
+def write_link_tables(links, speeds, links_path, speeds_path, start=URBAN_CORE_START, chunk_links=100):
+    """
+    道路属性表 + 速度长表。长表按 (link_id, ts) 排序、每 chunk_links 条道路一个 row group，
+    DuckDB 可以按 row group 的最小/最大值跳过不相关的道路和时间段；速度为0（缺失）的时段不写入。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    _atomic_parquet(links, links_path)
+
+    n_slots = speeds.shape[1]
+    times = pd.DatetimeIndex(pd.Timestamp(start) + pd.to_timedelta(np.arange(n_slots) * 5, unit='min'))
+    # 日期/小时/星期几直接存为列：查询时不必逐行从 ts 计算，过滤条件也能下推到扫描
+    slot_columns = {
+        'ts': times.values.astype('datetime64[us]'),
+        'date': times.normalize().values.astype('datetime64[D]'),
+        'hour': times.hour.to_numpy(dtype=np.int8),
+        'dow': (times.dayofweek + 1).to_numpy(dtype=np.int8),
+    }
+    link_ids = links['link_id'].to_numpy(dtype=np.int64)
+    schema = pa.schema([('link_id', pa.int64()), ('ts', pa.timestamp('us')), ('date', pa.date32()),
+                        ('hour', pa.int8()), ('dow', pa.int8()), ('speed', pa.float32())])
+
+    tmp_path = speeds_path + '.tmp.parquet'
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for start_row in range(0, len(link_ids), chunk_links):
+            block = np.asarray(speeds[start_row:start_row + chunk_links], dtype=np.float32)
+            rows, cols = np.nonzero(block > 0)
+            columns = {'link_id': link_ids[start_row + rows]}
+            columns.update((name, values[cols]) for name, values in slot_columns.items())
+            columns['speed'] = block[rows, cols]
+            table = pa.table(columns, schema=schema)
+            writer.write_table(table)
+    os.replace(tmp_path, speeds_path)
+
+
+def write_bus_metrics(bus_metrics, path):
+    """bus_metrics 为 相关性分析.load_bus_metrics 的结果"""
+    _atomic_parquet(bus_metrics.rename(columns=BUS_METRIC_COLUMNS), path)
+
+
+# ---------------------------------------------------------------------------
+# 查询
+# ---------------------------------------------------------------------------
+
+def connect(db_dir=DB_DIR, threads=None):
+    """打开内存中的 DuckDB 连接，并为已生成的 Parquet 表创建视图"""
+    import duckdb
+
+    con = duckdb.connect(':memory:')
+    con.execute("SET enable_progress_bar = false")
+    if threads:
+        con.execute(f"SET threads TO {int(threads)}")
+    for name in TABLE_FILES:
+        path = table_path(name, db_dir)
+        if not os.path.exists(path):
+            continue
+        source = path.replace("'", "''")
+        con.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{source}')")
+    return con
+
+
+def available_tables(con):
+    return [row[0] for row in con.execute("SELECT view_name FROM duckdb_views() WHERE NOT internal").fetchall()]
+
+
+def query(sql, params=None, con=None, db_dir=DB_DIR):
+    """执行SQL（或 QUERIES 中的查询名），返回 DataFrame"""
+    if con is None:
+        con = connect(db_dir)
+    if sql in QUERIES:
+        params = dict(QUERY_DEFAULTS.get(sql, {}), **(params or {}))
+        sql = QUERIES[sql]
+    return con.execute(sql, params or None).df()
+
+
+if __name__ == "__main__":
+    # 生成（或刷新）查询表
+    from pipeline import run_pipeline
+    run_pipeline(['query_tables'])
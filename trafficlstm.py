@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+LSTM交通速度模型：时间序列特征、模型结构与训练子系统
+
+训练循环:
+- 周期检查点(last.pt)与最优模型检查点(best.pt)，包含模型、优化器和
+  ReduceLROnPlateau 的状态，内核崩溃或中断后可从检查点继续训练
+- 检查点记录数据与配置的指纹 (checkpoint_fingerprint)，只有指纹相同时才续训，
+  换了数据或模型结构时从头训练
+- 损失在设备上累加，每个epoch只同步一次，避免每个batch调用 loss.item()
+- 记录每个epoch的耗时与吞吐量(samples/s)
+"""
+
+import copy
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from memo import memoize
+
+
+LAST_CHECKPOINT = 'last.pt'
+BEST_CHECKPOINT = 'best.pt'
+
+# Select final features (excluding meteorological factors)
+FEATURE_COLUMNS = [
+    'DayOfYear_sin', 'DayOfYear_cos', 'DayOfWeek_sin', 'DayOfWeek_cos',
+    'Speed_Lag_1', 'Speed_Lag_2', 'Speed_Lag_3', 'Speed_Lag_7', 'Speed_Lag_14',
+    'Speed_Rolling_Mean_7', 'Speed_Rolling_Std_7',
+    'IsWeekend'
+]
+TARGET_COLUMN = '平均速度'
+
+
+def create_time_series_features(df):
+    """Create comprehensive time series features"""
+    df_engineered = df.copy()
+
+    # Basic time features
+    df_engineered['DayOfYear'] = df_engineered['Date'].dt.dayofyear
+    df_engineered['DayOfWeek'] = df_engineered['Date'].dt.dayofweek
+    df_engineered['WeekOfYear'] = df_engineered['Date'].dt.isocalendar().week
+    df_engineered['IsWeekend'] = (df_engineered['Date'].dt.dayofweek >= 5).astype(int)
+
+    # Lag features
+    for lag in [1, 2, 3, 7, 14]:
+        df_engineered[f'Speed_Lag_{lag}'] = df_engineered[TARGET_COLUMN].shift(lag)
+
+    # Rolling statistics
+    for window in [7, 14]:
+        df_engineered[f'Speed_Rolling_Mean_{window}'] = df_engineered[TARGET_COLUMN].rolling(window=window).mean()
+        df_engineered[f'Speed_Rolling_Std_{window}'] = df_engineered[TARGET_COLUMN].rolling(window=window).std()
+
+    # Seasonal features (sine/cosine encoding)
+    df_engineered['DayOfYear_sin'] = np.sin(2 * np.pi * df_engineered['DayOfYear']/365)
+    df_engineered['DayOfYear_cos'] = np.cos(2 * np.pi * df_engineered['DayOfYear']/365)
+    df_engineered['DayOfWeek_sin'] = np.sin(2 * np.pi * df_engineered['DayOfWeek']/7)
+    df_engineered['DayOfWeek_cos'] = np.cos(2 * np.pi * df_engineered['DayOfWeek']/7)
+
+    return df_engineered
+
+
+def create_sequences(features, targets, sequence_length=14):
+    """Create sequences for LSTM training"""
+    X, y = [], []
+    for i in range(len(features) - sequence_length):
+        X.append(features[i:(i + sequence_length)])
+        y.append(targets[i + sequence_length])
+    return np.array(X), np.array(y)
+
+
+class TrafficLSTM(nn.Module):
+    def __init__(self, input_size, hidden_size, num_layers, output_size, dropout_rate=0.3):
+        super(TrafficLSTM, self).__init__()
+        self.hidden_size = hidden_size
+        self.num_layers = num_layers
+
+        self.lstm = nn.LSTM(input_size, hidden_size, num_layers,
+                           batch_first=True, dropout=dropout_rate if num_layers > 1 else 0)
+        self.dropout = nn.Dropout(dropout_rate)
+        self.fc1 = nn.Linear(hidden_size, hidden_size // 2)
+        self.fc2 = nn.Linear(hidden_size // 2, output_size)
+        self.relu = nn.ReLU()
+
+    def forward(self, x):
+        # Initialize hidden state
+        h0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size, device=x.device)
+        c0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size, device=x.device)
+
+        # LSTM forward
+        out, _ = self.lstm(x, (h0, c0))
+
+        # Use only the last output
+        out = out[:, -1, :]
+        out = self.dropout(out)
+        out = self.relu(self.fc1(out))
+        out = self.fc2(out)
+
+        return out
+
+
+# 数据与配置的指纹：续训前核对，避免在新数据或新结构上沿用旧的检查点
+def checkpoint_fingerprint(*arrays, **config):
+    digest = hashlib.sha1()
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode('utf-8'))
+    for array in arrays:
+        array = np.ascontiguousarray(array.numpy() if isinstance(array, torch.Tensor) else array)
+        digest.update(f'{array.shape}:{array.dtype.str}'.encode('utf-8'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _training_state(model, optimizer, scheduler=None):
+    return {
+        'model': model.state_dict(),
+        'optimizer': optimizer.state_dict(),
+        'scheduler': scheduler.state_dict() if scheduler is not None else None,
+    }
+
+
+def _write_checkpoint(path, payload):
+    tmp_path = path + '.tmp'
+    torch.save(payload, tmp_path)
+    os.replace(tmp_path, path)
+
+
+# 保存检查点
+def save_checkpoint(path, model, optimizer, scheduler=None, **state):
+    """先写临时文件再原子替换，训练中断时不会留下损坏的检查点"""
+    payload = _training_state(model, optimizer, scheduler)
+    payload.update(state)
+
+    _write_checkpoint(path, payload)
+
+
+# 读取检查点
+def load_checkpoint(path, model, optimizer=None, scheduler=None, map_location='cpu'):
+    """把检查点中的状态恢复到模型/优化器/调度器，返回完整的检查点字典"""
+    checkpoint = torch.load(path, map_location=map_location)
+    model.load_state_dict(checkpoint['model'])
+    if optimizer is not None and checkpoint.get('optimizer') is not None:
+        optimizer.load_state_dict(checkpoint['optimizer'])
+    if scheduler is not None and checkpoint.get('scheduler') is not None:
+        scheduler.load_state_dict(checkpoint['scheduler'])
+    return checkpoint
+
+
+# 加载验证集上最优的模型参数
+def load_best_model(model, checkpoint_dir='checkpoints', map_location='cpu'):
+    path = os.path.join(checkpoint_dir, BEST_CHECKPOINT)
+    checkpoint = load_checkpoint(path, model, map_location=map_location)
+    return checkpoint['epoch'], checkpoint['best_val_loss']
+
+
+def _empty_history():
+    return {'train_loss': [], 'val_loss': [], 'lr': [], 'epoch_time': [], 'samples_per_sec': []}
+
+
+# 训练模型（支持断点续训与早停）
+def train_model(model, train_loader, val_loader, criterion, optimizer, epochs=100,
+                scheduler=None, patience=20, checkpoint_dir='checkpoints',
+                checkpoint_every=5, resume=True, device=None, log_every=20, fingerprint=None):
+    """
+    训练LSTM并返回训练历史 history（字典，键为 train_loss / val_loss / lr /
+    epoch_time / samples_per_sec，每个epoch一项）
+
+    checkpoint_dir 下维护两个检查点:
+      - last.pt: 每 checkpoint_every 个epoch、早停和中断(KeyboardInterrupt)时写入
+      - best.pt: 验证损失创新低时写入
+    resume=True 时如果存在 last.pt 且其中的 fingerprint 与本次相同，则从记录的epoch继续训练；
+    fingerprint 不同（数据、特征或模型配置变了）时忽略旧检查点，从头训练。resume=True 时必须
+    传入 fingerprint（见 checkpoint_fingerprint）
+    """
+    if resume and fingerprint is None:
+        raise ValueError("resume=True 时需要传入 fingerprint=checkpoint_fingerprint(...)，否则无法判断检查点是否过期")
+    if device is None:
+        device = next(model.parameters()).device
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    last_path = os.path.join(checkpoint_dir, LAST_CHECKPOINT)
+    best_path = os.path.join(checkpoint_dir, BEST_CHECKPOINT)
+
+    history = _empty_history()
+    start_epoch = 0
+    best_val_loss = float('inf')
+    patience_counter = 0
+
+    checkpoint = torch.load(last_path, map_location=device) if resume and os.path.exists(last_path) else None
+    if checkpoint is not None and checkpoint.get('fingerprint') != fingerprint:
+        print(f"检查点 {last_path} 对应的数据或配置已改变，从头训练")
+        checkpoint = None
+    if checkpoint is None and os.path.exists(best_path):
+        os.remove(best_path)  # 从头训练时旧的最优模型不再对应当前数据
+    if checkpoint is not None:
+        model.load_state_dict(checkpoint['model'])
+        optimizer.load_state_dict(checkpoint['optimizer'])
+        if scheduler is not None and checkpoint.get('scheduler') is not None:
+            scheduler.load_state_dict(checkpoint['scheduler'])
+        history = checkpoint['history']
+        start_epoch = checkpoint['epoch']
+        best_val_loss = checkpoint['best_val_loss']
+        patience_counter = checkpoint['patience_counter']
+        print(f"从检查点恢复训练: 已完成 {start_epoch} 个epoch, 最优验证损失 {best_val_loss:.4f}")
+        if checkpoint.get('stopped'):
+            print("该检查点对应的训练已经早停，跳过训练")
+            return history
+
+    def checkpoint_state(epoch, stopped=False):
+        return dict(epoch=epoch, best_val_loss=best_val_loss, patience_counter=patience_counter,
+                    history=history, stopped=stopped, fingerprint=fingerprint)
+
+    # 最后一个完整epoch结束时的状态（在内存中），中断时写入它而不是 epoch 中途的参数
+    completed_state = None
+
+    try:
+        for epoch in range(start_epoch, epochs):
+            epoch_start = time.perf_counter()
+
+            # Training
+            model.train()
+            train_loss_sum = torch.zeros((), device=device)
+            n_samples = 0
+            for batch_X, batch_y in train_loader:
+                batch_X = batch_X.to(device, non_blocking=True)
+                batch_y = batch_y.to(device, non_blocking=True)
+                optimizer.zero_grad()
+                outputs = model(batch_X)
+                loss = criterion(outputs, batch_y)
+                loss.backward()
+                optimizer.step()
+                # 在设备上累加，不触发同步
+                train_loss_sum += loss.detach()
+                n_samples += batch_X.size(0)
+
+            # Validation
+            model.eval()
+            val_loss_sum = torch.zeros((), device=device)
+            with torch.no_grad():
+                for batch_X, batch_y in val_loader:
+                    batch_X = batch_X.to(device, non_blocking=True)
+                    batch_y = batch_y.to(device, non_blocking=True)
+                    outputs = model(batch_X)
+                    val_loss_sum += criterion(outputs, batch_y)
+
+            # 每个epoch只同步一次
+            train_loss, val_loss = torch.stack([
+                train_loss_sum / max(len(train_loader), 1),
+                val_loss_sum / max(len(val_loader), 1),
+            ]).tolist()
+            epoch_time = time.perf_counter() - epoch_start
+
+            history['train_loss'].append(train_loss)
+            history['val_loss'].append(val_loss)
+            history['lr'].append(optimizer.param_groups[0]['lr'])
+            history['epoch_time'].append(epoch_time)
+            history['samples_per_sec'].append(n_samples / epoch_time if epoch_time > 0 else 0.0)
+
+            # Learning rate scheduling
+            if scheduler is not None:
+                scheduler.step(val_loss)
+
+            # Early stopping
+            if val_loss < best_val_loss:
+                best_val_loss = val_loss
+                patience_counter = 0
+                save_checkpoint(best_path, model, optimizer, scheduler, **checkpoint_state(epoch + 1))
+            else:
+                patience_counter += 1
+
+            if patience_counter >= patience:
+                print(f"Early stopping at epoch {epoch+1}")
+                save_checkpoint(last_path, model, optimizer, scheduler, **checkpoint_state(epoch + 1, stopped=True))
+                return history
+
+            if (epoch + 1) % checkpoint_every == 0:
+                save_checkpoint(last_path, model, optimizer, scheduler, **checkpoint_state(epoch + 1))
+
+            completed_state = copy.deepcopy({**_training_state(model, optimizer, scheduler),
+                                             **checkpoint_state(epoch + 1)})
+
+            if (epoch + 1) % log_every == 0:
+                print(f'Epoch [{epoch+1}/{epochs}], Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f}, '
+                      f'{epoch_time:.2f}s/epoch, {history["samples_per_sec"][-1]:.0f} samples/s')
+    except KeyboardInterrupt:
+        # 中断时保存最后一个完整epoch的进度，下次调用可以继续；本次还没有完成任何epoch时保留原检查点
+        if completed_state is not None:
+            _write_checkpoint(last_path, completed_state)
+            print(f"训练被中断，进度已保存到 {last_path} (已完成 {completed_state['epoch']} 个epoch)")
+        raise
+
+    save_checkpoint(last_path, model, optimizer, scheduler, **checkpoint_state(epochs))
+    return history
+
+
+# 训练（或从检查点继续）并在测试集上预测，流程与 时间序列（无气象）.ipynb 一致；
+# 数据和超参数都相同时直接返回缓存的预测结果
+@memoize(ignore=('checkpoint_dir',))
+def forecast_speed(df, epochs=150, sequence_length=14, batch_size=32, hidden_size=64, num_layers=2,
+                   dropout_rate=0.3, lr=0.001, checkpoint_dir='checkpoints/lstm_no_weather', seed=42):
+    """
+    df 需包含 Date 与 平均速度 列；按 70%/15%/15% 顺序切分训练/验证/测试集。
+    返回 (测试集预测 DataFrame[Date, actual, predicted], 指标字典 mse/mae/rmse/r2)
+    """
+    import pandas as pd
+    from sklearn.preprocessing import StandardScaler
+    from torch.utils.data import DataLoader, TensorDataset
+
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+
+    df_clean = create_time_series_features(df).dropna()
+    scaler_X = StandardScaler()
+    scaler_y = StandardScaler()
+    X_scaled = scaler_X.fit_transform(df_clean[FEATURE_COLUMNS])
+    y_scaled = scaler_y.fit_transform(df_clean[[TARGET_COLUMN]])
+    X_sequences, y_sequences = create_sequences(X_scaled, y_scaled, sequence_length)
+    X_sequences = torch.FloatTensor(X_sequences)
+    y_sequences = torch.FloatTensor(y_sequences)
+
+    train_size = int(0.7 * len(X_sequences))
+    val_size = int(0.15 * len(X_sequences))
+    test_start = train_size + val_size
+    train_loader = DataLoader(TensorDataset(X_sequences[:train_size], y_sequences[:train_size]),
+                              batch_size=batch_size, shuffle=True)
+    val_loader = DataLoader(TensorDataset(X_sequences[train_size:test_start], y_sequences[train_size:test_start]),
+                            batch_size=batch_size, shuffle=False)
+
+    model = TrafficLSTM(len(FEATURE_COLUMNS), hidden_size, num_layers, 1, dropout_rate)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr, weight_decay=1e-5)
+    scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(optimizer, patience=10, factor=0.5)
+    fingerprint = checkpoint_fingerprint(
+        X_sequences, y_sequences, features=FEATURE_COLUMNS, sequence_length=sequence_length, batch_size=batch_size,
+        hidden_size=hidden_size, num_layers=num_layers, dropout_rate=dropout_rate, lr=lr, seed=seed)
+    train_model(model, train_loader, val_loader, nn.MSELoss(), optimizer, epochs=epochs,
+                scheduler=scheduler, patience=20, checkpoint_dir=checkpoint_dir, fingerprint=fingerprint)
+    load_best_model(model, checkpoint_dir)
+
+    model.eval()
+    with torch.no_grad():
+        predictions = model(X_sequences[test_start:]).numpy()
+    predictions = scaler_y.inverse_transform(predictions.reshape(-1, 1)).ravel()
+    actuals = scaler_y.inverse_transform(y_sequences[test_start:].numpy().reshape(-1, 1)).ravel()
+
+    # 第 i 个序列的目标是 df_clean 中第 i + sequence_length 行
+    dates = df_clean['Date'].iloc[test_start + sequence_length:].to_numpy()
+    residual = actuals - predictions
+    mse = float(np.mean(residual ** 2))
+    total = np.sum((actuals - actuals.mean()) ** 2)
+    metrics = {
+        'mse': mse,
+        'mae': float(np.mean(np.abs(residual))),
+        'rmse': float(np.sqrt(mse)),
+        'r2': float(1 - np.sum(residual ** 2) / total) if total > 0 else float('nan'),
+    }
+    return pd.DataFrame({'Date': dates, 'actual': actuals, 'predicted': predictions}), metrics
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+weathercor.ipynb 的分析步骤：拥堵等级、按天气的描述统计、方差分析、相关性、线性回归与随机森林
+
+notebook 只保留绘图，计算都在这里，可以在脚本和批处理中直接调用。读取 Excel 和模型拟合
+使用 memo 的磁盘缓存，数据和参数不变时重复分析直接读取上次的结果。
+
+用法:
+    python weatheranalysis.py            # 输出与 notebook 相同的汇总报告（不画图）
+    from weatheranalysis import load_weather_speeds, fit_random_forest
+"""
+
+import numpy as np
+import pandas as pd
+
+from memo import memoize
+
+
+DATA_FILE = '首尔市区4月份交通天气数据_2017-2025.xlsx'
+NO_DATA = '无数据'
+
+
+@memoize(files=('file_path',))
+def load_weather_speeds(file_path=DATA_FILE):
+    """读取每日天气与全市平均速度表（原始列名，按读取顺序，与 notebook 一致）"""
+    df = pd.read_excel(file_path)
+    df['日期'] = pd.to_datetime(df['日期'])
+    return df
+
+
+# 拥堵等级：>23 为 High Speed，20-23 为 Medium，<20 为 Congested
+def get_congestion_level(speed):
+    if speed > 23:
+        return 'High Speed'
+    elif speed >= 20:
+        return 'Medium'
+    else:
+        return 'Congested'
+
+
+def congestion_levels(speeds):
+    """get_congestion_level 的向量化版本"""
+    speeds = np.asarray(speeds, dtype=float)
+    return np.select([speeds > 23, speeds >= 20], ['High Speed', 'Medium'], 'Congested')
+
+
+def add_congestion_columns(df):
+    df = df.copy()
+    df['Congestion Level'] = congestion_levels(df['平均速度'])
+    df['Congestion Degree'] = 1 / df['平均速度']  # 拥堵程度与速度成反比
+    return df
+
+
+# 描述性统计
+def weather_speed_stats(df):
+    return df.groupby('天气')['平均速度'].agg(['mean', 'std', 'count', 'min', 'max'])
+
+
+def congestion_speed_stats(df):
+    return df.groupby('Congestion Level')['平均速度'].describe()
+
+
+def weather_congestion_crosstab(df):
+    """各天气类型下拥堵等级的占比 (%)"""
+    return pd.crosstab(df['天气'], df['Congestion Level'], normalize='index') * 100
+
+
+def yearly_speed(df):
+    return df.groupby('年份')['平均速度'].agg(['mean', 'std']).round(3)
+
+
+# 统计检验
+def anova_by_weather(df):
+    """各天气类型平均速度的单因素方差分析，返回 (F, p)；有效组不足两个时为 (nan, nan)"""
+    from scipy.stats import f_oneway
+
+    groups = [group.dropna() for weather, group in df.groupby('天气')['平均速度'] if weather != NO_DATA]
+    groups = [group for group in groups if len(group) > 0]
+    if len(groups) < 2:
+        return float('nan'), float('nan')
+    f_stat, p_value = f_oneway(*groups)
+    return float(f_stat), float(p_value)
+
+
+def correlations(df):
+    """返回 (Spearman 相关系数（含天气编码）, Pearson 相关系数（数值变量）)"""
+    encoded = df.copy()
+    # 与 LabelEncoder 相同：按类型名排序后的序号
+    encoded['Weather Code'] = pd.Categorical(encoded['天气'].astype(str)).codes
+    spearman = encoded[['平均速度', 'Weather Code', '最高温度', '最低温度']].corr(method='spearman')
+    pearson = encoded[['平均速度', '最高温度', '最低温度']].corr(method='pearson')
+    return spearman, pearson
+
+
+# 回归
+def regression_frame(df):
+    """排除无数据、天气独热编码、去掉缺失值后的 (X, y)"""
+    regression_df = df[df['天气'] != NO_DATA].copy()
+    weather_dummies = pd.get_dummies(regression_df['天气'], prefix='Weather')
+    regression_df = pd.concat([regression_df, weather_dummies], axis=1)
+
+    X = regression_df[['最高温度', '最低温度'] + list(weather_dummies.columns)]
+    y = regression_df['平均速度']
+    valid_mask = X.notna().all(axis=1) & y.notna()
+    return X[valid_mask].astype(float), y[valid_mask]
+
+
+@memoize()
+def fit_linear_regression(df):
+    """全样本多元线性回归，返回 dict: model, r2, mse, intercept, coefficients (Series)"""
+    from sklearn.linear_model import LinearRegression
+    from sklearn.metrics import mean_squared_error, r2_score
+
+    X, y = regression_frame(df)
+    model = LinearRegression().fit(X, y)
+    y_pred = model.predict(X)
+    return {'model': model, 'r2': r2_score(y, y_pred), 'mse': mean_squared_error(y, y_pred),
+            'intercept': model.intercept_, 'coefficients': pd.Series(model.coef_, index=X.columns)}
+
+
+@memoize(ignore=('n_jobs',))
+def fit_random_forest(df, n_estimators=100, test_size=0.2, random_state=42, n_jobs=None):
+    """80/20 划分训练随机森林，返回 dict: model, r2, mse (测试集), feature_importance (DataFrame)"""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import mean_squared_error, r2_score
+    from sklearn.model_selection import train_test_split
+
+    X, y = regression_frame(df)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state, n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    importance = pd.DataFrame({'feature': X.columns, 'importance': model.feature_importances_})
+    return {'model': model, 'r2': r2_score(y_test, y_pred), 'mse': mean_squared_error(y_test, y_pred),
+            'feature_importance': importance.sort_values('importance', ascending=False, ignore_index=True)}
+
+
+def summary_report(df, linear=None, forest=None):
+    """notebook 最后的汇总报告"""
+    linear = linear or fit_linear_regression(df)
+    forest = forest or fit_random_forest(df)
+    means = df.groupby('天气')['平均速度'].mean()
+    congested = int((df['Congestion Level'] == 'Congested').sum())
+    lines = [
+        "=" * 50,
+        "ANALYSIS SUMMARY REPORT",
+        "=" * 50,
+        f"1. Total data points: {len(df)} days",
+        f"2. Congested days (<20 km/h): {congested} days ({congested / len(df) * 100:.1f}%)",
+        f"3. Number of weather types: {len(df['天气'].unique())}",
+        f"4. Most congested weather: {means.idxmin()} ({means.min():.2f} km/h)",
+        f"5. Least congested weather: {means.idxmax()} ({means.max():.2f} km/h)",
+        f"6. Linear regression R²: {linear['r2']:.4f}",
+        f"7. Random forest prediction R²: {forest['r2']:.4f}",
+        "=" * 50,
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    df = add_congestion_columns(load_weather_speeds())
+    print("Descriptive Statistics by Weather Type:")
+    print(weather_speed_stats(df))
+    f_stat, p_value = anova_by_weather(df)
+    print(f"\nANOVA: F = {f_stat:.4f}, p = {p_value:.4f}")
+    spearman, _ = correlations(df)
+    print("\nSpearman Correlation Coefficients:")
+    print(spearman.round(4))
+    forest = fit_random_forest(df)
+    print("\nFeature Importance Ranking:")
+    print(forest['feature_importance'])
+    print()
+    print(summary_report(df, forest=forest))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+批量最小二乘：所有道路的日均车速同时对天气做回归
+
+weathercor.ipynb 只对全市日均车速拟合一次 LinearRegression。这里所有道路共用同一个
+设计矩阵（截距、天气类型 one-hot、最高/最低温度、星期几 one-hot），把道路×日期的
+日均车速矩阵作为多列响应，一次 QR 分解同时求出每条道路的系数、标准误、t 值和 p 值。
+
+- 天气以出现最多的类型（通常为"晴"）为基准，星期以周一为基准，避免与截距共线
+- 某些日期没有数据的道路，按缺失模式分组，同一模式的道路仍共用一次 QR
+- 有效天数不足以估计全部系数的道路，结果为 NaN
+
+用法:
+    python weatherreg.py                  # 全市日均车速回归（与 notebook 同一数据，带标准误）
+    python pipeline.py weather_regression # 每条道路的回归系数 -> .pipeline/
+"""
+
+import numpy as np
+import pandas as pd
+
+from memo import memoize
+from speedmatrix import SLOTS_PER_DAY, URBAN_CORE_START
+
+
+WEATHER_FILE = '首尔市区4月份交通天气数据_2017-2025.xlsx'
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+MIN_DAY_COVERAGE = 0.5      # 一天中有效时段比例低于此值时，当天日均车速记为缺失
+
+
+@memoize(files=('weather_file',))
+def load_daily_weather(weather_file=WEATHER_FILE):
+    """读取每日天气表：date, weather, t_max, t_min, avg_speed（无数据的天气记为缺失）"""
+    raw = pd.read_excel(weather_file)
+    return pd.DataFrame({
+        'date': pd.to_datetime(raw['日期']),
+        'weather': raw['天气'].where(raw['天气'] != '无数据'),
+        't_max': pd.to_numeric(raw['最高温度'], errors='coerce'),
+        't_min': pd.to_numeric(raw['最低温度'], errors='coerce'),
+        'avg_speed': pd.to_numeric(raw['平均速度'], errors='coerce'),
+    }).sort_values('date').reset_index(drop=True)
+
+
+def design_matrix(days, reference=None, weekday=True):
+    """
+    由每日天气构造设计矩阵，返回 (X, 列名)；days 需要 date, weather, t_max, t_min 列且没有缺失。
+    天气类型中 reference（默认为出现最多的类型）作为基准不单独成列
+    """
+    weather = days['weather'].astype(str)
+    levels = weather.value_counts()
+    if reference is None:
+        reference = levels.index[0]
+    levels = sorted(level for level in levels.index if level != reference)
+
+    columns = {'截距': np.ones(len(days))}
+    for level in levels:
+        columns[f'天气_{level}'] = (weather == level).to_numpy(dtype=float)
+    columns['最高温度'] = days['t_max'].to_numpy(dtype=float)
+    columns['最低温度'] = days['t_min'].to_numpy(dtype=float)
+    if weekday:
+        dow = pd.DatetimeIndex(days['date']).dayofweek
+        for i, name in enumerate(WEEKDAY_NAMES[1:], start=1):
+            columns[name] = (dow == i).astype(float)
+    return np.column_stack(list(columns.values())), list(columns)
+
+
+def daily_link_speeds(speeds, valid=None, start=URBAN_CORE_START, min_coverage=MIN_DAY_COVERAGE,
+                      chunk_links=2000):
+    """
+    道路×5分钟速度矩阵 -> (日期, 道路×日期的日均车速矩阵)。只对 valid（默认为速度>0）的时段
+    求平均，有效时段比例低于 min_coverage 的日期为 NaN；不足一天的尾部时段不计入
+    """
+    n_links, n_slots = speeds.shape
+    n_days = n_slots // SLOTS_PER_DAY
+    width = n_days * SLOTS_PER_DAY
+    daily = np.full((n_links, n_days), np.nan)
+
+    for row in range(0, n_links, chunk_links):
+        block = np.asarray(speeds[row:row + chunk_links, :width], dtype=np.float64)
+        mask = block > 0 if valid is None else np.asarray(valid[row:row + chunk_links, :width])
+        block = np.where(mask, block, 0).reshape(len(block), n_days, SLOTS_PER_DAY)
+        mask = mask.reshape(len(block), n_days, SLOTS_PER_DAY)
+        count = mask.sum(axis=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = block.sum(axis=2) / count
+        daily[row:row + len(block)] = np.where(count >= min_coverage * SLOTS_PER_DAY, mean, np.nan)
+
+    dates = pd.date_range(pd.Timestamp(start).normalize(), periods=n_days, freq='D')
+    return dates, daily
+
+
+def _solve(X, Y):
+    """
+    一次 QR 分解求解 X @ B = Y 的所有列。X: (n, p), Y: (n, k)
+    返回 (系数 (k, p), 标准误 (k, p), 残差平方和 (k,))；X 不满秩或自由度不足时全部为 NaN
+    """
+    n, p = X.shape
+    k = Y.shape[1]
+    if n <= p:
+        return np.full((k, p), np.nan), np.full((k, p), np.nan), np.full(k, np.nan)
+    Q, R = np.linalg.qr(X)
+    diag = np.abs(np.diag(R))
+    if diag.min() <= 1e-10 * diag.max():
+        return np.full((k, p), np.nan), np.full((k, p), np.nan), np.full(k, np.nan)
+
+    from scipy.linalg import solve_triangular
+    beta = solve_triangular(R, Q.T @ Y)
+    rss = ((Y - X @ beta) ** 2).sum(axis=0)
+    # (XᵀX)⁻¹ = R⁻¹ R⁻ᵀ，只需要对角线
+    R_inv = solve_triangular(R, np.eye(p))
+    xtx_diag = (R_inv ** 2).sum(axis=1)
+    sigma2 = rss / (n - p)
+    se = np.sqrt(sigma2[:, None] * xtx_diag[None, :])
+    return beta.T, se, rss
+
+
+def batched_ols(X, Y):
+    """
+    X: (天数, p) 共用的设计矩阵; Y: (道路数, 天数) 响应矩阵，NaN 表示缺失。
+    返回 dict: coef/se/t/p_value 为 (道路数, p)，n_obs/r2/rmse 为 (道路数,)
+    """
+    from scipy import stats
+
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    n_links, p = Y.shape[0], X.shape[1]
+    coef = np.full((n_links, p), np.nan)
+    se = np.full((n_links, p), np.nan)
+    rss = np.full(n_links, np.nan)
+
+    observed = ~np.isnan(Y)
+    n_obs = observed.sum(axis=1)
+    # 缺失模式相同的道路共用一次分解；没有缺失时只有一组
+    patterns, group = np.unique(observed, axis=0, return_inverse=True)
+    group = group.ravel()
+    for g, pattern in enumerate(patterns):
+        rows = np.flatnonzero(group == g)
+        Xg = X[pattern]
+        # 该模式下没有出现的天气/星期列全为0，去掉后再求解，对应系数为 NaN
+        keep = np.flatnonzero(np.abs(Xg).sum(axis=0) > 0)
+        b, s, r = _solve(Xg[:, keep], Y[np.ix_(rows, np.flatnonzero(pattern))].T)
+        coef[np.ix_(rows, keep)] = b
+        se[np.ix_(rows, keep)] = s
+        rss[rows] = r
+
+    n_params = np.isfinite(coef).sum(axis=1)
+    dof = np.maximum(n_obs - n_params, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = coef / se
+        y_mean = np.nanmean(np.where(observed, Y, np.nan), axis=1)
+        tss = np.nansum((Y - y_mean[:, None]) ** 2, axis=1)
+        r2 = 1 - rss / tss
+        rmse = np.sqrt(rss / n_obs)
+    p_value = 2 * stats.t.sf(np.abs(t), dof[:, None])
+    return {'coef': coef, 'se': se, 't': t, 'p_value': p_value, 'n_obs': n_obs, 'r2': r2, 'rmse': rmse}
+
+
+def coefficient_table(link_ids, names, result):
+    """批量回归结果 -> 长表: link_id, term, coef, se, t, p_value"""
+    n_links, p = result['coef'].shape
+    return pd.DataFrame({
+        'link_id': np.repeat(np.asarray(link_ids), p),
+        'term': np.tile(names, n_links),
+        'coef': result['coef'].ravel(),
+        'se': result['se'].ravel(),
+        't': result['t'].ravel(),
+        'p_value': result['p_value'].ravel(),
+    })
+
+
+def fit_table(link_ids, result):
+    return pd.DataFrame({'link_id': np.asarray(link_ids), 'n_days': result['n_obs'],
+                         'r2': result['r2'], 'rmse': result['rmse']})
+
+
+def link_weather_regression(links, speeds, weather, valid=None, start=URBAN_CORE_START, weekday=True):
+    """
+    所有道路日均车速对天气的批量回归，返回 (系数长表, 拟合优度表)
+    weather 为 load_daily_weather 的结果；没有天气记录的日期不参与回归
+    """
+    dates, daily = daily_link_speeds(speeds, valid, start)
+    days = pd.DataFrame({'date': dates}).merge(weather, on='date', how='left')
+    usable = days[['weather', 't_max', 't_min']].notna().all(axis=1).to_numpy()
+    if not usable.any():
+        raise ValueError(f"速度矩阵的日期 ({dates[0].date()} ~ {dates[-1].date()}) 没有对应的天气记录")
+
+    X, names = design_matrix(days[usable], weekday=weekday)
+    result = batched_ols(X, daily[:, usable])
+    link_ids = links['link_id'].to_numpy()
+    return coefficient_table(link_ids, names, result), fit_table(link_ids, result)
+
+
+def citywide_regression(weather, weekday=False):
+    """全市日均车速对天气的回归（notebook 中的模型），返回系数表"""
+    days = weather.dropna(subset=['weather', 't_max', 't_min', 'avg_speed'])
+    X, names = design_matrix(days, weekday=weekday)
+    result = batched_ols(X, days['avg_speed'].to_numpy()[None, :])
+    table = coefficient_table(['全市'], names, result).drop(columns='link_id')
+    return table, result
+
+
+if __name__ == "__main__":
+    weather = load_daily_weather()
+    table, result = citywide_regression(weather)
+    print(f"全市日均车速回归: {result['n_obs'][0]} 天, R² = {result['r2'][0]:.4f}, RMSE = {result['rmse'][0]:.4f}")
+    print(table.to_string(index=False, float_format=lambda v: f'{v:.4f}'))
@@ -5,24 +5,21 @@ Created on Sun Oct 12 15:07:52 2025
 @author: 31335
 """
 
+import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy import stats
 import warnings
+from instrument import span, traced
 warnings.filterwarnings('ignore')
 
 plt.rcParams['font.sans-serif'] = ['SimHei']  # 用来正常显示中文标签
 plt.rcParams['axes.unicode_minus'] = False  # 用来正常显示负号
 
-# 读取第一个文件 - 车速数据
-speed_data = pd.read_excel('2018-4-全天.xls', sheet_name='차량통행속도')
-
-# 读取第二个文件 - 公共交通数据
-bus_weekday = pd.read_excel('2018-4公共交通.xls', sheet_name='평일 공동배차 미반영')
-bus_saturday = pd.read_excel('2018-4公共交通.xls', sheet_name='토요일')
-bus_holiday = pd.read_excel('2018-4公共交通.xls', sheet_name='공휴일')
+SPEED_FILE = '2018-4-全天.xls'
+BUS_FILE = '2018-4公共交通.xls'
 
 # 数据预处理
 def preprocess_bus_data(df):
@@ -55,11 +52,6 @@ def preprocess_bus_data(df):
     
     return df_processed
 
-# 预处理各类型公交数据
-bus_weekday_processed = preprocess_bus_data(bus_weekday)
-bus_saturday_processed = preprocess_bus_data(bus_saturday)
-bus_holiday_processed = preprocess_bus_data(bus_holiday)
-
 # 计算各类型的汇总指标
 def calculate_bus_metrics(df, day_type):
     """计算公交运营指标"""
@@ -74,294 +66,333 @@ def calculate_bus_metrics(df, day_type):
     }
     return metrics
 
-# 计算各类型指标
-bus_metrics = []
-bus_metrics.append(calculate_bus_metrics(bus_weekday_processed, '平日'))
-bus_metrics.append(calculate_bus_metrics(bus_saturday_processed, '周六'))
-bus_metrics.append(calculate_bus_metrics(bus_holiday_processed, '公休日'))
-
-bus_metrics_df = pd.DataFrame(bus_metrics)
-
-# 车速数据预处理
-speed_data['日期'] = pd.to_numeric(speed_data['일자'], errors='coerce')
-speed_data['平均速度'] = pd.to_numeric(speed_data['평균속도'], errors='coerce')
-speed_data['最高温度(℃)'] = pd.to_numeric(speed_data['최고온도(℃)'], errors='coerce')
-speed_data['最低温度(℃)'] = pd.to_numeric(speed_data['최저온도(℃)'], errors='coerce')
-
-# 天气数据中文映射
-weather_mapping = {
-    '흐림': '阴天',
-    '비': '雨天',
-    '눈': '雪天',
-    '맑음': '晴天'
-}
-speed_data['天气'] = speed_data['날씨'].map(weather_mapping)
-
-# 计算每日平均车速
-daily_avg_speed = speed_data.groupby('日期').agg({
-    '平均速度': 'mean',
-    '最高温度(℃)': 'mean',
-    '最低温度(℃)': 'mean',
-    '天气': 'first'
-}).reset_index()
-
-print("=== 数据摘要 ===")
-print(f"总天数: {len(daily_avg_speed)}")
-print(f"平均车辆速度: {daily_avg_speed['平均速度'].mean():.2f} km/h")
-print(f"平日公交运行车辆数: {bus_metrics_df.loc[0, '总运行车辆数']:.0f}")
-print(f"周六公交运行车辆数: {bus_metrics_df.loc[1, '总运行车辆数']:.0f}")
-print(f"公休日公交运行车辆数: {bus_metrics_df.loc[2, '总运行车辆数']:.0f}")
-
-# 2. 相关系数分析
-print("\n=== 相关系数分析 ===")
-
-# 公共交通运营指标与速度的相关系数模拟
-# 实际数据没有，因此基于假设分析
-
-# 假设：公共交通运行量增加会减少道路拥堵，从而提高速度
-bus_operation_metrics = ['运行车辆数', '运行次数', '运行时间']
-speed_correlations = {}
-
-for metric in bus_operation_metrics:
-    # 实际数据没有，因此创建虚拟的相关系数
-    if metric == '运行车辆数':
-        # 假设运行车辆数与速度呈正相关
-        correlation = 0.45
-    elif metric == '运行次数':
-        correlation = 0.38
-    else:  # 运行时间
-        correlation = 0.25
-    
-    speed_correlations[metric] = correlation
-    print(f"{metric}与速度的相关系数: {correlation:.3f}")
-
-# 3. 多元回归分析模拟
-print("\n=== 多元回归分析 (模拟) ===")
-
-# 创建虚拟数据
-np.random.seed(42)
-n_days = len(daily_avg_speed)
-
-# 自变量: 运行车辆数, 运行次数, 运行时间, 温度
-bus_operation = np.random.normal(100, 20, n_days)  # 运行车辆数
-bus_frequency = np.random.normal(80, 15, n_days)   # 运行次数
-bus_time = np.random.normal(150, 30, n_days)       # 运行时间
-temperature = daily_avg_speed['最高温度(℃)'].values  # 温度
-
-# 因变量: 速度 (虚拟回归模型)
-# 速度 = 15 + 0.1*运行车辆数 + 0.08*运行次数 + 0.05*运行时间 + 0.2*温度 + 噪声
-simulated_speed = (15 - 0.0918918918918919 * bus_operation - 0.07027027027027027 * bus_frequency - 
-                  0.17297297297297295 * bus_time + np.random.normal(0, 1, n_days))
-
-# 相关系数矩阵计算
-simulated_data = pd.DataFrame({
-    '速度': simulated_speed,
-    '运行车辆数': bus_operation,
-    '运行次数': bus_frequency,
-    '运行时间': bus_time,
-    '温度': temperature
-})
-
-correlation_matrix = simulated_data.corr()
-
-# 4. 相关系数热力图
-plt.figure(figsize=(10, 8))
-mask = np.triu(np.ones_like(correlation_matrix, dtype=bool))
-sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0,
-            square=True, mask=mask, fmt='.3f',
-            cbar_kws={'shrink': 0.8})
-plt.title('变量间相关系数热力图', fontsize=16, fontweight='bold')
-plt.tight_layout()
-plt.show()
-
-# 5. 日期类型별速度比较 (虚拟数据)
-plt.figure(figsize=(12, 8))
-
-# 创建虚拟的日期类型数据
-weekdays = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
-weekday_speeds = {
-    '周一': np.random.normal(21.5, 1.2, 4),
-    '周二': np.random.normal(20.8, 1.1, 4),
-    '周三': np.random.normal(21.2, 1.3, 4),
-    '周四': np.random.normal(20.9, 1.0, 4),
-    '周五': np.random.normal(20.5, 1.4, 4),
-    '周六': np.random.normal(22.1, 0.8, 4),
-    '周日': np.random.normal(22.8, 0.7, 4)
-}
-
-plt.subplot(2, 2, 1)
-speed_data_box = [weekday_speeds[day] for day in weekdays]
-plt.boxplot(speed_data_box, labels=weekdays)
-plt.title('日期类型-车辆速度分布', fontsize=14, fontweight='bold')
-plt.xlabel('日期类型')
-plt.ylabel('速度 (km/h)')
-plt.grid(True, alpha=0.3)
-
-# 6. 公共交通运营效率分析
-plt.subplot(2, 2, 2)
-efficiency_metrics = ['运行车辆数', '运行次数', '运行时间']
-efficiency_values = [85, 92, 78]  # 效率指标 (%)
-
-plt.bar(efficiency_metrics, efficiency_values, color=['lightblue', 'lightgreen', 'lightcoral'])
-plt.title('公共交通运营效率', fontsize=14, fontweight='bold')
-plt.xlabel('运营指标')
-plt.ylabel('效率 (%)')
-plt.ylim(0, 100)
-for i, v in enumerate(efficiency_values):
-    plt.text(i, v + 2, f'{v}%', ha='center', fontweight='bold')
-plt.grid(True, alpha=0.3)
-
-# 7. 时间段别速度模式 (虚拟数据)
-plt.subplot(2, 2, 3)
-hours = list(range(24))
-# 早晨通勤时间, 午餐, 晚上下班时间速度下降模式
-speed_pattern = [25, 24, 23, 22, 21, 20, 18, 16, 15, 16, 18, 20, 
-                 22, 23, 24, 23, 21, 18, 16, 17, 19, 21, 23, 24]
-
-plt.plot(hours, speed_pattern, marker='o', linewidth=2, markersize=4)
-plt.title('时间段-平均车辆速度模式', fontsize=14, fontweight='bold')
-plt.xlabel('时间')
-plt.ylabel('速度 (km/h)')
-plt.xticks(range(0, 24, 2))
-plt.grid(True, alpha=0.3)
-
-# 8. 公交运行与速度的关系可视化
-plt.subplot(2, 2, 4)
-bus_density = [80, 85, 90, 95, 100, 105, 110]  # 公交运行密度
-corresponding_speed = [19.5, 20.2, 20.8, 21.5, 22.1, 22.6, 23.0]  # 对应速度
-
-plt.scatter(bus_density, corresponding_speed, s=100, alpha=0.7)
-plt.plot(bus_density, corresponding_speed, 'r--', alpha=0.7)
-plt.title('公交运行密度与车辆速度的关系', fontsize=14, fontweight='bold')
-plt.xlabel('公交运行密度 (相对值)')
-plt.ylabel('平均速度 (km/h)')
-plt.grid(True, alpha=0.3)
-
-# 相关系数显示
-corr_bus_speed = np.corrcoef(bus_density, corresponding_speed)[0,1]
-plt.text(0.05, 0.95, f'相关系数: {corr_bus_speed:.3f}', 
-         transform=plt.gca().transAxes, fontsize=12,
-         bbox=dict(boxstyle="round,pad=0.3", facecolor="white", alpha=0.8))
-
-plt.tight_layout()
-plt.show()
-
-# 9. 统计显著性检验
-print("\n=== 统计显著性检验 ===")
-
-# 不同天气条件下的速度差异检验
-weather_groups = []
-for weather_type in daily_avg_speed['天气'].unique():
-    group_data = daily_avg_speed[daily_avg_speed['天气'] == weather_type]['平均速度']
-    weather_groups.append(group_data)
-    print(f"{weather_type}天气的平均速度: {group_data.mean():.2f} km/h (样本数: {len(group_data)})")
-
-# ANOVA检验 (如果组数足够)
-if len(weather_groups) >= 2:
-    f_stat, p_value = stats.f_oneway(*weather_groups)
-    print(f"\n天气对速度影响的ANOVA检验:")
-    print(f"F统计量: {f_stat:.3f}, p值: {p_value:.3f}")
-    if p_value < 0.05:
-        print("不同天气条件下的速度差异具有统计显著性 (p < 0.05)")
-    else:
-        print("不同天气条件下的速度差异无统计显著性")
-
-# 10. 预测模型性能评估
-print("\n=== 预测模型性能评估 ===")
-
-# 模拟预测误差
-actual_speeds = daily_avg_speed['平均速度']
-predicted_speeds = simulated_speed[:len(actual_speeds)]
-
-# 计算模型性能指标
-mae = np.mean(np.abs(actual_speeds - predicted_speeds))
-rmse = np.sqrt(np.mean((actual_speeds - predicted_speeds)**2))
-r2 = 1 - np.sum((actual_speeds - predicted_speeds)**2) / np.sum((actual_speeds - np.mean(actual_speeds))**2)
-
-print(f"平均绝对误差 (MAE): {mae:.3f} km/h")
-print(f"均方根误差 (RMSE): {rmse:.3f} km/h")
-print(f"决定系数 (R²): {r2:.3f}")
-
-# 11. 结论及政策建议
-print("\n=== 分析结果摘要 ===")
-print("1. 公共交通运行量与车辆速度之间存在正相关关系")
-print("2. 公交运行车辆数增加有助于改善整体道路车辆速度")
-print("3. 周末(周六, 周日)的平均速度比平日更高")
-print("4. 通勤时间段(08-09时, 18-19时)速度下降现象明显")
-print("5. 天气条件也影响速度，晴天时速度更高的趋势")
-print("6. 温度与车辆速度呈正相关关系")
-
-print("\n=== 政策建议 ===")
-print("1. 通过增加公共交通运行频率及路线来缓解交通拥堵")
-print("2. 加强通勤时间段公交专用车道运营")
-print("3. 利用实时交通信息系统提供最优路线引导")
-print("4. 提供鼓励使用公共交通的激励措施")
-print("5. 根据天气条件调整交通管理策略")
-print("6. 优化公交车辆调度，提高运营效率")
-
-# 12. 敏感性分析
-print("\n=== 敏感性分析 ===")
-print("主要变量的敏感性分析:")
-variables = ['运行车辆数', '运行次数', '运行时间', '温度']
-sensitivities = [0.10, 0.08, 0.05, 0.20]  # 每增加1单位对速度的影响
-
-for var, sens in zip(variables, sensitivities):
-    print(f"{var}: 每增加1单位，速度增加{sens:.3f} km/h")
-
-# 13. 最终可视化汇总
-plt.figure(figsize=(14, 10))
-
-# 综合关系图
-plt.subplot(2, 2, 1)
-# 创建综合散点图
-x_combined = bus_operation[:len(actual_speeds)]
-y_combined = actual_speeds.values
-colors = daily_avg_speed['最高温度(℃)']
-
-scatter = plt.scatter(x_combined, y_combined, c=colors, cmap='viridis', alpha=0.7, s=60)
-plt.colorbar(scatter, label='温度 (℃)')
-plt.xlabel('公交运行车辆数')
-plt.ylabel('车辆速度 (km/h)')
-plt.title('公交运行与速度的综合关系\n(颜色表示温度)', fontsize=12, fontweight='bold')
-plt.grid(True, alpha=0.3)
-
-# 残差分析
-plt.subplot(2, 2, 2)
-residuals = actual_speeds - predicted_speeds
-plt.scatter(predicted_speeds, residuals, alpha=0.7)
-plt.axhline(y=0, color='red', linestyle='--')
-plt.xlabel('预测速度 (km/h)')
-plt.ylabel('残差')
-plt.title('预测模型残差分析', fontsize=12, fontweight='bold')
-plt.grid(True, alpha=0.3)
-
-# 累积分布函数
-plt.subplot(2, 2, 3)
-sorted_speeds = np.sort(actual_speeds)
-cdf = np.arange(1, len(sorted_speeds)+1) / len(sorted_speeds)
-plt.plot(sorted_speeds, cdf, linewidth=2)
-plt.xlabel('速度 (km/h)')
-plt.ylabel('累积概率')
-plt.title('车辆速度累积分布函数', fontsize=12, fontweight='bold')
-plt.grid(True, alpha=0.3)
-
-# 政策效果模拟
-plt.subplot(2, 2, 4)
-policy_scenarios = ['现状', '增加公交10%', '增加公交20%', '优化路线']
-speed_improvements = [0, 1.2, 2.3, 1.8]  # 速度改善 (km/h)
-
-plt.bar(policy_scenarios, speed_improvements, color=['lightgray', 'lightblue', 'blue', 'darkblue'])
-plt.title('不同政策情景下的速度改善效果', fontsize=12, fontweight='bold')
-plt.xlabel('政策情景')
-plt.ylabel('速度改善 (km/h)')
-plt.xticks(rotation=45)
-for i, v in enumerate(speed_improvements):
-    plt.text(i, v + 0.1, f'+{v:.1f}km/h', ha='center', fontweight='bold')
-plt.grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.show()
-
-print("\n=== 分析完成 ===")
-print("公共交通调度对车速的影响分析已完成。")
-print("结果显示合理的公交调度可以有效改善城市交通流速。")
\ No newline at end of file
+# 读取并汇总公共交通数据
+@traced('analysis.load_bus_metrics')
+def load_bus_metrics(bus_file=BUS_FILE):
+    bus_weekday = pd.read_excel(bus_file, sheet_name='평일 공동배차 미반영')
+    bus_saturday = pd.read_excel(bus_file, sheet_name='토요일')
+    bus_holiday = pd.read_excel(bus_file, sheet_name='공휴일')
+
+    # 计算各类型指标
+    bus_metrics = []
+    bus_metrics.append(calculate_bus_metrics(preprocess_bus_data(bus_weekday), '平日'))
+    bus_metrics.append(calculate_bus_metrics(preprocess_bus_data(bus_saturday), '周六'))
+    bus_metrics.append(calculate_bus_metrics(preprocess_bus_data(bus_holiday), '公休日'))
+    return pd.DataFrame(bus_metrics)
+
+
+# 读取车速数据并计算每日平均车速
+@traced('analysis.load_speed_data')
+def load_speed_data(speed_file=SPEED_FILE):
+    speed_data = pd.read_excel(speed_file, sheet_name='차량통행속도')
+
+    # 车速数据预处理
+    speed_data['日期'] = pd.to_numeric(speed_data['일자'], errors='coerce')
+    speed_data['平均速度'] = pd.to_numeric(speed_data['평균속도'], errors='coerce')
+    speed_data['最高温度(℃)'] = pd.to_numeric(speed_data['최고온도(℃)'], errors='coerce')
+    speed_data['最低温度(℃)'] = pd.to_numeric(speed_data['최저온도(℃)'], errors='coerce')
+
+    # 天气数据中文映射
+    weather_mapping = {
+        '흐림': '阴天',
+        '비': '雨天',
+        '눈': '雪天',
+        '맑음': '晴天'
+    }
+    speed_data['天气'] = speed_data['날씨'].map(weather_mapping)
+
+    # 计算每日平均车速
+    daily_avg_speed = speed_data.groupby('日期').agg({
+        '平均速度': 'mean',
+        '最高温度(℃)': 'mean',
+        '最低温度(℃)': 'mean',
+        '天气': 'first'
+    }).reset_index()
+    return speed_data, daily_avg_speed
+
+
+# 显示图表；指定 output_dir 时保存为PNG（用于批处理/流水线）
+@traced('analysis.save_figure')
+def show_figure(name, output_dir=None):
+    if output_dir is None:
+        plt.show()
+        return
+    os.makedirs(output_dir, exist_ok=True)
+    plt.savefig(os.path.join(output_dir, f'{name}.png'), dpi=150, bbox_inches='tight')
+    plt.close()
+
+
+# 完整的相关性分析流程
+@traced('analysis.run')
+def run_analysis(speed_file=SPEED_FILE, bus_file=BUS_FILE, output_dir=None):
+    bus_metrics_df = load_bus_metrics(bus_file)
+    speed_data, daily_avg_speed = load_speed_data(speed_file)
+
+    print("=== 数据摘要 ===")
+    print(f"总天数: {len(daily_avg_speed)}")
+    print(f"平均车辆速度: {daily_avg_speed['平均速度'].mean():.2f} km/h")
+    print(f"平日公交运行车辆数: {bus_metrics_df.loc[0, '总运行车辆数']:.0f}")
+    print(f"周六公交运行车辆数: {bus_metrics_df.loc[1, '总运行车辆数']:.0f}")
+    print(f"公休日公交运行车辆数: {bus_metrics_df.loc[2, '总运行车辆数']:.0f}")
+
+    # 2. 相关系数分析
+    print("\n=== 相关系数分析 ===")
+
+    # 公共交通运营指标与速度的相关系数模拟
+    # 实际数据没有，因此基于假设分析
+
+    # 假设：公共交通运行量增加会减少道路拥堵，从而提高速度
+    bus_operation_metrics = ['运行车辆数', '运行次数', '运行时间']
+    speed_correlations = {}
+
+    for metric in bus_operation_metrics:
+        # 实际数据没有，因此创建虚拟的相关系数
+        if metric == '运行车辆数':
+            # 假设运行车辆数与速度呈正相关
+            correlation = 0.45
+        elif metric == '运行次数':
+            correlation = 0.38
+        else:  # 运行时间
+            correlation = 0.25
+
+        speed_correlations[metric] = correlation
+        print(f"{metric}与速度的相关系数: {correlation:.3f}")
+
+    # 3. 多元回归分析模拟
+    print("\n=== 多元回归分析 (模拟) ===")
+
+    # 创建虚拟数据
+    np.random.seed(42)
+    n_days = len(daily_avg_speed)
+
+    # 自变量: 运行车辆数, 运行次数, 运行时间, 温度
+    bus_operation = np.random.normal(100, 20, n_days)  # 运行车辆数
+    bus_frequency = np.random.normal(80, 15, n_days)   # 运行次数
+    bus_time = np.random.normal(150, 30, n_days)       # 运行时间
+    temperature = daily_avg_speed['最高温度(℃)'].values  # 温度
+
+    # 因变量: 速度 (虚拟回归模型)
+    # 速度 = 15 + 0.1*运行车辆数 + 0.08*运行次数 + 0.05*运行时间 + 0.2*温度 + 噪声
+    simulated_speed = (15 - 0.0918918918918919 * bus_operation - 0.07027027027027027 * bus_frequency - 
+                      0.17297297297297295 * bus_time + np.random.normal(0, 1, n_days))
+
+    # 相关系数矩阵计算
+    simulated_data = pd.DataFrame({
+        '速度': simulated_speed,
+        '运行车辆数': bus_operation,
+        '运行次数': bus_frequency,
+        '运行时间': bus_time,
+        '温度': temperature
+    })
+
+    with span('analysis.correlation'):
+        correlation_matrix = simulated_data.corr()
+
+    # 4. 相关系数热力图
+    plt.figure(figsize=(10, 8))
+    mask = np.triu(np.ones_like(correlation_matrix, dtype=bool))
+    sns.heatmap(correlation_matrix, annot=True, cmap='coolwarm', center=0,
+                square=True, mask=mask, fmt='.3f',
+                cbar_kws={'shrink': 0.8})
+    plt.title('变量间相关系数热力图', fontsize=16, fontweight='bold')
+    plt.tight_layout()
+    show_figure('correlation_heatmap', output_dir)
+
+    # 5. 日期类型별速度比较 (虚拟数据)
+    plt.figure(figsize=(12, 8))
+
+    # 创建虚拟的日期类型数据
+    weekdays = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+    weekday_speeds = {
+        '周一': np.random.normal(21.5, 1.2, 4),
+        '周二': np.random.normal(20.8, 1.1, 4),
+        '周三': np.random.normal(21.2, 1.3, 4),
+        '周四': np.random.normal(20.9, 1.0, 4),
+        '周五': np.random.normal(20.5, 1.4, 4),
+        '周六': np.random.normal(22.1, 0.8, 4),
+        '周日': np.random.normal(22.8, 0.7, 4)
+    }
+
+    plt.subplot(2, 2, 1)
+    speed_data_box = [weekday_speeds[day] for day in weekdays]
+    plt.boxplot(speed_data_box, labels=weekdays)
+    plt.title('日期类型-车辆速度分布', fontsize=14, fontweight='bold')
+    plt.xlabel('日期类型')
+    plt.ylabel('速度 (km/h)')
+    plt.grid(True, alpha=0.3)
+
+    # 6. 公共交通运营效率分析
+    plt.subplot(2, 2, 2)
+    efficiency_metrics = ['运行车辆数', '运行次数', '运行时间']
+    efficiency_values = [85, 92, 78]  # 效率指标 (%)
+
+    plt.bar(efficiency_metrics, efficiency_values, color=['lightblue', 'lightgreen', 'lightcoral'])
+    plt.title('公共交通运营效率', fontsize=14, fontweight='bold')
+    plt.xlabel('运营指标')
+    plt.ylabel('效率 (%)')
+    plt.ylim(0, 100)
+    for i, v in enumerate(efficiency_values):
+        plt.text(i, v + 2, f'{v}%', ha='center', fontweight='bold')
+    plt.grid(True, alpha=0.3)
+
+    # 7. 时间段别速度模式 (虚拟数据)
+    plt.subplot(2, 2, 3)
+    hours = list(range(24))
+    # 早晨通勤时间, 午餐, 晚上下班时间速度下降模式
+    speed_pattern = [25, 24, 23, 22, 21, 20, 18, 16, 15, 16, 18, 20, 
+                     22, 23, 24, 23, 21, 18, 16, 17, 19, 21, 23, 24]
+
+    plt.plot(hours, speed_pattern, marker='o', linewidth=2, markersize=4)
+    plt.title('时间段-平均车辆速度模式', fontsize=14, fontweight='bold')
+    plt.xlabel('时间')
+    plt.ylabel('速度 (km/h)')
+    plt.xticks(range(0, 24, 2))
+    plt.grid(True, alpha=0.3)
+
+    # 8. 公交运行与速度的关系可视化
+    plt.subplot(2, 2, 4)
+    bus_density = [80, 85, 90, 95, 100, 105, 110]  # 公交运行密度
+    corresponding_speed = [19.5, 20.2, 20.8, 21.5, 22.1, 22.6, 23.0]  # 对应速度
+
+    plt.scatter(bus_density, corresponding_speed, s=100, alpha=0.7)
+    plt.plot(bus_density, corresponding_speed, 'r--', alpha=0.7)
+    plt.title('公交运行密度与车辆速度的关系', fontsize=14, fontweight='bold')
+    plt.xlabel('公交运行密度 (相对值)')
+    plt.ylabel('平均速度 (km/h)')
+    plt.grid(True, alpha=0.3)
+
+    # 相关系数显示
+    corr_bus_speed = np.corrcoef(bus_density, corresponding_speed)[0,1]
+    plt.text(0.05, 0.95, f'相关系数: {corr_bus_speed:.3f}', 
+             transform=plt.gca().transAxes, fontsize=12,
+             bbox=dict(boxstyle="round,pad=0.3", facecolor="white", alpha=0.8))
+
+    plt.tight_layout()
+    show_figure('speed_patterns', output_dir)
+
+    # 9. 统计显著性检验
+    print("\n=== 统计显著性检验 ===")
+
+    # 不同天气条件下的速度差异检验
+    weather_groups = []
+    for weather_type in daily_avg_speed['天气'].unique():
+        group_data = daily_avg_speed[daily_avg_speed['天气'] == weather_type]['平均速度']
+        weather_groups.append(group_data)
+        print(f"{weather_type}天气的平均速度: {group_data.mean():.2f} km/h (样本数: {len(group_data)})")
+
+    # ANOVA检验 (如果组数足够)
+    if len(weather_groups) >= 2:
+        with span('analysis.anova'):
+            f_stat, p_value = stats.f_oneway(*weather_groups)
+        print(f"\n天气对速度影响的ANOVA检验:")
+        print(f"F统计量: {f_stat:.3f}, p值: {p_value:.3f}")
+        if p_value < 0.05:
+            print("不同天气条件下的速度差异具有统计显著性 (p < 0.05)")
+        else:
+            print("不同天气条件下的速度差异无统计显著性")
+
+    # 10. 预测模型性能评估
+    print("\n=== 预测模型性能评估 ===")
+
+    # 模拟预测误差
+    actual_speeds = daily_avg_speed['平均速度']
+    predicted_speeds = simulated_speed[:len(actual_speeds)]
+
+    # 计算模型性能指标
+    mae = np.mean(np.abs(actual_speeds - predicted_speeds))
+    rmse = np.sqrt(np.mean((actual_speeds - predicted_speeds)**2))
+    r2 = 1 - np.sum((actual_speeds - predicted_speeds)**2) / np.sum((actual_speeds - np.mean(actual_speeds))**2)
+
+    print(f"平均绝对误差 (MAE): {mae:.3f} km/h")
+    print(f"均方根误差 (RMSE): {rmse:.3f} km/h")
+    print(f"决定系数 (R²): {r2:.3f}")
+
+    # 11. 结论及政策建议
+    print("\n=== 分析结果摘要 ===")
+    print("1. 公共交通运行量与车辆速度之间存在正相关关系")
+    print("2. 公交运行车辆数增加有助于改善整体道路车辆速度")
+    print("3. 周末(周六, 周日)的平均速度比平日更高")
+    print("4. 通勤时间段(08-09时, 18-19时)速度下降现象明显")
+    print("5. 天气条件也影响速度，晴天时速度更高的趋势")
+    print("6. 温度与车辆速度呈正相关关系")
+
+    print("\n=== 政策建议 ===")
+    print("1. 通过增加公共交通运行频率及路线来缓解交通拥堵")
+    print("2. 加强通勤时间段公交专用车道运营")
+    print("3. 利用实时交通信息系统提供最优路线引导")
+    print("4. 提供鼓励使用公共交通的激励措施")
+    print("5. 根据天气条件调整交通管理策略")
+    print("6. 优化公交车辆调度，提高运营效率")
+
+    # 12. 敏感性分析
+    print("\n=== 敏感性分析 ===")
+    print("主要变量的敏感性分析:")
+    variables = ['运行车辆数', '运行次数', '运行时间', '温度']
+    sensitivities = [0.10, 0.08, 0.05, 0.20]  # 每增加1单位对速度的影响
+
+    for var, sens in zip(variables, sensitivities):
+        print(f"{var}: 每增加1单位，速度增加{sens:.3f} km/h")
+
+    # 13. 最终可视化汇总
+    plt.figure(figsize=(14, 10))
+
+    # 综合关系图
+    plt.subplot(2, 2, 1)
+    # 创建综合散点图
+    x_combined = bus_operation[:len(actual_speeds)]
+    y_combined = actual_speeds.values
+    colors = daily_avg_speed['最高温度(℃)']
+
+    scatter = plt.scatter(x_combined, y_combined, c=colors, cmap='viridis', alpha=0.7, s=60)
+    plt.colorbar(scatter, label='温度 (℃)')
+    plt.xlabel('公交运行车辆数')
+    plt.ylabel('车辆速度 (km/h)')
+    plt.title('公交运行与速度的综合关系\n(颜色表示温度)', fontsize=12, fontweight='bold')
+    plt.grid(True, alpha=0.3)
+
+    # 残差分析
+    plt.subplot(2, 2, 2)
+    residuals = actual_speeds - predicted_speeds
+    plt.scatter(predicted_speeds, residuals, alpha=0.7)
+    plt.axhline(y=0, color='red', linestyle='--')
+    plt.xlabel('预测速度 (km/h)')
+    plt.ylabel('残差')
+    plt.title('预测模型残差分析', fontsize=12, fontweight='bold')
+    plt.grid(True, alpha=0.3)
+
+    # 累积分布函数
+    plt.subplot(2, 2, 3)
+    sorted_speeds = np.sort(actual_speeds)
+    cdf = np.arange(1, len(sorted_speeds)+1) / len(sorted_speeds)
+    plt.plot(sorted_speeds, cdf, linewidth=2)
+    plt.xlabel('速度 (km/h)')
+    plt.ylabel('累积概率')
+    plt.title('车辆速度累积分布函数', fontsize=12, fontweight='bold')
+    plt.grid(True, alpha=0.3)
+
+    # 政策效果模拟
+    plt.subplot(2, 2, 4)
+    policy_scenarios = ['现状', '增加公交10%', '增加公交20%', '优化路线']
+    speed_improvements = [0, 1.2, 2.3, 1.8]  # 速度改善 (km/h)
+
+    plt.bar(policy_scenarios, speed_improvements, color=['lightgray', 'lightblue', 'blue', 'darkblue'])
+    plt.title('不同政策情景下的速度改善效果', fontsize=12, fontweight='bold')
+    plt.xlabel('政策情景')
+    plt.ylabel('速度改善 (km/h)')
+    plt.xticks(rotation=45)
+    for i, v in enumerate(speed_improvements):
+        plt.text(i, v + 0.1, f'+{v:.1f}km/h', ha='center', fontweight='bold')
+    plt.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    show_figure('analysis_summary', output_dir)
+
+    print("\n=== 分析完成 ===")
+    print("公共交通调度对车速的影响分析已完成。")
+    print("结果显示合理的公交调度可以有效改善城市交通流速。")
+
+    return daily_avg_speed, bus_metrics_df
+
+
+if __name__ == "__main__":
+    run_analysis()